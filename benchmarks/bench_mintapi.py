@@ -0,0 +1,274 @@
+"""
+Offline throughput and memory benchmarks for mintapi.
+
+Runs Mint against the local stand-in server in tests/mint_server.py, so no
+credentials or network access are needed:
+
+    python -m benchmarks.bench_mintapi --scale 100000 --latency 0.05
+    python -m benchmarks.bench_mintapi --save before.json
+    python -m benchmarks.bench_mintapi --compare before.json
+"""
+
+from argparse import ArgumentParser, Namespace
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from mintapi import api, cli, codec, constants
+from mintapi.budgets import BudgetTracker
+from mintapi.filters import RecordFilter
+from mintapi.recurring import RecurringChargeDetector
+from mintapi.throttle import RequestScheduler
+from tests.mint_server import MintServer, stub_mint
+
+
+def time_case(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        records = func()
+        timings.append(time.perf_counter() - start)
+    return timings, records
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def build_cases(server, mint, output_dir, selected=None):
+    """
+    The benchmark cases (only those in selected, when given) as {name:
+    function returning the number of records}.  The data a case works on is
+    fetched here, once, for the selected cases only.
+    """
+    loaders = {
+        "transactions_body": lambda: server.payload(
+            "/pfm/v1/transactions", server.scale
+        ),
+        "utilization": lambda: json.loads(
+            server.payload("/v1/creditreports/creditutilizationhistory")
+        ),
+        "transactions": lambda: mint.get_transaction_data(limit=server.scale),
+        "category_tree": mint.get_category_tree,
+        "budgets": mint.get_budgets,
+    }
+    inputs = {}
+
+    def output(format):
+        options = Namespace(
+            filename=os.path.join(output_dir, "bench"),
+            format=format,
+            attention=False,
+            compact=False,
+        )
+        return lambda: cli.output_data(
+            options, inputs["transactions"], constants.TRANSACTION_KEY
+        )
+
+    def transform():
+        data = json.loads(inputs["transactions_body"])
+        return len(
+            api.process_endpoint_data(
+                constants.TRANSACTION_KEY,
+                api.ENDPOINTS[constants.TRANSACTION_KEY],
+                data,
+            )
+        )
+
+    def encode(dumps):
+        def run():
+            dumps(inputs["transactions"])
+            return len(inputs["transactions"])
+
+        return run
+
+    def rollup():
+        inputs["category_tree"].rollup(inputs["transactions"], by_month=True, depth=1)
+        return len(inputs["transactions"])
+
+    def budget_status():
+        BudgetTracker(
+            inputs["category_tree"], inputs["budgets"], inputs["transactions"]
+        ).evaluate()
+        return len(inputs["transactions"])
+
+    def recurring():
+        detector = RecurringChargeDetector()
+        detector.add(inputs["transactions"])
+        detector.charges()
+        return len(inputs["transactions"])
+
+    # name: (inputs used, function)
+    cases = {
+        "decode_transactions": (
+            ["transactions_body"],
+            lambda: len(
+                json.loads(inputs["transactions_body"])[constants.TRANSACTION_KEY]
+            ),
+        ),
+        "decode_codec": (
+            ["transactions_body"],
+            lambda: len(
+                codec.loads(inputs["transactions_body"])[constants.TRANSACTION_KEY]
+            ),
+        ),
+        "encode_stdlib": (
+            ["transactions"],
+            encode(lambda transactions: json.dumps(transactions, indent=2)),
+        ),
+        "encode_codec": (["transactions"], encode(codec.dumps)),
+        "encode_codec_compact": (
+            ["transactions"],
+            encode(lambda transactions: codec.dumps(transactions, compact=True)),
+        ),
+        "transform_transactions": (["transactions_body"], transform),
+        "get_account_data": ([], lambda: len(mint.get_account_data())),
+        "get_categories": ([], lambda: len(mint.get_categories())),
+        "get_budgets": ([], lambda: len(mint.get_budgets())),
+        "get_investment_data": ([], lambda: len(mint.get_investment_data())),
+        "get_transaction_data": (
+            [],
+            lambda: len(mint.get_transaction_data(limit=server.scale)),
+        ),
+        "get_transactions_projected": (
+            [],
+            lambda: len(
+                mint.get_transaction_data(
+                    limit=server.scale,
+                    where=RecordFilter(max_amount=0),
+                    fields=["date", "amount", "category.id", "accountId"],
+                )
+            ),
+        ),
+        "iter_transaction_data": (
+            [],
+            lambda: sum(1 for _ in mint.iter_transaction_data(limit=server.scale)),
+        ),
+        "output_json": (
+            ["transactions"],
+            lambda: output(constants.JSON_FORMAT)() or len(inputs["transactions"]),
+        ),
+        "output_csv": (
+            ["transactions"],
+            lambda: output(constants.CSV_FORMAT)() or len(inputs["transactions"]),
+        ),
+        "process_utilization": (
+            ["utilization"],
+            lambda: len(api.process_utilization(inputs["utilization"])),
+        ),
+        "category_rollup_by_month": (["transactions", "category_tree"], rollup),
+        "recurring_charges": (["transactions"], recurring),
+        "budget_status": (
+            ["transactions", "category_tree", "budgets"],
+            budget_status,
+        ),
+    }
+
+    built = {}
+    for name, (needs, func) in cases.items():
+        if selected and name not in selected:
+            continue
+        for input in needs:
+            if input not in inputs:
+                inputs[input] = loaders[input]()
+        built[name] = func
+    return built
+
+
+def run(scale, latency, repeat, selected=None, memory=True):
+    results = {}
+    with MintServer(scale=scale, latency=latency) as server:
+        mint = stub_mint(
+            server, request_scheduler=RequestScheduler(rate=10000, burst=10000)
+        )
+        with tempfile.TemporaryDirectory() as output_dir:
+            cases = build_cases(server, mint, output_dir, selected)
+            for name, func in cases.items():
+                timings, records = time_case(func, repeat)
+                result = {
+                    "best": min(timings),
+                    "median": statistics.median(timings),
+                    "records": records,
+                    "records_per_second": records / min(timings),
+                }
+                if memory:
+                    result["peak_memory"] = peak_memory(func)
+                results[name] = result
+    return {
+        "scale": scale,
+        "latency": latency,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def report(run_results, baseline=None):
+    header = "{:<24} {:>10} {:>10} {:>10} {:>14} {:>12}".format(
+        "case", "best(s)", "median(s)", "records", "records/s", "peak(MiB)"
+    )
+    if baseline:
+        header += " {:>9}".format("speedup")
+    lines = [header]
+    for name, result in run_results["results"].items():
+        line = "{:<24} {:>10.4f} {:>10.4f} {:>10} {:>14.0f} {:>12}".format(
+            name,
+            result["best"],
+            result["median"],
+            result["records"],
+            result["records_per_second"],
+            (
+                "{:.1f}".format(result["peak_memory"] / 2**20)
+                if "peak_memory" in result
+                else ""
+            ),
+        )
+        previous = (baseline or {}).get("results", {}).get(name)
+        if previous:
+            line += " {:>8.2f}x".format(previous["best"] / result["best"])
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main(args=None):
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", type=int, default=10000, help="transactions")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds added to each response"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--case", action="append", help="only run these cases")
+    parser.add_argument(
+        "--no-memory", action="store_true", help="skip the tracemalloc pass"
+    )
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of a previous run")
+    options = parser.parse_args(args)
+
+    results = run(
+        options.scale,
+        options.latency,
+        options.repeat,
+        selected=options.case,
+        memory=not options.no_memory,
+    )
+    baseline = None
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)
+    print(report(results, baseline))
+    if options.save:
+        with open(options.save, "w+") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
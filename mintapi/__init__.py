@@ -1,6 +1,20 @@
 import logging
 
 from mintapi.api import *
+from mintapi.aio import AsyncMint
+from mintapi.budgets import BudgetTracker
+from mintapi.cache import ClosedMonthCache, ResponseCache
+from mintapi.cdc import ChangeCapture, FingerprintStore, NDJSONSink
+from mintapi.categories import CategoryTree
+from mintapi.filters import RecordFilter
+from mintapi.fx import RateTable
+from mintapi.holdings import HoldingsStore
+from mintapi.httplogin import HttpLoginError, HttpSignIn
+from mintapi.imapwatch import MfaCodeWatcher
+from mintapi.partitions import PartitionedExport
+from mintapi.recurring import RecurringChargeDetector
+from mintapi.sync import SyncController
+from mintapi.index import TransactionIndex
 from mintapi.signIn import *
 
 
@@ -0,0 +1,213 @@
+import asyncio
+from http.cookies import SimpleCookie
+
+try:
+    import aiohttp
+    from yarl import URL
+except ImportError:  # pragma: no cover - optional dependency
+    aiohttp = None
+
+from mintapi import codec, constants
+from mintapi.api import (
+    ENDPOINTS,
+    MINT_CREDIT_URL,
+    MINT_ROOT_URL,
+    MintException,
+    api_key_header,
+    build_endpoint_url,
+    convert_mmddyy_to_datetime,
+    first_of_this_month,
+    process_endpoint_data,
+    process_utilization,
+    remove_pending_transactions,
+    x_months_ago,
+)
+
+DEFAULT_POOL_SIZE = 100
+
+
+class AsyncMint(object):
+    """
+    asyncio counterpart of Mint for the REST endpoints.  It does not sign in
+    on its own: seed it from a signed-in Mint with AsyncMint.from_mint(), or
+    pass the API key and cookies of an existing session.  Every request
+    shares one aiohttp connection pool, so many reads can run concurrently
+    on a single event loop.
+    """
+
+    def __init__(self, api_key, cookies=None, pool_size=DEFAULT_POOL_SIZE):
+        if aiohttp is None:
+            raise MintException(
+                "AsyncMint requires aiohttp. Install it with `pip install mintapi[async]`."
+            )
+        self.api_key = api_key
+        self.pool_size = pool_size
+        self.session = None
+        self._cookies = cookies or []
+
+    @classmethod
+    def from_mint(cls, mint, include_credit=False, **kwargs):
+        """
+        Builds an AsyncMint from a signed-in Mint, copying its API key and
+        browser cookies (or those of its transport when it signed in without
+        a browser).  Set include_credit to also collect the cookies of the
+        credit domain, which requires loading it once.
+        """
+        api_key = mint._get_api_key()
+        source = mint.driver if mint.driver is not None else mint.transport
+        cookies = list(source.get_cookies())
+        if include_credit:
+            mint._load_mint_credit_url()
+            cookies.extend(source.get_cookies())
+        return cls(api_key, cookies=cookies, **kwargs)
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def open(self):
+        if self.session is not None:
+            return
+        jar = aiohttp.CookieJar()
+        for cookie in self._cookies:
+            # As Morsels, so that a ".intuit.com" cookie stays a domain
+            # cookie rather than becoming host-only for intuit.com
+            domain = cookie.get("domain") or "mint.intuit.com"
+            morsels = SimpleCookie()
+            morsels[cookie["name"]] = cookie["value"]
+            morsel = morsels[cookie["name"]]
+            morsel["path"] = cookie.get("path") or "/"
+            if domain.startswith("."):
+                morsel["domain"] = domain
+            if cookie.get("secure"):
+                morsel["secure"] = True
+            jar.update_cookies(
+                morsels, response_url=URL("https://{}/".format(domain.lstrip(".")))
+            )
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.pool_size),
+            cookie_jar=jar,
+        )
+
+    async def close(self):
+        if self.session is None:
+            return
+        await self.session.close()
+        self.session = None
+
+    async def get(self, url, **kwargs):
+        await self.open()
+        async with self.session.get(url, **kwargs) as response:
+            response.raise_for_status()
+            return await response.json(content_type=None, loads=codec.loads)
+
+    async def _get_api_json(self, url):
+        return await self.get(url, headers=api_key_header(self.api_key))
+
+    async def get_bills(self):
+        data = await self._get_api_json("{}/bps/v2/payer/bills".format(MINT_ROOT_URL))
+        return data["bills"]
+
+    async def get_data(self, name, limit, id=None, start_date=None, end_date=None):
+        endpoint = ENDPOINTS[name]
+        data = await self._get_api_json(
+            build_endpoint_url(endpoint, limit, id, start_date, end_date)
+        )
+        return process_endpoint_data(name, endpoint, data)
+
+    async def get_account_data(self, limit=5000):
+        return await self.get_data(constants.ACCOUNT_KEY, limit)
+
+    async def get_categories(self, limit=5000):
+        return await self.get_data(constants.CATEGORY_KEY, limit)
+
+    async def get_budgets(self, limit=5000):
+        return await self.get_data(
+            constants.BUDGET_KEY,
+            limit,
+            None,
+            start_date=x_months_ago(11),
+            end_date=first_of_this_month(),
+        )
+
+    async def get_investment_data(self, limit=5000):
+        return await self.get_data(constants.INVESTMENT_KEY, limit)
+
+    async def get_transaction_data(
+        self,
+        limit=5000,
+        include_investment=False,
+        start_date=None,
+        end_date=None,
+        remove_pending=True,
+        id=0,
+    ):
+        """
+        See Mint.get_transaction_data; start_date and end_date must be in
+        format mm/dd/yy.
+        """
+        if include_investment:
+            id = 0
+        data = await self.get_data(
+            constants.TRANSACTION_KEY,
+            limit,
+            id,
+            convert_mmddyy_to_datetime(start_date),
+            convert_mmddyy_to_datetime(end_date),
+        )
+        if remove_pending:
+            data = remove_pending_transactions(data)
+        return data
+
+    async def get_credit_score(self):
+        report = await self.get_credit_report(limit=1, details=False)
+        try:
+            vendor = report["reports"]["vendorReports"][0]
+            return vendor["creditReportList"][0]["creditScore"]
+        except (KeyError, IndexError):
+            raise Exception("No Credit Score Found")
+
+    async def get_credit_report(
+        self,
+        limit=2,
+        details=True,
+        exclude_inquiries=False,
+        exclude_accounts=False,
+        exclude_utilization=False,
+    ):
+        # Unlike Mint.get_credit_report, the sub-reports are independent
+        # requests, so fetch them all at once.
+        requests = {
+            "reports": self._get_api_json(
+                "{}/v1/creditreports?limit={}".format(MINT_CREDIT_URL, limit)
+            )
+        }
+        if details:
+            if not exclude_inquiries:
+                requests["inquiries"] = self.get_credit_inquiries()
+            if not exclude_accounts:
+                requests["accounts"] = self.get_credit_accounts()
+            if not exclude_utilization:
+                requests["utilization"] = self.get_credit_utilization()
+        results = await asyncio.gather(*requests.values())
+        return dict(zip(requests.keys(), results))
+
+    async def get_credit_inquiries(self):
+        return await self._get_api_json(
+            "{}/v1/creditreports/0/inquiries".format(MINT_CREDIT_URL)
+        )
+
+    async def get_credit_accounts(self):
+        return await self._get_api_json(
+            "{}/v1/creditreports/0/tradelines".format(MINT_CREDIT_URL)
+        )
+
+    async def get_credit_utilization(self):
+        return process_utilization(
+            await self._get_api_json(
+                "{}/v1/creditreports/creditutilizationhistory".format(MINT_CREDIT_URL)
+            )
+        )
@@ -1,15 +1,35 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime
 from dateutil.relativedelta import relativedelta
 from mintapi import constants
 import logging
+import numpy
 import os
 import random
 import re
 import requests
+import threading
 import time
 import warnings
-
+from urllib.parse import urlparse
+
+from mintapi import codec, filters, jsonstream, metrics, sync
+from mintapi.budgets import BudgetTracker
+from mintapi.cache import ClosedMonthCache
+from mintapi.fx import DEFAULT_CURRENCY, RateTable
+from mintapi.categories import CategoryTree
+from mintapi.httplogin import (
+    LOGIN_ENGINE_HTTP,
+    LOGIN_ENGINE_SELENIUM,
+    LOGIN_ENGINES,
+    HttpSignIn,
+)
+from mintapi.recurring import RecurringChargeDetector
 from mintapi.signIn import sign_in, _create_web_driver_at_mint_com
+from mintapi.startup import discard_web_driver, resolve_web_driver
+from mintapi.sync import SyncController
+from mintapi.throttle import RequestScheduler
+from mintapi.transport import DEFAULT_POOL_SIZE, PooledTransport, transport_from_driver
 
 logger = logging.getLogger("mintapi")
 
@@ -69,17 +89,206 @@ def reverse_credit_amount(row):
 MINT_ROOT_URL = "https://mint.intuit.com"
 MINT_ACCOUNTS_URL = "https://accounts.intuit.com"
 MINT_CREDIT_URL = "https://credit.finance.intuit.com"
+MINT_OVERVIEW_URL = "{}/overview".format(MINT_ROOT_URL)
 
 JSON_HEADER = {"accept": "application/json"}
+try:
+    # requests can only decode brotli responses when one of these is installed
+    import brotli  # noqa: F401
+
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+
+        ACCEPT_ENCODING = "gzip, deflate, br"
+    except ImportError:
+        ACCEPT_ENCODING = "gzip, deflate"
+
+STREAM_CHUNK_SIZE = 64 * 1024
+API_KEY_SCRIPT = "return window.__shellInternal.appExperience.appApiKey"
 
 
 class MintException(Exception):
     pass
 
 
+def api_key_header(api_key):
+    auth = "Intuit_APIKey intuit_apikey=" + api_key
+    auth += ", intuit_apikey_version=1.0"
+    header = {"authorization": auth}
+    header.update(JSON_HEADER)
+    return header
+
+
+def build_endpoint_url(endpoint, limit, id=None, start_date=None, end_date=None):
+    url = "{}/{}/{}?limit={}&".format(
+        MINT_ROOT_URL, endpoint["apiVersion"], endpoint["endpoint"], limit
+    )
+    if endpoint["beginningDate"] is not None and start_date is not None:
+        url = url + "{}={}&".format(endpoint["beginningDate"], start_date)
+    if endpoint["endingDate"] is not None and end_date is not None:
+        url = url + "{}={}&".format(endpoint["endingDate"], end_date)
+    if id is not None:
+        url = url + "id={}&".format(id)
+    return url
+
+
+def response_size(response, stream=False):
+    """
+    Bytes received on the wire for a response body, i.e. before any gzip/br
+    decoding: the Content-Length when the server sent one, otherwise what
+    was read off the socket (unless the body is still being streamed).
+    """
+    length = response.headers.get("Content-Length")
+    if length is not None:
+        return int(length)
+    if stream:
+        return None
+    content = response.content
+    try:
+        return response.raw.tell()
+    except AttributeError:
+        return len(content)
+
+
+def process_record(endpoint, record):
+    """Hoists the dates we care about out of a record's metaData."""
+    if endpoint["includeCreatedDate"]:
+        record["createdDate"] = record["metaData"]["createdDate"]
+    record["lastUpdatedDate"] = record["metaData"]["lastUpdatedDate"]
+    record.pop("metaData", None)
+    return record
+
+
+def missing_key_exception(name, endpoint):
+    return MintException(
+        "Data from the {} endpoint did not containt the expected {} key.".format(
+            endpoint["endpoint"], name
+        )
+    )
+
+
+def process_endpoint_data(name, endpoint, data, where=None, fields=None):
+    """
+    Pulls the records for `name` out of an endpoint response and processes
+    each of them with process_record.  See select_records for where and
+    fields.
+    """
+    if name not in data.keys():
+        raise missing_key_exception(name, endpoint)
+    if where is None and fields is None:
+        for i in data[name]:
+            process_record(endpoint, i)
+        return data[name]
+    return list(select_records(endpoint, data[name], where, fields))
+
+
+def select_records(endpoint, records, where=None, fields=None):
+    """
+    Processes and yields the records for which where(record) is true (e.g. a
+    filters.RecordFilter), trimmed to the fields whitelist (e.g.
+    ["date", "amount", "category.name"]) when one is given.  Records that
+    are dropped are never processed.
+    """
+    spec = None if fields is None else filters.parse_fields(fields)
+    for record in records:
+        if where is not None and not where(record):
+            continue
+        record = process_record(endpoint, record)
+        yield record if spec is None else filters.project(record, spec)
+
+
+def is_posted(transaction):
+    return transaction["isPending"] == False
+
+
+def remove_pending_transactions(data):
+    return list(filter(is_posted, data))
+
+
+# Accounts whose balances are subtracted from net worth
+LIABILITY_ACCOUNT_TYPES = ["LoanAccount", "CreditAccount"]
+
+
+def signed_balances(account_data):
+    return [
+        (
+            -a["currentBalance"]
+            if a["type"] in LIABILITY_ACCOUNT_TYPES
+            else a["currentBalance"]
+        )
+        for a in account_data
+    ]
+
+
+def net_worth_history(account_snapshots, currency, fx_rates, date_field="date"):
+    """
+    Net worth by date of account records kept over time (get_account_data
+    results with a date_field added, e.g. by a daily run), in currency.
+    Every balance is converted at the exchange rates of its own date in a
+    single pass.  Returns [{"date", "value"}] in date order.
+    """
+    accounts = [a for a in account_snapshots if a.get("isActive", True)]
+    days = [str(a[date_field])[:10] for a in accounts]
+    if not accounts:
+        return []
+    converted = fx_rates.convert(
+        signed_balances(accounts), [a.get("currency") for a in accounts], currency, days
+    )
+    dates, positions = numpy.unique(days, return_inverse=True)
+    totals = numpy.bincount(positions, weights=converted, minlength=len(dates))
+    return [{"date": day, "value": float(total)} for day, total in zip(dates, totals)]
+
+
+def first_of_this_month():
+    return date.today().replace(day=1)
+
+
+def x_months_ago(months=2):
+    return (first_of_this_month() - relativedelta(months=months)).replace(day=1)
+
+
+def process_utilization(data):
+    # Function to clean up the credit utilization history data
+    utilization = []
+    utilization.extend(flatten_utilization(data["cumulative"]))
+    for trade in data["tradelines"]:
+        utilization.extend(flatten_utilization(trade))
+    return utilization
+
+
+def flatten_utilization(data):
+    # The utilization history data has a nested format, grouped by year
+    # and then by month. Let's flatten that into a list of dates.
+    utilization = []
+    name = data.get("creditorName", "Total")
+    for cu in data["creditUtilization"]:
+        year = cu["year"]
+        for cu_month in cu["months"]:
+            date = datetime.strptime(cu_month["name"], "%B").replace(
+                day=1, year=int(year)
+            )
+            utilization.append(
+                {
+                    "name": name,
+                    "date": date.strftime("%Y-%m-%d"),
+                    "utilization": cu_month["creditUtilization"],
+                }
+            )
+    return utilization
+
+
 class Mint(object):
     driver = None
     status_message = None
+    request_scheduler = None
+    instrumentation = None
+    response_cache = None
+    closed_month_cache = None
+    transport = None
+    currency = None
+    fx_rates = None
 
     def __init__(
         self,
@@ -99,9 +308,54 @@ class Mint(object):
         wait_for_sync_timeout=5 * 60,
         use_chromedriver_on_path=False,
         chromedriver_download_path=os.getcwd(),
+        request_scheduler=None,
+        instrumentation=None,
+        response_cache=None,
+        closed_month_cache=None,
+        thread_safe=False,
+        transport=None,
+        pool_size=DEFAULT_POOL_SIZE,
+        login_engine=LOGIN_ENGINE_SELENIUM,
+        http_login=None,
+        driver=None,
+        currency=None,
+        fx_rates=None,
     ):
         self.driver = None
         self.status_message = None
+        # Rate limiting, retries and timeouts for every request sent to Mint.
+        # Pass a shared RequestScheduler to throttle several clients together.
+        self.request_scheduler = request_scheduler or RequestScheduler()
+        # Timing events for every login phase and request; see mintapi.metrics
+        self.instrumentation = instrumentation or metrics.Instrumentation()
+        # Conditional requests: unchanged responses are served from here.
+        # Pass a ResponseCache(path) to keep them between runs.
+        self.response_cache = response_cache
+        # Data for months that have closed, e.g. budget history
+        self.closed_month_cache = closed_month_cache or ClosedMonthCache()
+        # The selenium driver is not thread-safe.  By default every request
+        # goes through it, one at a time.  With thread_safe, REST requests go
+        # over a pooled transport seeded with the browser's cookies instead,
+        # and the driver is only used (under this lock) to sign in, read the
+        # API key and load the credit domain's cookies.
+        self._driver_lock = threading.RLock()
+        self.thread_safe = thread_safe or transport is not None
+        self.transport = transport
+        self.pool_size = pool_size
+        # Signs in without a browser for login_engine "http"; pass
+        # an HttpSignIn to point it at other URLs
+        self.http_login = http_login
+        self._api_key = None
+        self._credit_cookies_loaded = False
+        # Net worth is reported in currency, when given, converting balances
+        # at the rates of fx_rates (pass a RateTable(path=...) to keep them)
+        self.currency = currency
+        self.fx_rates = fx_rates or RateTable()
+        # Built from the categories response on first use; see get_category_tree
+        self._category_tree = None
+        # Kept for the session so that later calls to get_recurring_charges
+        # only evaluate the merchants with new transactions
+        self._recurring_charges = RecurringChargeDetector()
 
         if email and password:
             self.login_and_get_token(
@@ -121,30 +375,110 @@ class Mint(object):
                 wait_for_sync_timeout=wait_for_sync_timeout,
                 use_chromedriver_on_path=use_chromedriver_on_path,
                 chromedriver_download_path=chromedriver_download_path,
+                login_engine=login_engine,
+                driver=driver,
             )
 
+    def _get_api_key(self):
+        api_key = self._api_key
+        if api_key is not None:
+            return api_key
+        with self._driver_lock:
+            api_key = self.driver.execute_script(API_KEY_SCRIPT)
+            if self.thread_safe:
+                self._api_key = api_key
+            return api_key
+
+    def _get_transport(self):
+        if self.transport is None:
+            with self._driver_lock:
+                if self.transport is None:
+                    self.transport = transport_from_driver(self.driver, self.pool_size)
+        return self.transport
+
     def _get_api_key_header(self):
-        key_var = "window.__shellInternal.appExperience.appApiKey"
-        api_key = self.driver.execute_script("return " + key_var)
-        auth = "Intuit_APIKey intuit_apikey=" + api_key
-        auth += ", intuit_apikey_version=1.0"
-        header = {"authorization": auth}
-        header.update(JSON_HEADER)
-        return header
+        with self.instrumentation.timed(metrics.PHASE_API_KEY):
+            return api_key_header(self._get_api_key())
 
     def close(self):
         """Logs out and quits the current web driver/selenium session."""
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
         if not self.driver:
             return
 
         self.driver.quit()
         self.driver = None
 
+    def request(self, method, url, **kwargs):
+        with self.instrumentation.timed(
+            metrics.PHASE_REQUEST, method=method, endpoint=urlparse(url).path
+        ) as event:
+            response = self.request_scheduler.request(self._send, method, url, **kwargs)
+            event["status"] = response.status_code
+            event["bytes"] = response_size(response, kwargs.get("stream", False))
+            if (
+                response.status_code == 401
+                and self._api_key is not None
+                and self.driver is not None
+            ):
+                # Read the API key from the browser again next time
+                logger.warning("Unauthorized, refreshing the API key")
+                self._api_key = None
+            return response
+
+    def _send(self, method, url, **kwargs):
+        if self.thread_safe:
+            return self._get_transport().request(method, url, **kwargs)
+        with self._driver_lock:
+            return self.driver.request(method, url, **kwargs)
+
+    def _json(self, response):
+        with self.instrumentation.timed(
+            metrics.PHASE_DECODE, endpoint=urlparse(response.url).path
+        ):
+            return codec.loads(response.content)
+
+    def _get_json(self, url, headers):
+        """
+        GETs `url` and decodes the JSON body.  With a response cache, the
+        request carries the validators of the last response and a 304 Not
+        Modified is answered from the cached body.
+        """
+        headers = dict(headers, **{"Accept-Encoding": ACCEPT_ENCODING})
+        if self.response_cache is None:
+            return self._json(self.get(url, headers=headers))
+
+        headers.update(self.response_cache.conditional_headers(url))
+        response = self.get(url, headers=headers)
+        if response.status_code == 304:
+            cached = self.response_cache.get(url)
+            if cached is not None:
+                logger.debug("{} not modified, using cached copy".format(url))
+                with self.instrumentation.timed(
+                    metrics.PHASE_DECODE, endpoint=urlparse(url).path, cached=True
+                ):
+                    return codec.loads(cached["body"])
+            # Lost the cached copy: ask again, unconditionally this time
+            headers.pop("If-None-Match", None)
+            headers.pop("If-Modified-Since", None)
+            response = self.get(url, headers=headers)
+        data = self._json(response)
+        if response.status_code == 200:
+            self.response_cache.put(
+                url,
+                response.headers.get("ETag"),
+                response.headers.get("Last-Modified"),
+                response.content,
+            )
+        return data
+
     def get(self, url, **kwargs):
-        return self.driver.request("GET", url, **kwargs)
+        return self.request("GET", url, **kwargs)
 
     def post(self, url, **kwargs):
-        return self.driver.request("POST", url, **kwargs)
+        return self.request("POST", url, **kwargs)
 
     def login_and_get_token(
         self,
@@ -164,34 +498,119 @@ class Mint(object):
         wait_for_sync_timeout=5 * 60,
         use_chromedriver_on_path=False,
         chromedriver_download_path=os.getcwd(),
+        login_engine=LOGIN_ENGINE_SELENIUM,
+        driver=None,
     ):
-
-        self.driver = _create_web_driver_at_mint_com(
-            headless, session_path, use_chromedriver_on_path, chromedriver_download_path
-        )
-
-        try:
-            self.status_message = sign_in(
+        """
+        Signs in with selenium, or over plain HTTP without a browser when
+        login_engine is "http" (experimental).  An already started web
+        driver, or a Future of one from mintapi.startup.start_web_driver, is
+        used instead of launching Chrome.
+        """
+        if login_engine not in LOGIN_ENGINES:
+            raise ValueError("Unknown login engine {}".format(login_engine))
+        if login_engine == LOGIN_ENGINE_HTTP:
+            if driver is not None:
+                discard_web_driver(driver)
+            self._http_login(
                 email,
                 password,
-                self.driver,
                 mfa_method,
                 mfa_token,
                 mfa_input_callback,
                 intuit_account,
-                wait_for_sync,
-                wait_for_sync_timeout,
                 imap_account,
                 imap_password,
                 imap_server,
                 imap_folder,
+                wait_for_sync,
+                wait_for_sync_timeout,
+            )
+            return
+
+        with self._driver_lock:
+            if driver is not None:
+                self.driver = resolve_web_driver(driver, self.instrumentation)
+            else:
+                with self.instrumentation.timed(metrics.PHASE_DRIVER):
+                    self.driver = _create_web_driver_at_mint_com(
+                        headless,
+                        session_path,
+                        use_chromedriver_on_path,
+                        chromedriver_download_path,
+                    )
+
+            try:
+                with self.instrumentation.timed(metrics.PHASE_LOGIN):
+                    self.status_message = sign_in(
+                        email,
+                        password,
+                        self.driver,
+                        mfa_method,
+                        mfa_token,
+                        mfa_input_callback,
+                        intuit_account,
+                        wait_for_sync,
+                        wait_for_sync_timeout,
+                        imap_account,
+                        imap_password,
+                        imap_server,
+                        imap_folder,
+                    )
+            except Exception as e:
+                msg = f"Could not sign in to Mint. Current page: {self.driver.current_url}"
+                logger.exception(e)
+                self.driver.quit()
+                self.driver = None
+                raise Exception(msg) from e
+            self._api_key = None
+            self._credit_cookies_loaded = False
+            if self.transport is not None:
+                self.transport.update_cookies(self.driver.get_cookies())
+
+    def _http_login(
+        self,
+        email,
+        password,
+        mfa_method,
+        mfa_token,
+        mfa_input_callback,
+        intuit_account,
+        imap_account,
+        imap_password,
+        imap_server,
+        imap_folder,
+        wait_for_sync,
+        wait_for_sync_timeout,
+    ):
+        # Without a browser, every request goes over the pooled transport,
+        # whose session carries the cookies set while signing in
+        http_login = self.http_login or HttpSignIn()
+        transport = self.transport or PooledTransport(self.pool_size)
+        with self._driver_lock:
+            with self.instrumentation.timed(metrics.PHASE_LOGIN, engine="http"):
+                _, api_key = http_login.sign_in(
+                    email,
+                    password,
+                    mfa_method=mfa_method,
+                    mfa_token=mfa_token,
+                    mfa_input_callback=mfa_input_callback,
+                    intuit_account=intuit_account,
+                    imap_account=imap_account,
+                    imap_password=imap_password,
+                    imap_server=imap_server,
+                    imap_folder=imap_folder or "INBOX",
+                    session=transport.session,
+                )
+            self.transport = transport
+            self.thread_safe = True
+            self._api_key = api_key
+            self._credit_cookies_loaded = False
+        self.status_message = None
+        if wait_for_sync:
+            self.status_message = sync.status_message(
+                self.start_account_sync(timeout=wait_for_sync_timeout).wait()
             )
-        except Exception as e:
-            msg = f"Could not sign in to Mint. Current page: {self.driver.current_url}"
-            logger.exception(e)
-            self.driver.quit()
-            self.driver = None
-            raise Exception(msg) from e
 
     def get_attention(self):
         attention = None
@@ -206,27 +625,86 @@ class Mint(object):
         return attention
 
     def get_bills(self):
-        return self.get(
+        return self._get_json(
             "{}/bps/v2/payer/bills".format(MINT_ROOT_URL),
             headers=self._get_api_key_header(),
-        ).json()["bills"]
+        )["bills"]
 
-    def get_data(self, name, limit, id=None, start_date=None, end_date=None):
+    def get_data(
+        self,
+        name,
+        limit,
+        id=None,
+        start_date=None,
+        end_date=None,
+        where=None,
+        fields=None,
+    ):
+        """
+        Records of the `name` endpoint.  where and fields filter and trim
+        them (see select_records); when either is given the response is
+        parsed as it streams in so that only the records kept are held in
+        memory, unless a response_cache is set (it needs the whole body).
+        """
         endpoint = self.__find_endpoint(name)
-        data = self.__call_mint_endpoint(endpoint, limit, id, start_date, end_date)
-        if name in data.keys():
-            for i in data[name]:
-                if endpoint["includeCreatedDate"]:
-                    i["createdDate"] = i["metaData"]["createdDate"]
-                i["lastUpdatedDate"] = i["metaData"]["lastUpdatedDate"]
-                i.pop("metaData", None)
-        else:
-            raise MintException(
-                "Data from the {} endpoint did not containt the expected {} key.".format(
-                    endpoint["endpoint"], name
+        with self.instrumentation.timed(
+            metrics.PHASE_FETCH, endpoint=endpoint["endpoint"]
+        ) as event:
+            if (
+                where is not None or fields is not None
+            ) and self.response_cache is None:
+                records = list(
+                    self.iter_data(
+                        name,
+                        limit,
+                        id,
+                        start_date,
+                        end_date,
+                        where=where,
+                        fields=fields,
+                    )
                 )
+            else:
+                data = self.__call_mint_endpoint(
+                    endpoint, limit, id, start_date, end_date
+                )
+                records = process_endpoint_data(name, endpoint, data, where, fields)
+            event["records"] = len(records)
+            return records
+
+    def iter_data(
+        self,
+        name,
+        limit,
+        id=None,
+        start_date=None,
+        end_date=None,
+        chunk_size=STREAM_CHUNK_SIZE,
+        where=None,
+        fields=None,
+    ):
+        """
+        Same records as get_data, but parsed incrementally from the response
+        body and yielded one at a time, so the full response is never held
+        in memory.
+        """
+        endpoint = self.__find_endpoint(name)
+        response = self.get(
+            build_endpoint_url(endpoint, limit, id, start_date, end_date),
+            headers=self._get_api_key_header(),
+            stream=True,
+        )
+        try:
+            yield from select_records(
+                endpoint,
+                jsonstream.iter_array(response.iter_content(chunk_size), name),
+                where,
+                fields,
             )
-        return data[name]
+        except jsonstream.KeyNotFoundError:
+            raise missing_key_exception(name, endpoint)
+        finally:
+            response.close()
 
     def get_account_data(
         self,
@@ -240,18 +718,100 @@ class Mint(object):
     ):
         return self.get_data(constants.CATEGORY_KEY, limit)
 
+    def get_category_tree(
+        self,
+        limit=5000,
+        refresh=False,
+    ):
+        """
+        The category hierarchy as a CategoryTree.  It is built from the
+        categories response once and reused for the rest of the session;
+        pass refresh=True after changing categories in Mint.
+        """
+        if self._category_tree is None or refresh:
+            self._category_tree = CategoryTree(self.get_categories(limit))
+        return self._category_tree
+
+    def get_recurring_charges(self, limit=5000, start_date=None):
+        """
+        Recurring charges and subscriptions found in the transactions,
+        matched against get_bills (see RecurringChargeDetector.table).
+        Transactions fetched by earlier calls in the session are kept, so a
+        later call can pass a recent start_date (MM/DD/YY) and only the
+        merchants with new or changed transactions are evaluated again.
+        """
+        self._recurring_charges.add(
+            self.iter_transaction_data(limit=limit, start_date=start_date)
+        )
+        return self._recurring_charges.table(self.get_bills())
+
     def get_budgets(
         self,
         limit=5000,
+        hist=None,
+        max_workers=4,
     ):
-        return self.get_data(
-            constants.BUDGET_KEY,
-            limit,
-            None,
-            start_date=self.__x_months_ago(11),
-            end_date=self.__first_of_this_month(),
+        """
+        Without hist, returns the budgets of the 11-month window ending with
+        the current month.  With hist, returns the budgets of each of the
+        last `hist` months (including the current one), fetched one month
+        per request and concurrently.  Months that have closed are served
+        from closed_month_cache once they have been fetched.
+        """
+        if hist is None:
+            return self.get_data(
+                constants.BUDGET_KEY,
+                limit,
+                None,
+                start_date=self.__x_months_ago(11),
+                end_date=self.__first_of_this_month(),
+            )
+
+        months = [self.__x_months_ago(i) for i in reversed(range(hist))]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            budgets = executor.map(
+                lambda month: self.get_budgets_for_month(month, limit), months
+            )
+            return [budget for month in budgets for budget in month]
+
+    def get_budget_tracker(self, limit=5000, hist=None):
+        """
+        A BudgetTracker of the budgets (see get_budgets for hist) and the
+        transactions of the months they cover.  Keep it and add() newer
+        transactions, or use it as the sink of a ChangeCapture, to refresh
+        budget status without fetching everything again.
+        """
+        budgets = self.get_budgets(limit=limit, hist=hist)
+        months = [
+            budget["budgetDate"] for budget in budgets if budget.get("budgetDate")
+        ]
+        start_date = None
+        if months:
+            start_date = datetime.strptime(min(months)[:10], "%Y-%m-%d")
+        return BudgetTracker(
+            self.get_category_tree(),
+            budgets,
+            self.iter_transaction_data(
+                limit=limit,
+                start_date=start_date and start_date.strftime("%m/%d/%y"),
+            ),
         )
 
+    def get_budgets_for_month(self, month, limit=5000):
+        month = month.replace(day=1)
+        closed = month < self.__first_of_this_month()
+        if closed:
+            budgets = self.closed_month_cache.get(constants.BUDGET_KEY, month)
+            if budgets is not None:
+                return budgets
+        budgets = self.get_data(
+            constants.BUDGET_KEY, limit, None, start_date=month, end_date=month
+        )
+        # A truncated month would be cached incomplete forever
+        if closed and len(budgets) < limit:
+            self.closed_month_cache.put(constants.BUDGET_KEY, month, budgets)
+        return budgets
+
     def get_investment_data(
         self,
         limit=5000,
@@ -269,6 +829,8 @@ class Mint(object):
         end_date=None,
         remove_pending=True,
         id=0,
+        where=None,
+        fields=None,
     ):
         """
         Note: start_date and end_date must be in format mm/dd/yy.
@@ -279,40 +841,103 @@ class Mint(object):
         change dates/amounts after the transactions post. They have been
         removed by default in this pull, but can be included by changing
         remove_pending to False
+
+        where (e.g. a filters.RecordFilter) and fields (a whitelist such as
+        ["date", "amount", "category.name"]) are applied while the
+        transactions are read; see get_data.
         """
 
         try:
             if include_investment:
                 id = 0
+            if where is None and fields is None:
+                data = self.get_data(
+                    constants.TRANSACTION_KEY,
+                    limit,
+                    id,
+                    convert_mmddyy_to_datetime(start_date),
+                    convert_mmddyy_to_datetime(end_date),
+                )
+                if remove_pending:
+                    data = remove_pending_transactions(data)
+                return data
+            id, where = self.__push_down_transaction_filter(id, where, remove_pending)
             data = self.get_data(
                 constants.TRANSACTION_KEY,
                 limit,
                 id,
                 convert_mmddyy_to_datetime(start_date),
                 convert_mmddyy_to_datetime(end_date),
+                where=where,
+                fields=fields,
             )
-            if remove_pending:
-                filtered = filter(
-                    lambda transaction: transaction["isPending"] == False,
-                    data,
-                )
-                data = list(filtered)
         except Exception:
             raise Exception
         return data
 
-    def get_net_worth(self, account_data=None):
+    def iter_transaction_data(
+        self,
+        limit=5000,
+        include_investment=False,
+        start_date=None,
+        end_date=None,
+        remove_pending=True,
+        id=0,
+        where=None,
+        fields=None,
+    ):
+        """
+        Streaming variant of get_transaction_data: transactions are yielded
+        as they are parsed from the response.
+        """
+        if include_investment:
+            id = 0
+        id, where = self.__push_down_transaction_filter(id, where, remove_pending)
+        return self.iter_data(
+            constants.TRANSACTION_KEY,
+            limit,
+            id,
+            convert_mmddyy_to_datetime(start_date),
+            convert_mmddyy_to_datetime(end_date),
+            where=where,
+            fields=fields,
+        )
+
+    def __push_down_transaction_filter(self, id, where, remove_pending):
+        # Mint filters by account itself when given one account id; the
+        # filter still runs locally, it just has less to read.
+        if not id and isinstance(where, filters.RecordFilter):
+            id = where.account_id() or id
+        if remove_pending:
+            where = filters.all_of(is_posted, where)
+        return id, where
+
+    def get_net_worth(self, account_data=None, currency=None, date=None):
+        """
+        Total balance of the active accounts, less loans and credit cards.
+        With currency (default the currency given to Mint), each balance is
+        converted from its account's currency at the rates of date (default
+        today); otherwise balances are added up as they are.
+        """
         if account_data is None:
             account_data = self.get_account_data()
-
-        # account types in this list will be subtracted
-        invert = set(["LoanAccount", "CreditAccount"])
-        return sum(
-            [
-                -a["currentBalance"] if a["type"] in invert else a["currentBalance"]
-                for a in account_data
-                if a["isActive"]
-            ]
+        accounts = [a for a in account_data if a["isActive"]]
+        currency = currency or self.currency
+        if currency is None:
+            currencies = {a.get("currency") or DEFAULT_CURRENCY for a in accounts}
+            if len(currencies) > 1:
+                logger.warning(
+                    "Adding up balances in {} without converting them; pass a "
+                    "currency to convert them".format(", ".join(sorted(currencies)))
+                )
+            return sum(signed_balances(accounts))
+        return float(
+            self.fx_rates.convert(
+                signed_balances(accounts),
+                [a.get("currency") for a in accounts],
+                currency,
+                [date] * len(accounts),
+            ).sum()
         )
 
     def initiate_account_refresh(self):
@@ -320,6 +945,21 @@ class Mint(object):
             url="{}/refreshFILogins.xevent".format(MINT_ROOT_URL), headers=JSON_HEADER
         )
 
+    def start_account_sync(
+        self,
+        poll_interval=10,
+        timeout=5 * 60,
+        refresh=True,
+    ):
+        """
+        Initiates an account refresh and returns a started SyncController
+        right away, which tracks the refresh of each institution through
+        the accounts endpoint.  Sign in with wait_for_sync=False to use it.
+        """
+        return SyncController(self, poll_interval=poll_interval, timeout=timeout).start(
+            refresh=refresh
+        )
+
     def get_credit_score(self):
         # Request a single credit report, and extract the score
         report = self.get_credit_report(
@@ -378,16 +1018,34 @@ class Mint(object):
         # Because cookies are involved and you cannot add cookies for another
         # domain, we have to first load up the MINT_CREDIT_URL.  Once the new
         # domain has loaded, we can proceed with the pull of credit data.
-        return self.driver.get(MINT_CREDIT_URL)
+        with self._driver_lock:
+            if self._credit_cookies_loaded:
+                return
+            if self.driver is None:
+                # Signed in over HTTP: the transport collects the cookies
+                self._get_transport().request("GET", MINT_CREDIT_URL)
+                self._credit_cookies_loaded = True
+                return
+            if self.thread_safe:
+                # Other threads may need the API key, which is only on the
+                # Mint pages: read it first and go back once the cookies
+                # are copied to the transport
+                self._get_api_key()
+                self.driver.get(MINT_CREDIT_URL)
+                self._get_transport().update_cookies(self.driver.get_cookies())
+                self._credit_cookies_loaded = True
+                self.driver.get(MINT_OVERVIEW_URL)
+                return
+            self.driver.get(MINT_CREDIT_URL)
 
     def _get_credit_reports(self, limit, credit_header):
-        return self.get(
+        return self._get_json(
             "{}/v1/creditreports?limit={}".format(MINT_CREDIT_URL, limit),
             headers=credit_header,
-        ).json()
+        )
 
     def _get_credit_details(self, url, credit_header):
-        return self.get(url.format(MINT_CREDIT_URL), headers=credit_header).json()
+        return self._get_json(url.format(MINT_CREDIT_URL), headers=credit_header)
 
     def get_credit_inquiries(self, credit_header):
         return self._get_credit_details(
@@ -407,32 +1065,10 @@ class Mint(object):
         )
 
     def _process_utilization(self, data):
-        # Function to clean up the credit utilization history data
-        utilization = []
-        utilization.extend(self._flatten_utilization(data["cumulative"]))
-        for trade in data["tradelines"]:
-            utilization.extend(self._flatten_utilization(trade))
-        return utilization
+        return process_utilization(data)
 
     def _flatten_utilization(self, data):
-        # The utilization history data has a nested format, grouped by year
-        # and then by month. Let's flatten that into a list of dates.
-        utilization = []
-        name = data.get("creditorName", "Total")
-        for cu in data["creditUtilization"]:
-            year = cu["year"]
-            for cu_month in cu["months"]:
-                date = datetime.strptime(cu_month["name"], "%B").replace(
-                    day=1, year=int(year)
-                )
-                utilization.append(
-                    {
-                        "name": name,
-                        "date": date.strftime("%Y-%m-%d"),
-                        "utilization": cu_month["creditUtilization"],
-                    }
-                )
-        return utilization
+        return flatten_utilization(data)
 
     def __find_endpoint(self, name):
         return ENDPOINTS[name]
@@ -440,28 +1076,14 @@ class Mint(object):
     def __call_mint_endpoint(
         self, endpoint, limit, id=None, start_date=None, end_date=None
     ):
-        url = "{}/{}/{}?limit={}&".format(
-            MINT_ROOT_URL, endpoint["apiVersion"], endpoint["endpoint"], limit
-        )
-        if endpoint["beginningDate"] is not None and start_date is not None:
-            url = url + "{}={}&".format(endpoint["beginningDate"], start_date)
-        if endpoint["endingDate"] is not None and end_date is not None:
-            url = url + "{}={}&".format(endpoint["endingDate"], end_date)
-        if id is not None:
-            url = url + "id={}&".format(id)
-        response = self.get(
-            url,
-            headers=self._get_api_key_header(),
-        )
-        return response.json()
+        url = build_endpoint_url(endpoint, limit, id, start_date, end_date)
+        return self._get_json(url, headers=self._get_api_key_header())
 
     def __first_of_this_month(self):
-        return date.today().replace(day=1)
+        return first_of_this_month()
 
     def __x_months_ago(self, months=2):
-        return (self.__first_of_this_month() - relativedelta(months=months)).replace(
-            day=1
-        )
+        return x_months_ago(months)
 
 
 def get_accounts(email, password, get_detail=False):
@@ -0,0 +1,217 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import getpass
+import json
+import logging
+import os
+import re
+import time
+
+import keyring
+
+from mintapi import constants, profiles
+from mintapi.api import Mint
+from mintapi.signIn import get_stable_chrome_driver
+
+logger = logging.getLogger("mintapi")
+
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_RETRIES = 1
+RETRY_BACKOFF_SECONDS = 5
+
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+
+# Keys of a manifest entry that are passed straight through to Mint()
+MANIFEST_LOGIN_KEYS = [
+    "mfa_method",
+    "mfa_token",
+    "intuit_account",
+    "imap_account",
+    "imap_password",
+    "imap_server",
+    "imap_folder",
+]
+
+FETCHERS = {
+    constants.ACCOUNT_KEY: lambda mint, limit: mint.get_account_data(limit=limit),
+    constants.BUDGET_KEY: lambda mint, limit: mint.get_budgets(limit=limit),
+    constants.CATEGORY_KEY: lambda mint, limit: mint.get_categories(limit=limit),
+    constants.INVESTMENT_KEY: lambda mint, limit: mint.get_investment_data(limit=limit),
+    constants.TRANSACTION_KEY: lambda mint, limit: mint.get_transaction_data(
+        limit=limit
+    ),
+    constants.NET_WORTH_KEY: lambda mint, limit: mint.get_net_worth(),
+    constants.CREDIT_SCORE_KEY: lambda mint, limit: mint.get_credit_score(),
+}
+
+
+def load_manifest(path):
+    """
+    Reads a credentials manifest: a JSON list of objects, each with at least
+    an "email" key.  "password", "session_path" and any of the Mint login
+    options (mfa_method, mfa_token, imap_account, ...) are optional.
+    """
+    with open(path, "r") as f:
+        manifest = json.load(f)
+    if not isinstance(manifest, list):
+        raise ValueError("The batch manifest must be a JSON list of accounts.")
+    for entry in manifest:
+        if not entry.get("email"):
+            raise ValueError("Every batch manifest entry requires an email.")
+    return manifest
+
+
+def entry_password(entry):
+    """
+    The password of a manifest entry: its own, else the one kept in the
+    keyring for its email (as saved by mintapi --keyring), else prompted for.
+    """
+    password = entry.get("password") or keyring.get_password("mintapi", entry["email"])
+    if not password:
+        password = getpass.getpass("Mint password for {}: ".format(entry["email"]))
+    return password
+
+
+def session_path_for(session_root, email):
+    if session_root is None:
+        return None
+    return os.path.join(session_root, re.sub(r"[^A-Za-z0-9_.@-]", "_", email))
+
+
+def fetch_account(entry, types, options):
+    """
+    Signs in to a single Mint account and retrieves each requested type of
+    data.  Runs inside a worker process, so everything it touches must be
+    picklable.
+    """
+    login_options = {key: entry[key] for key in MANIFEST_LOGIN_KEYS if key in entry}
+    session_path = entry.get(
+        "session_path",
+        session_path_for(options.get("session_root"), entry["email"]),
+    )
+    lock = None
+    if session_path is not None:
+        # Never two workers on one profile; new ones start from the template
+        lock = profiles.prepare_profile(
+            session_path,
+            template=options.get("session_template"),
+            prune=options.get("prune_session", False),
+        )
+    try:
+        mint = Mint(
+            entry["email"],
+            entry.get("password"),
+            session_path=session_path,
+            headless=options.get("headless", True),
+            wait_for_sync=options.get("wait_for_sync", True),
+            wait_for_sync_timeout=options.get("wait_for_sync_timeout", 5 * 60),
+            use_chromedriver_on_path=options.get("use_chromedriver_on_path", False),
+            chromedriver_download_path=options.get(
+                "chromedriver_download_path", os.getcwd()
+            ),
+            **login_options,
+        )
+        try:
+            limit = options.get("limit", 5000)
+            return {type: FETCHERS[type](mint, limit) for type in types}
+        finally:
+            mint.close()
+    finally:
+        if lock is not None:
+            lock.release()
+
+
+def _run_account(entry, types, options, retries):
+    attempts = 0
+    while True:
+        attempts += 1
+        try:
+            data = fetch_account(entry, types, options)
+            return {
+                "email": entry["email"],
+                "status": STATUS_OK,
+                "attempts": attempts,
+                "data": data,
+            }
+        except Exception as e:
+            logger.warning(
+                "Batch fetch for {} failed on attempt {}: {}".format(
+                    entry["email"], attempts, e
+                )
+            )
+            if attempts > retries:
+                return {
+                    "email": entry["email"],
+                    "status": STATUS_ERROR,
+                    "attempts": attempts,
+                    "error": repr(e),
+                }
+            time.sleep(RETRY_BACKOFF_SECONDS * attempts)
+
+
+def run_batch(
+    manifest,
+    types,
+    pool_size=DEFAULT_POOL_SIZE,
+    retries=DEFAULT_RETRIES,
+    executor_class=ProcessPoolExecutor,
+    **options
+):
+    """
+    Runs the logins and fetches for every account in the manifest across a
+    bounded pool of worker processes.  A failure in one account never affects
+    the others; it is reported in that account's result instead.  Results are
+    returned in manifest order.  Missing passwords are looked up (see
+    entry_password) before any worker starts, as workers cannot prompt.
+    """
+    unknown = set(types) - set(FETCHERS)
+    if unknown:
+        raise ValueError("Unsupported batch data types: {}".format(sorted(unknown)))
+
+    if not options.get("use_chromedriver_on_path"):
+        # Resolve the chromedriver once up front so that the workers do not
+        # race each other downloading or replacing the same executable.
+        get_stable_chrome_driver(options.get("chromedriver_download_path", os.getcwd()))
+
+    manifest = [dict(entry, password=entry_password(entry)) for entry in manifest]
+    results = [None] * len(manifest)
+    with executor_class(max_workers=max(1, pool_size)) as executor:
+        futures = {
+            executor.submit(_run_account, entry, types, options, retries): i
+            for i, entry in enumerate(manifest)
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                # The worker process itself died (e.g. killed by the OS)
+                results[i] = {
+                    "email": manifest[i]["email"],
+                    "status": STATUS_ERROR,
+                    "attempts": 0,
+                    "error": repr(e),
+                }
+    return results
+
+
+def aggregate_results(results, types):
+    """
+    Merges per-account results into one data set per type.  List data is
+    concatenated with an "email" field added to each record; scalar data
+    becomes one {"email", "value"} record per account.
+    """
+    aggregated = {type: [] for type in types}
+    for result in results:
+        if result["status"] != STATUS_OK:
+            continue
+        for type in types:
+            data = result["data"].get(type)
+            if isinstance(data, list):
+                aggregated[type].extend(
+                    dict(record, email=result["email"]) for record in data
+                )
+            else:
+                aggregated[type].append({"email": result["email"], "value": data})
+    return aggregated
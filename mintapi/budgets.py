@@ -0,0 +1,126 @@
+"""
+Budgets against actual spending, computed locally from transactions instead
+of fetching budgets and transactions and joining them on every refresh.
+"""
+
+from mintapi import cdc
+
+OVER_BUDGET = "OVERBUDGET"
+UNDER_BUDGET = "UNDERBUDGET"
+ON_BUDGET = "ONBUDGET"
+
+INCOME = "INCOME"
+
+
+def _month(value):
+    return str(value)[:7] if value else None
+
+
+class BudgetTracker(object):
+    """
+    Budgets (as returned by get_budgets) compared with the transactions
+    added to the tracker.  Transaction amounts are summed by category and
+    month including every subcategory, through the paths of a CategoryTree,
+    as they are added; each budget is then a lookup of its category and
+    month.  Adding, changing or removing a transaction only touches the
+    totals of its category and that category's ancestors, so evaluate()
+    stays cheap however much history has been added.
+
+    The tracker is also a ChangeCapture sink: passing it the insert,
+    update and delete events of a run keeps it up to date.
+    """
+
+    def __init__(self, category_tree, budgets=(), transactions=()):
+        self.category_tree = category_tree
+        self.totals = {}
+        self._transactions = {}
+        self.set_budgets(budgets)
+        self.add(transactions)
+
+    def __len__(self):
+        return len(self._transactions)
+
+    def set_budgets(self, budgets):
+        """Replaces the budgets, e.g. with the result of a new get_budgets."""
+        self.budgets = [
+            budget
+            for budget in budgets
+            if (budget.get("category") or {}).get("id") is not None
+            and budget.get("budgetDate")
+        ]
+
+    def _apply(self, category, month, amount):
+        for id in self.category_tree.path(category):
+            months = self.totals.setdefault(id, {})
+            months[month] = months.get(month, 0) + amount
+
+    def add(self, transactions):
+        """Adds transactions, replacing any added before with the same id."""
+        for transaction in transactions:
+            self.remove(transaction.get("id"))
+            category = (transaction.get("category") or {}).get("id")
+            month = _month(transaction.get("date"))
+            amount = transaction.get("amount")
+            if category is None or month is None or amount is None:
+                continue
+            entry = (category, month, amount)
+            if transaction.get("id") is not None:
+                self._transactions[transaction["id"]] = entry
+            self._apply(*entry)
+
+    def remove(self, id):
+        entry = self._transactions.pop(id, None)
+        if entry is not None:
+            category, month, amount = entry
+            self._apply(category, month, -amount)
+
+    def __call__(self, event):
+        if event["op"] == cdc.DELETE:
+            self.remove(event["id"])
+        else:
+            self.add([event["record"]])
+
+    def actual(self, category, month):
+        """
+        Net transaction amount of category and its subcategories in month
+        (YYYY-MM); spending is negative.
+        """
+        return self.totals.get(category, {}).get(month, 0)
+
+    def evaluate(self, month=None):
+        """
+        Each budget (of month, YYYY-MM, when given) with its actual amount:
+        what was spent for expense budgets, or received for income budgets,
+        the amount remaining and whether it is over or under budget.
+        """
+        results = []
+        for budget in self.budgets:
+            budget_month = _month(budget["budgetDate"])
+            if month is not None and budget_month != month:
+                continue
+            category = budget["category"]
+            actual = self.actual(category["id"], budget_month)
+            if category.get("categoryType") != INCOME:
+                actual = -actual
+            budgeted = budget.get("budgetAmount") or 0
+            remaining = round(budgeted - actual, 2)
+            if remaining < 0:
+                status = OVER_BUDGET
+            elif remaining > 0:
+                status = UNDER_BUDGET
+            else:
+                status = ON_BUDGET
+            results.append(
+                {
+                    "id": budget.get("id"),
+                    "month": budget_month,
+                    "categoryId": category["id"],
+                    "category": category.get("name"),
+                    "budgeted": budgeted,
+                    "actual": round(actual, 2),
+                    "remaining": remaining,
+                    "percent": round(100 * actual / budgeted, 1) if budgeted else None,
+                    "status": status,
+                }
+            )
+        return results
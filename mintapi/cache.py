@@ -0,0 +1,124 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger("mintapi")
+
+
+class ResponseCache(object):
+    """
+    Remembers the ETag / Last-Modified validators and body of each response
+    by URL, so the next request for that URL can be made conditional and a
+    304 Not Modified served from the local copy.  Entries are kept in memory
+    and, when a path is given, in that directory so they survive restarts.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self.lock = threading.Lock()
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    def _filenames(self, url):
+        name = hashlib.sha256(url.encode()).hexdigest()
+        return (
+            os.path.join(self.path, name + ".json"),
+            os.path.join(self.path, name + ".body"),
+        )
+
+    def get(self, url):
+        with self.lock:
+            entry = self.entries.get(url)
+        if entry is not None or self.path is None:
+            return entry
+        meta_filename, body_filename = self._filenames(url)
+        try:
+            with open(meta_filename, "r") as f:
+                entry = json.load(f)
+            with open(body_filename, "rb") as f:
+                entry["body"] = f.read()
+        except (OSError, ValueError):
+            return None
+        with self.lock:
+            self.entries[url] = entry
+        return entry
+
+    def put(self, url, etag, last_modified, body):
+        if etag is None and last_modified is None:
+            return
+        entry = {"url": url, "etag": etag, "last_modified": last_modified}
+        if self.path is not None:
+            meta_filename, body_filename = self._filenames(url)
+            try:
+                with open(body_filename + ".tmp", "wb") as f:
+                    f.write(body)
+                os.replace(body_filename + ".tmp", body_filename)
+                with open(meta_filename + ".tmp", "w") as f:
+                    json.dump(entry, f)
+                os.replace(meta_filename + ".tmp", meta_filename)
+            except OSError as e:
+                logger.warning("Unable to cache response for {}: {}".format(url, e))
+        entry["body"] = body
+        with self.lock:
+            self.entries[url] = entry
+
+    def conditional_headers(self, url):
+        entry = self.get(url)
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+
+class ClosedMonthCache(object):
+    """
+    Records for calendar months that have already closed.  Those no longer
+    change, so once fetched they are kept for good; only the current month
+    ever needs to be fetched again.  Entries are kept in memory and, when a
+    path is given, as one JSON file per data type and month in that
+    directory.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self.lock = threading.Lock()
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    def _filename(self, name, month):
+        return os.path.join(
+            self.path, "{}_{}.json".format(name.lower(), month.strftime("%Y-%m"))
+        )
+
+    def get(self, name, month):
+        key = (name, month.strftime("%Y-%m"))
+        with self.lock:
+            if key in self.entries:
+                return self.entries[key]
+        if self.path is None:
+            return None
+        try:
+            with open(self._filename(name, month), "r") as f:
+                records = json.load(f)
+        except (OSError, ValueError):
+            return None
+        with self.lock:
+            self.entries[key] = records
+        return records
+
+    def put(self, name, month, records):
+        if self.path is not None:
+            filename = self._filename(name, month)
+            with open(filename + ".tmp", "w") as f:
+                json.dump(records, f)
+            os.replace(filename + ".tmp", filename)
+        with self.lock:
+            self.entries[(name, month.strftime("%Y-%m"))] = records
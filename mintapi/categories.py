@@ -0,0 +1,111 @@
+import logging
+
+logger = logging.getLogger("mintapi")
+
+
+class CategoryTree(object):
+    """
+    The category hierarchy of a get_categories response, built once.  The
+    path from the top-level category down to each category is precomputed,
+    and rollup aggregates transaction amounts up the tree in a single pass
+    over the transactions.
+    """
+
+    def __init__(self, categories):
+        self.categories = {category["id"]: category for category in categories}
+        self.parents = {
+            id: category.get("parentId")
+            for id, category in self.categories.items()
+            if category.get("parentId") in self.categories
+        }
+        self.paths = {}
+        for id in self.categories:
+            self._resolve_path(id)
+
+        self.children = {}
+        for id, parent in self.parents.items():
+            self.children.setdefault(parent, []).append(id)
+        self.roots = [id for id in self.categories if id not in self.parents]
+        # Deepest categories first, so each one is complete before it is
+        # added to its parent
+        self.bottom_up = sorted(
+            self.parents, key=lambda id: len(self.paths[id]), reverse=True
+        )
+
+    def _resolve_path(self, id):
+        # Walk up to the nearest category with a known path, then fill in
+        # the paths on the way back down; each category is visited once.
+        pending = []
+        while id is not None and id not in self.paths:
+            if id in pending:
+                # Break the cycle at the category that closes it
+                logger.warning("Category {} is its own ancestor".format(id))
+                self.parents.pop(pending[-1])
+                id = None
+                break
+            pending.append(id)
+            id = self.parents.get(id)
+        path = self.paths.get(id, ())
+        for id in reversed(pending):
+            path = path + (id,)
+            self.paths[id] = path
+
+    def __contains__(self, id):
+        return id in self.categories
+
+    def __len__(self):
+        return len(self.categories)
+
+    def get(self, id):
+        return self.categories.get(id)
+
+    def path(self, id):
+        """Ids from the top-level category down to (and including) id."""
+        return self.paths.get(id, (id,))
+
+    def ancestors(self, id):
+        return self.path(id)[:-1]
+
+    def path_names(self, id):
+        return [self.categories[ancestor]["name"] for ancestor in self.path(id)]
+
+    def top_level(self, id):
+        return self.path(id)[0]
+
+    def depth(self, id):
+        return len(self.path(id))
+
+    def rollup(self, transactions, by_month=False, depth=None):
+        """
+        Total transaction amount of each category including all of its
+        descendants, as {category id: total}, or with by_month as
+        {category id: {"YYYY-MM": total}}.  depth restricts the result to
+        categories at that depth (1 for top-level).  Transactions are
+        summed per category in one pass, then the totals are pushed up the
+        tree once per category, so the cost does not depend on how many
+        transactions share a category.
+        """
+        totals = {}
+        for transaction in transactions:
+            category = (transaction.get("category") or {}).get("id")
+            amount = transaction.get("amount")
+            if category is None or amount is None:
+                continue
+            bucket = (transaction.get("date") or "")[:7] if by_month else None
+            buckets = totals.setdefault(category, {})
+            buckets[bucket] = buckets.get(bucket, 0) + amount
+
+        for id in self.bottom_up:
+            if id not in totals:
+                continue
+            parent_buckets = totals.setdefault(self.parents[id], {})
+            for bucket, amount in totals[id].items():
+                parent_buckets[bucket] = parent_buckets.get(bucket, 0) + amount
+
+        if depth is not None:
+            totals = {
+                id: buckets for id, buckets in totals.items() if self.depth(id) == depth
+            }
+        if by_month:
+            return totals
+        return {id: buckets[None] for id, buckets in totals.items()}
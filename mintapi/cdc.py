@@ -0,0 +1,154 @@
+import hashlib
+import json
+import logging
+import os
+
+from mintapi import codec
+
+logger = logging.getLogger("mintapi")
+
+INSERT = "insert"
+UPDATE = "update"
+DELETE = "delete"
+
+# The fields of a transaction whose changes are reported; anything else
+# (e.g. lastUpdatedDate or etag) can change without the transaction having
+# changed for a ledger.
+TRANSACTION_FIELDS = [
+    "date",
+    "amount",
+    "description",
+    "accountId",
+    "category",
+    "isPending",
+    "status",
+    "notes",
+    "tagData",
+]
+
+
+def fingerprint(record, fields=TRANSACTION_FIELDS):
+    """A short hash of the given fields of record."""
+    # Always the standard library, so fingerprints do not depend on which
+    # JSON codec is installed
+    values = [record.get(field) for field in fields]
+    encoded = json.dumps(values, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(encoded.encode(), digest_size=8).hexdigest()
+
+
+class FingerprintStore(object):
+    """
+    The fingerprint and date of every transaction seen by the last run,
+    keyed by id.  Kept in memory and, when a path is given, in that JSON
+    file between runs.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        if path is not None and os.path.exists(path):
+            with open(path, "r") as f:
+                self.entries = json.load(f)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, id):
+        return self.entries.get(id)
+
+    def save(self, entries):
+        if self.path is not None:
+            with open(self.path + ".tmp", "w") as f:
+                json.dump(entries, f, separators=(",", ":"))
+            os.replace(self.path + ".tmp", self.path)
+        self.entries = entries
+
+
+class NDJSONSink(object):
+    """Writes each event as one line of JSON."""
+
+    def __init__(self, f):
+        self.f = f
+
+    def __call__(self, event):
+        self.f.write(codec.dumps(event, compact=True) + "\n")
+
+
+class ChangeCapture(object):
+    """
+    Turns each full fetch of transactions into insert, update and delete
+    events against the previous run, passing them to sink (any callable
+    taking an event dict, e.g. an NDJSONSink).  Only a fingerprint per
+    transaction is kept between runs.  The store is only updated once every
+    event of a run has been passed to the sink, so a run that fails part
+    way is replayed in full by the next one.
+    """
+
+    def __init__(self, store, sink, fields=TRANSACTION_FIELDS):
+        self.store = store
+        self.sink = sink
+        self.fields = fields
+
+    def process(self, records, start_date=None, end_date=None, limit=None, where=None):
+        """
+        Emits the changes in records (any iterable, e.g. from
+        iter_transaction_data) and returns the number of events of each
+        kind.  When records only cover start_date to end_date (ISO dates,
+        inclusive), transactions outside that range are not reported as
+        deleted.  Likewise, when there are limit records the fetch may have
+        been cut short, so only transactions from the oldest date received
+        onwards can be reported as deleted.  Records for which where(record)
+        is false (e.g. pending transactions) are left out, but still count
+        towards the limit, so filter with where rather than in the fetch.
+        """
+        counts = {INSERT: 0, UPDATE: 0, DELETE: 0}
+        previous = self.store.entries
+        entries = {}
+        oldest = None
+        received = 0
+        for record in records:
+            received += 1
+            if record.get("date") and (oldest is None or record["date"] < oldest):
+                oldest = record["date"]
+            if where is not None and not where(record):
+                continue
+            id = record["id"]
+            current = fingerprint(record, self.fields)
+            entries[id] = [current, record.get("date")]
+            entry = previous.get(id)
+            if entry is None:
+                op = INSERT
+            elif entry[0] != current:
+                op = UPDATE
+            else:
+                continue
+            self.sink({"op": op, "id": id, "record": record})
+            counts[op] += 1
+
+        if limit is not None and received >= limit and oldest is not None:
+            logger.warning(
+                "Received {} transactions, the limit; not reporting deletions "
+                "before {}".format(received, oldest)
+            )
+            start_date = max(start_date or oldest, oldest)
+
+        for id, entry in previous.items():
+            if id in entries:
+                continue
+            date = entry[1] or ""
+            if (start_date is not None and date < start_date) or (
+                end_date is not None and date > end_date
+            ):
+                # Outside the fetched range, so not seen rather than deleted
+                entries[id] = entry
+                continue
+            self.sink({"op": DELETE, "id": id, "record": None})
+            counts[DELETE] += 1
+
+        self.store.save(entries)
+        logger.info(
+            "{} inserted, {} updated, {} deleted".format(
+                counts[INSERT], counts[UPDATE], counts[DELETE]
+            )
+        )
+        return counts
@@ -1,14 +1,28 @@
 import atexit
 import logging
 import os
+import signal
 import sys
-import json
 import getpass
 from mintapi import constants
 import keyring
 import configargparse
 
-from mintapi.api import Mint
+from mintapi.api import Mint, convert_mmddyy_to_datetime, is_posted
+from mintapi.cache import ClosedMonthCache, ResponseCache
+from mintapi.fx import RateTable
+from mintapi.index import TransactionIndex
+from mintapi import batch
+from mintapi import cdc
+from mintapi import codec
+from mintapi import filters
+from mintapi import holdings
+from mintapi import metrics
+from mintapi import partitions
+from mintapi import profiles
+from mintapi import scheduler
+from mintapi import startup
+from mintapi.throttle import RequestScheduler
 from mintapi.signIn import get_email_code
 from pandas import json_normalize
 
@@ -49,6 +63,29 @@ def parse_arguments(args):
                 "help": "Display accounts that need attention (None if none).",
             },
         ),
+        (
+            ("--batch-manifest",),
+            {
+                "default": None,
+                "help": "Path to a JSON list of accounts to retrieve in one batch. Each entry requires an email and may include a password, session_path, and MFA/IMAP options.",
+            },
+        ),
+        (
+            ("--batch-retries",),
+            {
+                "type": int,
+                "default": 1,
+                "help": "Number of times to retry a failed account in a batch.  Used with --batch-manifest.",
+            },
+        ),
+        (
+            ("--batch-workers",),
+            {
+                "type": int,
+                "default": 4,
+                "help": "Number of accounts to sign in to concurrently.  Used with --batch-manifest.",
+            },
+        ),
         (
             ("--budgets",),
             {
@@ -67,6 +104,15 @@ def parse_arguments(args):
                 "help": "Retrieve 12-month budget history information",
             },
         ),
+        (
+            ("--cadence",),
+            {
+                "action": "append",
+                "default": [],
+                "metavar": "TYPE=SECONDS",
+                "help": "How often --daemon retrieves a type of data, e.g. transaction=900.  Defaults are 15 minutes for transactions, hourly for accounts, budgets, investments and net worth, daily for categories and weekly for credit data",
+            },
+        ),
         (
             ("--categories",),
             {
@@ -75,6 +121,13 @@ def parse_arguments(args):
                 "help": "Retrieve category definitions as configured in Mint",
             },
         ),
+        (
+            ("--changes-state",),
+            {
+                "default": None,
+                "help": "File that keeps a fingerprint of each transaction between runs.  When given, only the transactions inserted, updated or deleted since the last run are written, as newline-delimited JSON change events.  Used with --transactions",
+            },
+        ),
         (
             ("--chromedriver-download-path",),
             {
@@ -82,6 +135,14 @@ def parse_arguments(args):
                 "help": "The directory to download chromedrive to.",
             },
         ),
+        (
+            ("--compact",),
+            {
+                "action": "store_true",
+                "default": False,
+                "help": "Write JSON without indentation, which is smaller and faster to write",
+            },
+        ),
         (
             ("--config-file", "-c"),
             {
@@ -108,6 +169,21 @@ def parse_arguments(args):
                 "help": "Retrieve current credit score",
             },
         ),
+        (
+            ("--currency",),
+            {
+                "default": None,
+                "help": "Report net worth in this currency (e.g. USD), converting each account's balance from its own currency at today's exchange rates.  Used with --net-worth",
+            },
+        ),
+        (
+            ("--daemon",),
+            {
+                "action": "store_true",
+                "default": False,
+                "help": "Keep running and retrieve each selected type of data on its own cadence (see --cadence) with a single login, until interrupted",
+            },
+        ),
         (
             ("--end-date",),
             {
@@ -140,6 +216,13 @@ def parse_arguments(args):
                 "help": "When accessing credit report details, exclude data related to credit utilization.  Used with --credit-report.",
             },
         ),
+        (
+            ("--fields",),
+            {
+                "default": None,
+                "help": "Comma-separated list of the transaction fields to keep, e.g. date,amount,category.name.  Other fields are dropped as the transactions are read.  Used with --transactions",
+            },
+        ),
         (
             ("--filename", "-f"),
             {
@@ -154,6 +237,13 @@ def parse_arguments(args):
                 "help": "The format used to return data.",
             },
         ),
+        (
+            ("--fx-cache-path",),
+            {
+                "default": None,
+                "help": "Directory in which to keep the exchange rates fetched for --currency, one file per date, so that each date is only fetched once.",
+            },
+        ),
         (
             ("--headless",),
             {
@@ -161,6 +251,27 @@ def parse_arguments(args):
                 "help": "Whether to execute chromedriver with no visible window.",
             },
         ),
+        (
+            ("--history-cache-path",),
+            {
+                "default": None,
+                "help": "Directory in which to keep data for months that have closed, such as budget history, so that it is only fetched once.",
+            },
+        ),
+        (
+            ("--holdings-store",),
+            {
+                "default": None,
+                "help": "Directory in which to keep a history of investment holdings.  Each run with --investments adds the holdings whose quantity or price changed since the last one.",
+            },
+        ),
+        (
+            ("--http-cache-path",),
+            {
+                "default": None,
+                "help": "Directory in which to keep the last response from each endpoint.  Later runs send conditional requests and reuse the kept copy when Mint reports no change.",
+            },
+        ),
         (("--imap-account",), {"default": None, "help": "IMAP login account"}),
         (("--imap-folder",), {"default": "INBOX", "help": "IMAP folder"}),
         (("--imap-password",), {"default": None, "help": "IMAP login password"}),
@@ -200,6 +311,22 @@ def parse_arguments(args):
                 "help": "Number of records to include from the API.  Default is 5000.",
             },
         ),
+        (
+            ("--max-requests-per-second",),
+            {
+                "type": float,
+                "default": 10.0,
+                "help": "Upper bound on the rate of requests sent to Mint.  It is lowered automatically when Mint throttles us.  Default is 10.",
+            },
+        ),
+        (
+            ("--max-retries",),
+            {
+                "type": int,
+                "default": 4,
+                "help": "Number of times to retry a request that failed with a connection error or a 429/5xx status.  Default is 4.",
+            },
+        ),
         (
             ("--mfa-method",),
             {
@@ -229,6 +356,43 @@ def parse_arguments(args):
                 "help": "By default, mint api will wait for accounts to sync with the backing financial institutions. If this flag is present, do not wait for them to sync.",
             },
         ),
+        (
+            ("--partitioned",),
+            {
+                "action": "store_true",
+                "help": "Write transactions to one file per month under the {filename}_transaction directory, in year=YYYY/month=MM partitions, rewriting only the months that changed since the last run. Used with --transactions and --filename",
+            },
+        ),
+        (
+            ("--prometheus-file",),
+            {
+                "default": None,
+                "help": "Write request and phase timing metrics to this file in the Prometheus text format.",
+            },
+        ),
+        (
+            ("--prune-session",),
+            {
+                "action": "store_true",
+                "help": "Delete the caches Chrome keeps in --session-path before starting it, keeping the cookies and local storage that avoid MFA prompts.",
+            },
+        ),
+        (
+            ("--refresh-max-age",),
+            {
+                "type": int,
+                "default": scheduler.DEFAULT_REFRESH_MAX_AGE,
+                "help": "Used with --daemon.  Ask Mint to refresh accounts once one has not been updated for this many seconds (default is 3600)",
+            },
+        ),
+        (
+            ("--request-timeout",),
+            {
+                "type": float,
+                "default": 60,
+                "help": "Number of seconds to wait for each response from Mint.  Default is 60.",
+            },
+        ),
         (
             ("--session-path",),
             {
@@ -237,6 +401,13 @@ def parse_arguments(args):
                 "help": "Directory to save browser session, including cookies. Used to prevent repeated MFA prompts. Defaults to $HOME/.mintapi/session.  Set to None to use a temporary profile.",
             },
         ),
+        (
+            ("--session-template",),
+            {
+                "default": None,
+                "help": "Directory of a template browser session. A --session-path (or, with --batch-manifest, each account's session) that does not exist yet is cloned from it, and after a successful sign in the template is refreshed from --session-path.",
+            },
+        ),
         # Displayed to the user as a postive switch, but processed back here as a negative
         (
             ("--show-pending",),
@@ -254,6 +425,29 @@ def parse_arguments(args):
                 "help": "Earliest date for transactions to be retrieved from. Used with --transactions. Format: mm/dd/yy",
             },
         ),
+        (
+            ("--statsd-address",),
+            {
+                "default": None,
+                "help": "Send request and phase timing metrics to a StatsD server at HOST:PORT.",
+            },
+        ),
+        (
+            ("--stream",),
+            {
+                "action": "store_true",
+                "default": False,
+                "help": "Parse and write transactions one at a time instead of loading them all into memory.  Only applies to the json format.  Used with --transactions",
+            },
+        ),
+        (
+            ("--timings",),
+            {
+                "action": "store_true",
+                "default": False,
+                "help": "Print a summary of where time was spent to stderr when finished.",
+            },
+        ),
         (
             ("--transactions", "-t"),
             {"action": "store_true", "default": False, "help": "Retrieve transactions"},
@@ -308,13 +502,112 @@ def format_filename(options, type):
     return filename
 
 
-def output_data(options, data, type, attention_msg=None):
+def iso_date(mmddyy):
+    """A --start-date or --end-date (MM/DD/YY) as YYYY-MM-DD, or None."""
+    date = convert_mmddyy_to_datetime(mmddyy)
+    return None if date is None else date.date().isoformat()
+
+
+def output_data(options, data, type, attention_msg=None, instrumentation=None):
+    if instrumentation is None:
+        instrumentation = metrics.Instrumentation()
+    records = len(data) if isinstance(data, list) else None
+    with instrumentation.timed(metrics.PHASE_OUTPUT, endpoint=type, records=records):
+        write_data(options, data, type)
+
+    if options.attention:
+        if attention_msg is None or attention_msg == "":
+            attention_msg = "no messages"
+        if options.filename is None:
+            print(attention_msg)
+        else:
+            with open(options.filename, "w+", encoding="utf-8") as f:
+                f.write(attention_msg)
+
+
+def write_json_stream(records, f, compact=False):
+    """
+    Writes an iterable of records as an indented JSON array (or with one
+    record per line when compact), one record at a time, so the records
+    never need to be in memory all at once.
+    """
+    f.write("[")
+    for i, record in enumerate(records):
+        if compact:
+            f.write(",\n" if i else "\n")
+            f.write(codec.dumps(record, compact=True))
+        else:
+            f.write(",\n  " if i else "\n  ")
+            f.write(codec.dumps(record).replace("\n", "\n  "))
+    f.write("\n]\n")
+
+
+def write_transaction_changes(options, records, where=None):
+    if options.filename is None:
+        return capture_transaction_changes(options, records, sys.stdout, where)
+    filename = "{}_{}_changes.ndjson".format(
+        options.filename, constants.TRANSACTION_KEY.lower()
+    )
+    with open(filename, "a", encoding="utf-8") as f:
+        return capture_transaction_changes(options, records, f, where)
+
+
+def record_holdings(options, data):
+    if options.holdings_store:
+        holdings.HoldingsStore(options.holdings_store).record(data)
+
+
+def write_partitioned_transactions(options, records):
+    # Pending transactions are dropped here rather than by the fetch, so
+    # that a fetch cut short at --limit is still recognised as such
+    received = len(records)
+    if options.show_pending:
+        records = [record for record in records if is_posted(record)]
+    if options.fields is not None:
+        spec = filters.parse_fields(options.fields)
+        records = [filters.project(record, spec) for record in records]
+
+    root = "{}_{}".format(options.filename, constants.TRANSACTION_KEY.lower())
+    export = partitions.PartitionedExport(root, format=options.format)
+    return export.write(
+        records,
+        start_date=iso_date(options.start_date),
+        end_date=iso_date(options.end_date),
+        limit=options.limit,
+        received=received,
+    )
+
+
+def capture_transaction_changes(options, records, f, where=None):
+    capture = cdc.ChangeCapture(
+        cdc.FingerprintStore(options.changes_state), cdc.NDJSONSink(f)
+    )
+    return capture.process(
+        records,
+        start_date=iso_date(options.start_date),
+        end_date=iso_date(options.end_date),
+        limit=options.limit,
+        where=where,
+    )
+
+
+def write_data(options, data, type):
     filename = format_filename(options, type)
+    if hasattr(data, "__next__"):
+        # A stream of records, e.g. from Mint.iter_transaction_data
+        if options.format != constants.JSON_FORMAT:
+            data = list(data)
+        elif filename is None:
+            return write_json_stream(data, sys.stdout, options.compact)
+        else:
+            with open(filename, "w+", encoding="utf-8") as f:
+                return write_json_stream(data, f, options.compact)
+
     if filename is None:
         if options.format == constants.CSV_FORMAT:
             print(json_normalize(data).to_csv(index=False))
         else:
-            print(json.dumps(data, indent=2))
+            print(codec.dumps(data, options.compact))
         # NOTE: While this logic is here, unless validate_file_extensions
         #       allows for other data types to export to CSV, this will
         #       only include investment data.
@@ -324,22 +617,211 @@ def output_data(options, data, type, attention_msg=None):
         #       other non-flat JSON data, we will need to revisit this.
         json_normalize(data).to_csv(filename, index=False)
     elif options.format == constants.JSON_FORMAT:
-        with open(filename, "w+") as f:
-            json.dump(data, f, indent=2)
+        with open(filename, "w+", encoding="utf-8") as f:
+            codec.dump(data, f, options.compact)
 
-    if options.attention:
-        if attention_msg is None or attention_msg == "":
-            attention_msg = "no messages"
-        if options.filename is None:
-            print(attention_msg)
+
+def setup_instrumentation(options):
+    instrumentation = metrics.Instrumentation()
+    if options.timings:
+        timings = instrumentation.add_hook(metrics.TimingsCollector())
+        timeline = instrumentation.add_hook(metrics.StartupTimeline())
+        atexit.register(lambda: print(timings.summary(), file=sys.stderr))
+        atexit.register(lambda: print(timeline.render(), file=sys.stderr))
+    if options.prometheus_file:
+        exporter = instrumentation.add_hook(metrics.PrometheusExporter())
+        atexit.register(exporter.write, options.prometheus_file)
+    if options.statsd_address:
+        host, _, port = options.statsd_address.partition(":")
+        instrumentation.add_hook(metrics.StatsdExporter(host, port or 8125))
+    return instrumentation
+
+
+def selected_types(options):
+    return [
+        type
+        for type, selected in [
+            (constants.ACCOUNT_KEY, options.accounts),
+            (constants.BUDGET_KEY, options.budgets),
+            (constants.TRANSACTION_KEY, options.transactions),
+            (constants.CATEGORY_KEY, options.categories),
+            (constants.INVESTMENT_KEY, options.investments),
+            (constants.NET_WORTH_KEY, options.net_worth),
+            (constants.CREDIT_SCORE_KEY, options.credit_score),
+        ]
+        if selected
+    ] or [constants.ACCOUNT_KEY]
+
+
+def run_batch(options):
+    manifest = batch.load_manifest(options.batch_manifest)
+    for entry in manifest:
+        entry["password"] = handle_password(
+            "mintapi",
+            "Mint password: ",
+            entry["email"],
+            entry.get("password"),
+            options.keyring,
+        )
+
+    if options.session_path == "None":
+        session_root = None
+    else:
+        session_root = options.session_path
+
+    types = selected_types(options)
+    results = batch.run_batch(
+        manifest,
+        types,
+        pool_size=options.batch_workers,
+        retries=options.batch_retries,
+        session_root=session_root,
+        headless=options.headless,
+        wait_for_sync=not options.no_wait_for_sync,
+        wait_for_sync_timeout=options.wait_for_sync_timeout,
+        use_chromedriver_on_path=options.use_chromedriver_on_path,
+        chromedriver_download_path=options.chromedriver_download_path,
+        limit=options.limit,
+        session_template=options.session_template,
+        prune_session=options.prune_session,
+    )
+    for result in results:
+        if result["status"] != batch.STATUS_OK:
+            logger.error(
+                "Unable to retrieve data for {}: {}".format(
+                    result["email"], result["error"]
+                )
+            )
+
+    aggregated = batch.aggregate_results(results, types)
+    for type in types:
+        output_data(options, aggregated[type], type)
+
+
+def parse_cadences(values):
+    types = {type.lower(): type for type in scheduler.DEFAULT_CADENCES}
+    cadences = {}
+    for value in values:
+        name, _, seconds = value.partition("=")
+        if name.lower() not in types or not seconds.isdigit():
+            raise ValueError(
+                "Invalid --cadence {}; expected TYPE=SECONDS with TYPE one of {}".format(
+                    value, ", ".join(types)
+                )
+            )
+        cadences[types[name.lower()]] = int(seconds)
+    return cadences
+
+
+def run_daemon(options, mint, instrumentation, cadences):
+    types = selected_types(options)
+    if options.credit_report:
+        types.append(constants.CREDIT_REPORT_KEY)
+
+    fetchers = {}
+    if options.changes_state:
+        fetchers[constants.TRANSACTION_KEY] = lambda mint, limit: (
+            mint.get_transaction_data(limit=limit, remove_pending=False)
+        )
+
+    def output(type, data):
+        if type == constants.INVESTMENT_KEY:
+            record_holdings(options, data)
+        if type == constants.TRANSACTION_KEY and options.changes_state:
+            # Fetched with pending transactions, which are dropped here so
+            # that a fetch cut short at the limit is recognised as such
+            write_transaction_changes(options, iter(data), where=is_posted)
         else:
-            with open(options.filename, "w+") as f:
-                f.write(attention_msg)
+            output_data(options, data, type, instrumentation=instrumentation)
+
+    daemon = scheduler.schedule_mint(
+        scheduler.Scheduler(),
+        mint,
+        types,
+        output,
+        cadences=cadences,
+        limit=options.limit,
+        refresh_max_age=options.refresh_max_age,
+        fetchers=fetchers,
+    )
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+    try:
+        daemon.run_forever()
+    except KeyboardInterrupt:
+        daemon.stop()
+
+
+def parse_query_arguments(args):
+    parser = configargparse.ArgumentParser(
+        prog="mintapi query",
+        description="Query transactions previously exported with --transactions",
+    )
+    parser.add_argument(
+        "transactions_file", help="JSON file written by mintapi --transactions"
+    )
+    parser.add_argument("--id", help="Look up a single transaction by id")
+    parser.add_argument("--account", help="Account id or name")
+    parser.add_argument("--category", help="Category id or name")
+    parser.add_argument("--merchant", help="Merchant (transaction description)")
+    parser.add_argument(
+        "--start-date", help="Earliest transaction date. Format: mm/dd/yy"
+    )
+    parser.add_argument("--end-date", help="Latest transaction date. Format: mm/dd/yy")
+    parser.add_argument("--min-amount", type=float, help="Smallest amount")
+    parser.add_argument("--max-amount", type=float, help="Largest amount")
+    parser.add_argument("--limit", type=int, help="Number of transactions to return")
+    parser.add_argument(
+        "--format",
+        choices=[constants.JSON_FORMAT, constants.CSV_FORMAT],
+        default=constants.JSON_FORMAT,
+        help="The output format of the matching transactions",
+    )
+    parser.add_argument(
+        "--filename",
+        "-f",
+        help="Write results to file (the extension is added based on --format)",
+    )
+    parser.add_argument(
+        "--compact", action="store_true", help="Write JSON without indentation"
+    )
+    options = parser.parse_args(args)
+    options.attention = False
+    return options
+
+
+def query_main(args):
+    options = parse_query_arguments(args)
+    with open(options.transactions_file, "r", encoding="utf-8") as f:
+        index = TransactionIndex(codec.loads(f.read()))
+
+    if options.id is not None:
+        transaction = index.get(options.id)
+        results = [] if transaction is None else [transaction]
+    else:
+        results = index.query(
+            account=options.account,
+            category=options.category,
+            merchant=options.merchant,
+            start_date=convert_mmddyy_to_datetime(options.start_date),
+            end_date=convert_mmddyy_to_datetime(options.end_date),
+            min_amount=options.min_amount,
+            max_amount=options.max_amount,
+            limit=options.limit,
+        )
+    output_data(options, results, constants.TRANSACTION_KEY)
 
 
 def main():
+    if sys.argv[1:2] == ["query"]:
+        query_main(sys.argv[2:])
+        return
+
     options = parse_arguments(sys.argv[1:])
 
+    if options.batch_manifest:
+        run_batch(options)
+        return
+
     # Try to get the e-mail and password from the arguments
     email = options.email
     password = options.password
@@ -347,22 +829,58 @@ def main():
     imap_password = options.imap_password
     mfa_method = options.mfa_method
 
-    if not email:
-        # If the user did not provide an e-mail, prompt for it
-        email = input("Mint e-mail: ")
+    if options.session_path == "None":
+        session_path = None
+    else:
+        session_path = options.session_path
 
-    password = handle_password(
-        "mintapi", "Mint password: ", email, password, options.keyring
-    )
+    instrumentation = setup_instrumentation(options)
+    # Checked before signing in
+    cadences = parse_cadences(options.cadence)
+    if options.partitioned and options.filename is None:
+        raise ValueError("--partitioned needs a --filename to write under")
 
-    if imap_account:
-        imap_password = handle_password(
-            "mintapi_imap",
-            "IMAP password: ",
-            imap_account,
-            imap_password,
-            options.keyring,
+    # Start Chrome and load mint.com while the credentials are fetched
+    if session_path is not None:
+        # Held until exit, after Chrome has quit
+        lock = profiles.prepare_profile(
+            session_path, options.session_template, options.prune_session
         )
+        atexit.register(lock.release)
+    driver = startup.start_web_driver(
+        headless=options.headless,
+        session_path=session_path,
+        use_chromedriver_on_path=options.use_chromedriver_on_path,
+        chromedriver_download_path=options.chromedriver_download_path,
+        instrumentation=instrumentation,
+    )
+
+    try:
+        if not email:
+            # If the user did not provide an e-mail, prompt for it
+            email = input("Mint e-mail: ")
+
+        with instrumentation.timed(
+            metrics.PHASE_STARTUP, endpoint=startup.STAGE_MINT_PASSWORD
+        ):
+            password = handle_password(
+                "mintapi", "Mint password: ", email, password, options.keyring
+            )
+
+        if imap_account:
+            with instrumentation.timed(
+                metrics.PHASE_STARTUP, endpoint=startup.STAGE_IMAP_PASSWORD
+            ):
+                imap_password = handle_password(
+                    "mintapi_imap",
+                    "IMAP password: ",
+                    imap_account,
+                    imap_password,
+                    options.keyring,
+                )
+    except BaseException:
+        startup.discard_web_driver(driver)
+        raise
 
     if not any(
         [
@@ -379,11 +897,6 @@ def main():
     ):
         options.accounts = True
 
-    if options.session_path == "None":
-        session_path = None
-    else:
-        session_path = options.session_path
-
     mint = Mint(
         email,
         password,
@@ -399,7 +912,27 @@ def main():
         wait_for_sync_timeout=options.wait_for_sync_timeout,
         use_chromedriver_on_path=options.use_chromedriver_on_path,
         chromedriver_download_path=options.chromedriver_download_path,
+        driver=driver,
+        # The daemon's jobs run on several threads
+        thread_safe=options.daemon,
+        currency=options.currency,
+        fx_rates=RateTable(path=options.fx_cache_path),
+        request_scheduler=RequestScheduler(
+            rate=options.max_requests_per_second,
+            max_retries=options.max_retries,
+            timeout=options.request_timeout,
+        ),
+        instrumentation=instrumentation,
+        response_cache=(
+            ResponseCache(options.http_cache_path) if options.http_cache_path else None
+        ),
+        closed_month_cache=ClosedMonthCache(options.history_cache_path),
     )
+    if options.session_template and session_path and mint.driver is not None:
+        # Signed in, so worth keeping; saved once Chrome has quit
+        atexit.register(
+            profiles.snapshot_profile, session_path, options.session_template
+        )
     atexit.register(mint.close)  # Ensure everything is torn down.
 
     if options.imap_test:
@@ -413,50 +946,95 @@ def main():
         print("MFA CODE:", mfa_code)
         sys.exit()
 
+    if options.daemon:
+        run_daemon(options, mint, instrumentation, cadences)
+        return
+
     attention_msg = None
     if options.attention:
         attention_msg = mint.get_attention()
 
     if options.accounts:
         data = mint.get_account_data(limit=options.limit)
-        output_data(options, data, constants.ACCOUNT_KEY, attention_msg)
+        output_data(
+            options, data, constants.ACCOUNT_KEY, attention_msg, instrumentation
+        )
 
     if options.budgets:
         data = mint.get_budgets(limit=options.limit)
-        output_data(options, data, constants.BUDGET_KEY, attention_msg)
+        output_data(options, data, constants.BUDGET_KEY, attention_msg, instrumentation)
     elif options.budget_hist:
         data = mint.get_budgets(limit=options.limit, hist=12)
-        output_data(options, data, constants.BUDGET_KEY, attention_msg)
+        output_data(options, data, constants.BUDGET_KEY, attention_msg, instrumentation)
 
-    if options.transactions:
-        data = mint.get_transaction_data(
+    if options.transactions and options.changes_state:
+        records = mint.iter_transaction_data(
+            limit=options.limit,
+            start_date=options.start_date,
+            end_date=options.end_date,
+            include_investment=options.include_investment,
+            remove_pending=False,
+        )
+        write_transaction_changes(
+            options, records, where=is_posted if options.show_pending else None
+        )
+    elif options.transactions and options.partitioned:
+        records = mint.get_transaction_data(
+            limit=options.limit,
+            start_date=options.start_date,
+            end_date=options.end_date,
+            include_investment=options.include_investment,
+            remove_pending=False,
+        )
+        with instrumentation.timed(
+            metrics.PHASE_OUTPUT, endpoint=constants.TRANSACTION_KEY
+        ):
+            write_partitioned_transactions(options, records)
+    elif options.transactions:
+        if options.stream:
+            get_transactions = mint.iter_transaction_data
+        else:
+            get_transactions = mint.get_transaction_data
+        data = get_transactions(
             limit=options.limit,
             start_date=options.start_date,
             end_date=options.end_date,
             include_investment=options.include_investment,
             remove_pending=options.show_pending,
+            fields=options.fields,
+        )
+        output_data(
+            options, data, constants.TRANSACTION_KEY, attention_msg, instrumentation
         )
-        output_data(options, data, constants.TRANSACTION_KEY, attention_msg)
 
     if options.categories:
         data = mint.get_categories(
             limit=options.limit,
         )
-        output_data(options, data, constants.CATEGORY_KEY, attention_msg)
+        output_data(
+            options, data, constants.CATEGORY_KEY, attention_msg, instrumentation
+        )
 
     if options.investments:
         data = mint.get_investment_data(
             limit=options.limit,
         )
-        output_data(options, data, constants.INVESTMENT_KEY, attention_msg)
+        record_holdings(options, data)
+        output_data(
+            options, data, constants.INVESTMENT_KEY, attention_msg, instrumentation
+        )
 
     if options.net_worth:
         data = mint.get_net_worth()
-        output_data(options, data, constants.NET_WORTH_KEY, attention_msg)
+        output_data(
+            options, data, constants.NET_WORTH_KEY, attention_msg, instrumentation
+        )
 
     if options.credit_score:
         data = mint.get_credit_score()
-        output_data(options, data, constants.CREDIT_SCORE_KEY, attention_msg)
+        output_data(
+            options, data, constants.CREDIT_SCORE_KEY, attention_msg, instrumentation
+        )
 
     if options.credit_report:
         data = mint.get_credit_report(
@@ -465,4 +1043,6 @@ def main():
             exclude_accounts=options.exclude_accounts,
             exclude_utilization=options.exclude_utilization,
         )
-        output_data(options, data, constants.CREDIT_REPORT_KEY, attention_msg)
+        output_data(
+            options, data, constants.CREDIT_REPORT_KEY, attention_msg, instrumentation
+        )
@@ -0,0 +1,93 @@
+"""
+JSON encoding and decoding through the fastest library installed: orjson,
+then ujson, then the standard library.  Install mintapi[fast] for orjson.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+class StdlibCodec(object):
+    name = "json"
+
+    def loads(self, data):
+        return json.loads(data)
+
+    def dumps(self, obj, compact=False):
+        if compact:
+            return json.dumps(obj, separators=(",", ":"))
+        return json.dumps(obj, indent=2)
+
+
+class OrjsonCodec(object):
+    name = "orjson"
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+    def dumps(self, obj, compact=False):
+        try:
+            return orjson.dumps(
+                obj, option=0 if compact else orjson.OPT_INDENT_2
+            ).decode()
+        except TypeError:
+            # e.g. integers over 64 bits, or keys that are not strings
+            return STDLIB.dumps(obj, compact)
+
+
+class UjsonCodec(object):
+    name = "ujson"
+
+    def loads(self, data):
+        return ujson.loads(data)
+
+    def dumps(self, obj, compact=False):
+        try:
+            return ujson.dumps(obj, indent=0 if compact else 2)
+        except (TypeError, OverflowError):
+            return STDLIB.dumps(obj, compact)
+
+
+STDLIB = StdlibCodec()
+CODECS = {STDLIB.name: STDLIB}
+if orjson is not None:
+    CODECS[OrjsonCodec.name] = OrjsonCodec()
+if ujson is not None:
+    CODECS[UjsonCodec.name] = UjsonCodec()
+
+codec = CODECS.get("orjson") or CODECS.get("ujson") or STDLIB
+
+
+def set_codec(name):
+    """Selects the codec by name: "orjson", "ujson" or "json"."""
+    global codec
+    if name not in CODECS:
+        raise ValueError(
+            "JSON codec {} is not installed; available: {}".format(
+                name, ", ".join(CODECS)
+            )
+        )
+    codec = CODECS[name]
+    return codec
+
+
+def loads(data):
+    return codec.loads(data)
+
+
+def dumps(obj, compact=False):
+    """Indented by two spaces, or on a single line when compact."""
+    return codec.dumps(obj, compact)
+
+
+def dump(obj, f, compact=False):
+    f.write(dumps(obj, compact))
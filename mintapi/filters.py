@@ -0,0 +1,89 @@
+class RecordFilter(object):
+    """
+    Predicates on the records of an endpoint, applied while they are
+    processed so that only the records kept are ever collected.  pending
+    keeps only pending (True) or only posted (False) transactions; accounts
+    and categories are sets of ids (categories also match by name); amounts
+    are inclusive bounds.
+    """
+
+    def __init__(
+        self,
+        pending=None,
+        accounts=None,
+        categories=None,
+        min_amount=None,
+        max_amount=None,
+    ):
+        self.pending = pending
+        self.accounts = None if accounts is None else set(accounts)
+        self.categories = None if categories is None else set(categories)
+        self.min_amount = min_amount
+        self.max_amount = max_amount
+
+    def account_id(self):
+        """The account to request from Mint, when exactly one is selected."""
+        if self.accounts is not None and len(self.accounts) == 1:
+            return next(iter(self.accounts))
+        return None
+
+    def __call__(self, record):
+        if self.pending is not None and record.get("isPending") != self.pending:
+            return False
+        if self.accounts is not None and record.get("accountId") not in self.accounts:
+            return False
+        if self.categories is not None:
+            category = record.get("category") or {}
+            if (
+                category.get("id") not in self.categories
+                and category.get("name") not in self.categories
+            ):
+                return False
+        amount = record.get("amount")
+        if self.min_amount is not None and (amount is None or amount < self.min_amount):
+            return False
+        if self.max_amount is not None and (amount is None or amount > self.max_amount):
+            return False
+        return True
+
+
+def all_of(*predicates):
+    predicates = [predicate for predicate in predicates if predicate is not None]
+    if len(predicates) == 1:
+        return predicates[0]
+    return lambda record: all(predicate(record) for predicate in predicates)
+
+
+def parse_fields(fields):
+    """
+    Turns a field whitelist such as ["date", "amount", "category.name"] into
+    a nested dict of the keys to keep: {"date": None, "amount": None,
+    "category": {"name": None}}.
+    """
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    spec = {}
+    for field in fields:
+        keys = field.strip().split(".")
+        node = spec
+        for key in keys[:-1]:
+            if key in node and node[key] is None:
+                # The whole of key is already kept
+                break
+            node = node.setdefault(key, {})
+        else:
+            node[keys[-1]] = None
+    return spec
+
+
+def project(record, spec):
+    """A copy of record with only the keys in spec (see parse_fields)."""
+    projected = {}
+    for key, children in spec.items():
+        if key not in record:
+            continue
+        value = record[key]
+        if children is not None and isinstance(value, dict):
+            value = project(value, children)
+        projected[key] = value
+    return projected
@@ -0,0 +1,140 @@
+"""
+Exchange rates for converting balances held in several currencies, looked up
+per date from a pluggable provider and cached in memory and on disk.
+"""
+
+from datetime import date, datetime
+import json
+import os
+import threading
+import time
+
+import numpy
+import requests
+
+DEFAULT_BASE = "USD"
+# Currency of the balances of accounts that do not give one
+DEFAULT_CURRENCY = "USD"
+# Rates for today (or later) may still change; past rates never do
+DEFAULT_MAX_AGE = 60 * 60
+
+FRANKFURTER_URL = "https://api.frankfurter.app"
+
+
+def _iso(value):
+    if value is None:
+        return date.today().isoformat()
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)[:10]
+
+
+def frankfurter_rates(day, base, timeout=30):
+    """
+    Reference rates of the European Central Bank for day (the last
+    published before it on weekends and holidays), from frankfurter.app.
+    """
+    if day >= date.today().isoformat():
+        day = "latest"
+    response = requests.get(
+        "{}/{}".format(FRANKFURTER_URL, day), params={"from": base}, timeout=timeout
+    )
+    response.raise_for_status()
+    return response.json()["rates"]
+
+
+class RateTable(object):
+    """
+    Exchange rates by date, as units of each currency per one unit of base.
+    provider(day, base) returns the rates of an ISO date as {currency:
+    rate}; it is only called once per date, as the rates are kept in
+    memory and, when a path is given, as one JSON file per date in that
+    directory.  Rates for today are fetched again once they are max_age
+    seconds old.
+    """
+
+    def __init__(
+        self,
+        provider=frankfurter_rates,
+        path=None,
+        base=DEFAULT_BASE,
+        max_age=DEFAULT_MAX_AGE,
+    ):
+        self.provider = provider
+        self.path = path
+        self.base = base
+        self.max_age = max_age
+        self.entries = {}
+        self.lock = threading.Lock()
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    def _filename(self, day):
+        return os.path.join(self.path, "{}_{}.json".format(self.base.lower(), day))
+
+    def _fresh(self, day, entry):
+        return (
+            day < date.today().isoformat()
+            or time.time() - entry["fetched"] < self.max_age
+        )
+
+    def rates(self, day=None):
+        """{currency: units per unit of base} on day (default today)."""
+        day = _iso(day)
+        with self.lock:
+            entry = self.entries.get(day)
+        if entry is None and self.path is not None:
+            try:
+                with open(self._filename(day), "r") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                entry = None
+        if entry is None or not self._fresh(day, entry):
+            rates = dict(self.provider(day, self.base))
+            rates[self.base] = 1.0
+            entry = {"rates": rates, "fetched": time.time()}
+            if self.path is not None:
+                filename = self._filename(day)
+                with open(filename + ".tmp", "w") as f:
+                    json.dump(entry, f)
+                os.replace(filename + ".tmp", filename)
+        with self.lock:
+            self.entries[day] = entry
+        return entry["rates"]
+
+    def rate(self, source, target, day=None):
+        """Units of target per unit of source on day."""
+        if source == target:
+            return 1.0
+        rates = self.rates(day)
+        for currency in (source, target):
+            if currency not in rates:
+                raise ValueError(
+                    "No {} exchange rate for {}".format(currency, _iso(day))
+                )
+        return rates[target] / rates[source]
+
+    def convert(self, amounts, currencies, target, days=None):
+        """
+        amounts, each in the currency at the same position of currencies
+        (None for DEFAULT_CURRENCY, as Mint leaves it out for US dollars)
+        and on the date at the same position of days (default today for
+        all), converted to target as a numpy array.  Each distinct currency
+        and date is looked up once.
+        """
+        amounts = numpy.asarray(amounts, dtype=float)
+        if days is None:
+            days = [None] * len(amounts)
+        pairs = [
+            (currency or DEFAULT_CURRENCY, _iso(day))
+            for currency, day in zip(currencies, days)
+        ]
+        factors = {}
+        for currency, day in pairs:
+            if (currency, day) not in factors:
+                factors[(currency, day)] = self.rate(currency, target, day)
+        return amounts * numpy.fromiter(
+            (factors[pair] for pair in pairs), dtype=float, count=len(pairs)
+        )
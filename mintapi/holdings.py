@@ -0,0 +1,289 @@
+"""
+A local history of investment holdings.  get_investment_data only returns
+the current holdings; HoldingsStore records them on every run, keeping only
+what changed, in append-only column files that range queries read without
+loading the rest.
+"""
+
+from datetime import date, datetime
+import json
+import logging
+import math
+import os
+
+import numpy
+
+logger = logging.getLogger("mintapi")
+
+STORE_FILENAME = "_store.json"
+STORE_VERSION = 1
+
+# One file per column, each an array of fixed-size little-endian values
+COLUMNS = {
+    "day": numpy.dtype("<i4"),
+    "security": numpy.dtype("<i4"),
+    "quantity": numpy.dtype("<f8"),
+    "price": numpy.dtype("<f8"),
+}
+
+# Kept once per security rather than on every row
+SECURITY_FIELDS = ["id", "accountId", "description", "symbol", "holdingType"]
+
+
+def _ordinal(value):
+    if value is None:
+        return date.today().toordinal()
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return value.toordinal()
+    return datetime.strptime(str(value)[:10], "%Y-%m-%d").toordinal()
+
+
+def _iso(ordinal):
+    return date.fromordinal(int(ordinal)).isoformat()
+
+
+def _number(value):
+    return float("nan") if value is None else float(value)
+
+
+def _same(a, b):
+    return a == b or (math.isnan(a) and math.isnan(b))
+
+
+class HoldingsStore(object):
+    """
+    Holdings over time, in a directory.  Each row of the columns is a
+    change to one security on one day: its quantity and price from that
+    day on.  A snapshot only appends rows for the securities whose quantity
+    or price differ from the last snapshot (a sold security gets a
+    quantity of 0), so the store grows with what changed rather than with
+    holdings times days.  _store.json lists the securities, the snapshot
+    days and the number of rows written, so a run interrupted while
+    appending is ignored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.securities = []
+        self.days = []
+        self.rows = 0
+        if os.path.exists(self._store_path):
+            with open(self._store_path, "r") as f:
+                store = json.load(f)
+            self.securities = store["securities"]
+            self.days = store["days"]
+            self.rows = store["rows"]
+        self._by_id = {
+            security["id"]: index for index, security in enumerate(self.securities)
+        }
+
+    @property
+    def _store_path(self):
+        return os.path.join(self.path, STORE_FILENAME)
+
+    def _column_path(self, name):
+        return os.path.join(self.path, "{}.bin".format(name))
+
+    def column(self, name, rows=None):
+        """
+        The first rows (default all) of a column, memory-mapped, so only
+        the pages a query touches are read.
+        """
+        rows = self.rows if rows is None else rows
+        if rows == 0:
+            return numpy.empty(0, dtype=COLUMNS[name])
+        return numpy.memmap(
+            self._column_path(name), dtype=COLUMNS[name], mode="r", shape=(rows,)
+        )
+
+    def _rows_until(self, ordinal):
+        # Rows are appended in day order
+        return int(numpy.searchsorted(self.column("day"), ordinal, side="right"))
+
+    def _state(self, rows=None):
+        """{security index: (quantity, price)} after the first rows."""
+        security = numpy.asarray(self.column("security", rows))
+        if not len(security):
+            return {}
+        # The last row of each security
+        reversed_security = security[::-1]
+        indexes, first = numpy.unique(reversed_security, return_index=True)
+        last = len(security) - 1 - first
+        quantity = self.column("quantity", rows)[last]
+        price = self.column("price", rows)[last]
+        return {
+            int(index): (float(q), float(p))
+            for index, q, p in zip(indexes, quantity, price)
+        }
+
+    def record(self, holdings, day=None):
+        """
+        Adds a snapshot of holdings (as returned by get_investment_data)
+        for day (default today); returns the number of rows written.  Days
+        must not go backwards; recording the same day again applies any
+        changes on top of the earlier snapshot of that day.
+        """
+        ordinal = _ordinal(day)
+        if self.days and ordinal < self.days[-1]:
+            raise ValueError(
+                "Snapshot for {} is older than the last one, {}".format(
+                    _iso(ordinal), _iso(self.days[-1])
+                )
+            )
+        state = self._state()
+        rows = []
+        seen = set()
+        for holding in holdings:
+            index = self._security(holding)
+            seen.add(index)
+            quantity = _number(holding.get("currentQuantity"))
+            price = _number(holding.get("currentPrice"))
+            previous = state.get(index)
+            if (
+                previous is None
+                or not _same(previous[0], quantity)
+                or not _same(previous[1], price)
+            ):
+                rows.append((index, quantity, price))
+        for index, (quantity, price) in state.items():
+            if index not in seen and quantity != 0:
+                rows.append((index, 0.0, price))
+
+        os.makedirs(self.path, exist_ok=True)
+        columns = {
+            "day": [ordinal] * len(rows),
+            "security": [row[0] for row in rows],
+            "quantity": [row[1] for row in rows],
+            "price": [row[2] for row in rows],
+        }
+        for name, values in columns.items():
+            path = self._column_path(name)
+            with open(path, "ab") as f:
+                # Drop whatever an interrupted run appended
+                f.truncate(self.rows * COLUMNS[name].itemsize)
+                numpy.asarray(values, dtype=COLUMNS[name]).tofile(f)
+        self.rows += len(rows)
+        if not self.days or self.days[-1] != ordinal:
+            self.days.append(ordinal)
+        self._save()
+        logger.info(
+            "Recorded {} changed holdings of {} for {}".format(
+                len(rows), len(seen), _iso(ordinal)
+            )
+        )
+        return len(rows)
+
+    def _security(self, holding):
+        id = holding.get("id")
+        if id is None:
+            raise ValueError("Every holding needs an id to be recorded")
+        index = self._by_id.get(id)
+        if index is None:
+            index = self._by_id[id] = len(self.securities)
+            self.securities.append({})
+        # The latest description etc. of the security
+        self.securities[index] = {
+            field: holding[field] for field in SECURITY_FIELDS if field in holding
+        }
+        return index
+
+    def _save(self):
+        store = {
+            "version": STORE_VERSION,
+            "rows": self.rows,
+            "days": self.days,
+            "securities": self.securities,
+        }
+        with open(self._store_path + ".tmp", "w") as f:
+            json.dump(store, f)
+        os.replace(self._store_path + ".tmp", self._store_path)
+
+    def holdings(self, day=None):
+        """
+        The holdings as of day (default the last snapshot), with their
+        quantity, price and value; securities no longer held are left out.
+        """
+        rows = self.rows if day is None else self._rows_until(_ordinal(day))
+        return [
+            dict(
+                self.securities[index],
+                quantity=quantity,
+                price=price,
+                value=quantity * price,
+            )
+            for index, (quantity, price) in sorted(self._state(rows).items())
+            if quantity != 0
+        ]
+
+    def history(self, id, start_date=None, end_date=None):
+        """The changes to one security's quantity and price, by date."""
+        index = self._by_id.get(id)
+        if index is None:
+            return []
+        positions = numpy.flatnonzero(numpy.asarray(self.column("security")) == index)
+        day = self.column("day")[positions]
+        keep = numpy.ones(len(positions), dtype=bool)
+        if start_date is not None:
+            keep &= day >= _ordinal(start_date)
+        if end_date is not None:
+            keep &= day <= _ordinal(end_date)
+        positions = positions[keep]
+        return [
+            {"date": _iso(d), "quantity": float(q), "price": float(p)}
+            for d, q, p in zip(
+                day[keep],
+                self.column("quantity")[positions],
+                self.column("price")[positions],
+            )
+        ]
+
+    def values(self, start_date=None, end_date=None, accounts=None):
+        """
+        Total value of the holdings (of the given account ids) at the end
+        of each day from start_date (default the first snapshot) to
+        end_date (default the last), as [{"date", "value"}].  Each row adds
+        the change in its security's value, so the whole series is cumulative
+        sums over the rows up to end_date.
+        """
+        if not self.days:
+            return []
+        first = _ordinal(start_date) if start_date else self.days[0]
+        last = _ordinal(end_date) if end_date else self.days[-1]
+        first = max(first, self.days[0])
+        if last < first:
+            return []
+        rows = self._rows_until(last)
+        day = numpy.asarray(self.column("day", rows))
+        security = numpy.asarray(self.column("security", rows))
+        value = numpy.nan_to_num(
+            numpy.asarray(self.column("quantity", rows))
+            * numpy.asarray(self.column("price", rows))
+        )
+        if accounts is not None:
+            accounts = set(accounts)
+            selected = numpy.array(
+                [s.get("accountId") in accounts for s in self.securities], dtype=bool
+            )
+            keep = selected[security] if len(security) else security.astype(bool)
+            day, security, value = day[keep], security[keep], value[keep]
+
+        # Each row's change in value: its value less that of the previous
+        # row of the same security
+        order = numpy.argsort(security, kind="stable")
+        previous = numpy.zeros(len(order))
+        same = security[order][1:] == security[order][:-1]
+        previous[1:][same] = value[order][:-1][same]
+        change = numpy.empty(len(order))
+        change[order] = value[order] - previous
+
+        # Days before first only contribute to the opening value
+        offsets = numpy.clip(day - first, -1, None) + 1
+        totals = numpy.cumsum(
+            numpy.bincount(offsets, weights=change, minlength=last - first + 2)
+        )[1:]
+        return [
+            {"date": _iso(first + i), "value": float(total)}
+            for i, total in enumerate(totals)
+        ]
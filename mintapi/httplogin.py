@@ -0,0 +1,214 @@
+import logging
+import re
+import time
+from urllib.parse import urljoin
+
+import oathtool
+import requests
+
+from mintapi import codec
+from mintapi.imapwatch import wait_for_email_code
+from mintapi.signIn import (
+    DEFAULT_MFA_INPUT_PROMPT,
+    MFA_VIA_AUTHENTICATOR,
+    MFA_VIA_EMAIL,
+    MFA_VIA_SOFT_TOKEN,
+)
+
+logger = logging.getLogger("mintapi")
+
+LOGIN_ENGINE_SELENIUM = "selenium"
+# Experimental: the identity service's endpoints are not documented, so
+# HTTP sign in is only used when asked for explicitly, and only from Python
+LOGIN_ENGINE_HTTP = "http"
+LOGIN_ENGINES = [LOGIN_ENGINE_SELENIUM, LOGIN_ENGINE_HTTP]
+
+IDENTITY_URL = "https://accounts.intuit.com"
+MINT_URL = "https://mint.intuit.com"
+OVERVIEW_PATH = "/overview"
+
+# Steps of the sign in flow, as named by the identity service
+STEP_PASSWORD = "PASSWORD"
+STEP_MFA = "MFA"
+STEP_ACCOUNT_SELECTION = "ACCOUNT_SELECTION"
+STEP_DONE = "DONE"
+MAX_STEPS = 10
+
+API_KEY_PATTERN = re.compile(r"""["']?appApiKey["']?\s*:\s*["']([^"']+)["']""")
+
+
+class HttpLoginError(RuntimeError):
+    pass
+
+
+class HttpSignIn(object):
+    """
+    Signs in to Mint with plain HTTP requests, without a browser, following
+    the same steps as signIn.sign_in: identifier, password, multifactor
+    authentication (a soft token generated from mfa_token, an e-mailed code
+    read over IMAP, or mfa_input_callback) and account selection.  Once the
+    identity service is done, the Mint overview page is loaded to collect
+    the session cookies and the API key.
+
+    The paths of the identity service are attributes so they can be changed
+    along with it.
+    """
+
+    identifier_path = "/v2/signin/identifier"
+    password_path = "/v2/signin/password"
+    mfa_challenge_path = "/v2/signin/mfa/challenge"
+    mfa_verify_path = "/v2/signin/mfa/verify"
+    account_path = "/v2/signin/account"
+
+    def __init__(self, identity_url=IDENTITY_URL, mint_url=MINT_URL, timeout=30):
+        self.identity_url = identity_url
+        self.mint_url = mint_url
+        self.timeout = timeout
+
+    def _post(self, session, path, body):
+        response = session.post(
+            urljoin(self.identity_url, path),
+            data=codec.dumps(body, compact=True),
+            headers={"Content-Type": "application/json", "Accept": "application/json"},
+            timeout=self.timeout,
+        )
+        try:
+            data = codec.loads(response.content) if response.content else {}
+        except ValueError:
+            data = {}
+        if response.status_code >= 400:
+            raise HttpLoginError(
+                "Sign in failed at {} ({}): {}".format(
+                    path, response.status_code, data.get("message", response.reason)
+                )
+            )
+        return data
+
+    def sign_in(
+        self,
+        email,
+        password,
+        mfa_method=None,
+        mfa_token=None,
+        mfa_input_callback=None,
+        intuit_account=None,
+        imap_account=None,
+        imap_password=None,
+        imap_server=None,
+        imap_folder="INBOX",
+        session=None,
+    ):
+        """
+        Returns (session, api_key): a requests.Session carrying the Mint
+        cookies, and the API key for the Mint REST endpoints.
+        """
+        session = session or requests.Session()
+        step = self._post(session, self.identifier_path, {"identifier": email})
+        auth_context = step.get("authContext")
+
+        for _ in range(MAX_STEPS):
+            next_step = step.get("next")
+            logger.info("HTTP sign in step: {}".format(next_step))
+            if next_step == STEP_DONE:
+                return session, self.load_mint(session, step.get("redirectUrl"))
+            if next_step == STEP_PASSWORD:
+                body = {"password": password}
+                path = self.password_path
+            elif next_step == STEP_MFA:
+                body = self.mfa(
+                    session,
+                    auth_context,
+                    step.get("methods") or [],
+                    mfa_method,
+                    mfa_token,
+                    mfa_input_callback,
+                    imap_account,
+                    imap_password,
+                    imap_server,
+                    imap_folder,
+                    email,
+                )
+                path = self.mfa_verify_path
+            elif next_step == STEP_ACCOUNT_SELECTION:
+                body = {
+                    "accountId": select_account(step.get("accounts"), intuit_account)
+                }
+                path = self.account_path
+            else:
+                raise HttpLoginError("Unexpected sign in step: {}".format(next_step))
+            body["authContext"] = auth_context
+            step = self._post(session, path, body)
+            auth_context = step.get("authContext", auth_context)
+        raise HttpLoginError("Sign in did not finish after {} steps".format(MAX_STEPS))
+
+    def mfa(
+        self,
+        session,
+        auth_context,
+        methods,
+        mfa_method,
+        mfa_token,
+        mfa_input_callback,
+        imap_account,
+        imap_password,
+        imap_server,
+        imap_folder,
+        email=None,
+    ):
+        method = mfa_method if mfa_method in methods else None
+        if method is None:
+            if mfa_token is not None and MFA_VIA_SOFT_TOKEN in methods:
+                method = MFA_VIA_SOFT_TOKEN
+            elif methods:
+                method = methods[0]
+            else:
+                raise HttpLoginError("No multifactor authentication method offered")
+
+        if method in (MFA_VIA_SOFT_TOKEN, MFA_VIA_AUTHENTICATOR) and mfa_token:
+            code = oathtool.generate_otp(mfa_token)
+        else:
+            # Have the code sent, by e-mail or text message
+            since = time.time()
+            self._post(
+                session,
+                self.mfa_challenge_path,
+                {"authContext": auth_context, "method": method},
+            )
+            code = None
+            if method == MFA_VIA_EMAIL and imap_account:
+                code = wait_for_email_code(
+                    imap_account,
+                    imap_password,
+                    imap_server,
+                    imap_folder,
+                    recipient=email,
+                    since=since,
+                )
+            if not code:
+                code = (mfa_input_callback or input)(DEFAULT_MFA_INPUT_PROMPT)
+        return {"method": method, "code": code}
+
+    def load_mint(self, session, redirect_url=None):
+        """Loads Mint to set its cookies and returns the API key."""
+        response = session.get(
+            urljoin(self.mint_url, redirect_url or OVERVIEW_PATH), timeout=self.timeout
+        )
+        if response.status_code >= 400:
+            raise HttpLoginError(
+                "Unable to load Mint after sign in ({})".format(response.status_code)
+            )
+        match = API_KEY_PATTERN.search(response.text)
+        if match is None:
+            raise HttpLoginError("No API key found on the Mint overview page")
+        return match.group(1)
+
+
+def select_account(accounts, intuit_account=None):
+    if not accounts:
+        raise HttpLoginError("No Intuit accounts offered for selection")
+    if intuit_account is None:
+        return accounts[0]["id"]
+    for account in accounts:
+        if intuit_account in (account.get("name"), account.get("id")):
+            return account["id"]
+    raise HttpLoginError("Intuit account {} not found".format(intuit_account))
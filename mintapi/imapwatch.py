@@ -0,0 +1,358 @@
+"""
+A shared watcher for Intuit MFA e-mails.  Every login waiting on a code from
+the same mailbox is served by one IMAP connection, which only fetches
+messages it has not seen before, instead of each login connecting and
+polling the folder on its own.
+"""
+
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import email
+import email.header
+import email.utils
+import imaplib
+import logging
+import re
+import threading
+import time
+
+logger = logging.getLogger("mintapi")
+
+MFA_SENDER = "do_not_reply@intuit.com"
+MFA_SUBJECT_PATTERN = re.compile("Your Mint Account", re.IGNORECASE)
+MFA_CODE_PATTERN = re.compile(r"Verification code:<.*?(\d\d\d\d\d\d)$", re.S | re.M)
+# Headers that may carry the address a code was sent to, including once
+# forwarded to a shared mailbox
+RECIPIENT_HEADERS = ["To", "Cc", "Delivered-To", "X-Original-To", "X-Forwarded-To"]
+
+DEFAULT_POLL_INTERVAL = 5
+# Codes older than this are ignored, as they will have expired
+DEFAULT_MAX_AGE = 180
+DEFAULT_TIMEOUT = 200
+# How long the connection is kept open once no login is waiting
+DEFAULT_IDLE_TIMEOUT = 60
+# Allowance for the Date header and our clock disagreeing
+CLOCK_SKEW = 60
+
+IMAP_MONTHS = [
+    "Jan",
+    "Feb",
+    "Mar",
+    "Apr",
+    "May",
+    "Jun",
+    "Jul",
+    "Aug",
+    "Sep",
+    "Oct",
+    "Nov",
+    "Dec",
+]
+
+
+def imap_date(timestamp):
+    """The date of timestamp as used in IMAP searches, e.g. 27-Mar-2022."""
+    t = time.gmtime(timestamp)
+    return "{}-{}-{}".format(t.tm_mday, IMAP_MONTHS[t.tm_mon - 1], t.tm_year)
+
+
+def _header(msg, name):
+    return str(email.header.make_header(email.header.decode_header(msg[name] or "")))
+
+
+def parse_mfa_message(raw):
+    """
+    The code, sending time and lower-cased recipient addresses of a raw
+    Intuit MFA e-mail, or None for any other message.
+    """
+    msg = email.message_from_bytes(raw)
+    if MFA_SENDER not in _header(msg, "From").lower():
+        return None
+    if not MFA_SUBJECT_PATTERN.search(_header(msg, "Subject")):
+        return None
+    match = MFA_CODE_PATTERN.search(str(msg))
+    if match is None:
+        logger.error("No verification code found in an MFA e-mail")
+        return None
+    date = email.utils.parsedate_tz(msg["Date"] or "")
+    headers = [value for name in RECIPIENT_HEADERS for value in msg.get_all(name, [])]
+    return {
+        "code": match.group(1),
+        "timestamp": email.utils.mktime_tz(date) if date else None,
+        "recipients": {
+            address.lower()
+            for _, address in email.utils.getaddresses(headers)
+            if address
+        },
+    }
+
+
+class MfaCodeWatcher(object):
+    """
+    Watches one mailbox for Intuit MFA codes on behalf of any number of
+    logins.  request() returns a Future of the code for a recipient (the
+    Mint account's e-mail address); codes are matched by recipient and by
+    arriving after the request.  When a code has no recipient, or is only
+    addressed to the watched mailbox itself (e.g. the forwarding rewrote
+    the headers), it is handed to the only login waiting, if there is just
+    one; codes addressed to anyone else are left for their recipient.
+
+    A background thread holds the single IMAP connection while there are
+    logins waiting, and logs out once there have been none for
+    idle_timeout seconds.  Delivered messages
+    are deleted unless delete is False.
+    """
+
+    def __init__(
+        self,
+        imap_account,
+        imap_password,
+        imap_server,
+        imap_folder="INBOX",
+        poll_interval=DEFAULT_POLL_INTERVAL,
+        max_age=DEFAULT_MAX_AGE,
+        idle_timeout=DEFAULT_IDLE_TIMEOUT,
+        delete=True,
+        connect=imaplib.IMAP4_SSL,
+        clock=time.time,
+    ):
+        self.imap_account = imap_account
+        self.imap_password = imap_password
+        self.imap_server = imap_server
+        self.imap_folder = imap_folder
+        self.poll_interval = poll_interval
+        self.max_age = max_age
+        self.idle_timeout = idle_timeout
+        self.delete = delete
+        self.connect = connect
+        self.clock = clock
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._waiters = []
+        self._messages = []
+        self._index = {}
+        self._last_uid = None
+        self._client = None
+        self._thread = None
+        self._wakeup = threading.Event()
+
+    def request(self, recipient=None, since=None):
+        """
+        Future resolving to the first code for recipient (any recipient when
+        None) sent at or after since (default now).
+        """
+        waiter = {
+            "recipient": recipient.lower() if recipient else None,
+            "since": self.clock() if since is None else since,
+            "future": Future(),
+        }
+        with self._lock:
+            self._waiters.append(waiter)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="mintapi-imap", daemon=True
+                )
+                self._thread.start()
+        self._wakeup.set()
+        return waiter["future"]
+
+    def wait_for_code(self, recipient=None, since=None, timeout=DEFAULT_TIMEOUT):
+        """The code for recipient, or None if none arrives within timeout."""
+        future = self.request(recipient, since)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            self.cancel(future)
+            logger.warning("No MFA e-mail for {} arrived".format(recipient))
+            return None
+
+    def cancel(self, future):
+        with self._lock:
+            self._waiters = [w for w in self._waiters if w["future"] is not future]
+        future.cancel()
+
+    def _run(self):
+        idle_since = None
+        while True:
+            with self._lock:
+                if not self._waiters:
+                    idle_since = idle_since or time.monotonic()
+                    if time.monotonic() - idle_since >= self.idle_timeout:
+                        # Decided under the lock, so a new request starts a
+                        # new thread rather than being missed by this one
+                        self._thread = None
+                        client, self._client = self._client, None
+                        break
+                else:
+                    idle_since = None
+            if idle_since is not None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            try:
+                self._poll()
+            except Exception as e:
+                logger.warning("Unable to read MFA e-mails: {}".format(e))
+                self._fail(e)
+                continue
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+        if client is not None:
+            try:
+                client.logout()
+            except Exception:
+                pass
+
+    def _fail(self, error):
+        with self._lock:
+            waiters, self._waiters = self._waiters, []
+            client, self._client = self._client, None
+        for waiter in waiters:
+            if waiter["future"].set_running_or_notify_cancel():
+                waiter["future"].set_exception(error)
+        self._last_uid = None
+        if client is not None:
+            try:
+                client.logout()
+            except Exception:
+                pass
+
+    def _connect(self):
+        if self._client is not None:
+            return self._client
+        try:
+            client = self.connect(self.imap_server)
+        except (imaplib.IMAP4.error, OSError):
+            raise RuntimeError("Unable to establish IMAP Client")
+        try:
+            client.login(self.imap_account, self.imap_password)
+        except imaplib.IMAP4.error:
+            raise RuntimeError("Unable to login to IMAP Email")
+        self.connections += 1
+        self._client = client
+        return client
+
+    def _poll(self):
+        client = self._connect()
+        rv, _ = client.select(self.imap_folder)
+        if rv != "OK":
+            raise RuntimeError("Unable to open mailbox: " + rv)
+        if self._last_uid is None:
+            criteria = '(FROM "{}" SINCE {})'.format(
+                MFA_SENDER, imap_date(self.clock() - self.max_age - CLOCK_SKEW)
+            )
+        else:
+            # Only what arrived since the last poll
+            criteria = '(FROM "{}" UID {}:*)'.format(MFA_SENDER, self._last_uid + 1)
+        rv, data = client.uid("SEARCH", None, criteria)
+        if rv != "OK":
+            raise RuntimeError("Unable to search the Email folder: " + rv)
+
+        last_uid = self._last_uid or 0
+        for uid in sorted(int(uid) for uid in data[0].split()):
+            if uid <= last_uid:
+                # "n:*" always matches the newest message
+                continue
+            rv, fetched = client.uid("FETCH", str(uid), "(RFC822)")
+            if rv != "OK":
+                raise RuntimeError("Unable to complete due to error message: " + rv)
+            self._last_uid = uid
+            message = parse_mfa_message(fetched[0][1])
+            if message is not None:
+                self._add(dict(message, uid=uid))
+        if self._last_uid is None:
+            self._last_uid = last_uid
+        self._dispatch(client)
+
+    def _add(self, message):
+        if message["timestamp"] is None:
+            message["timestamp"] = self.clock()
+        message["used"] = False
+        self._messages.append(message)
+        for recipient in message["recipients"]:
+            self._index.setdefault(recipient, []).append(message)
+
+    def _expire(self):
+        oldest = self.clock() - self.max_age
+        self._messages = [
+            m for m in self._messages if not m["used"] and m["timestamp"] >= oldest
+        ]
+        for recipient in list(self._index):
+            fresh = [m for m in self._index[recipient] if not m["used"]]
+            fresh = [m for m in fresh if m["timestamp"] >= oldest]
+            if fresh:
+                self._index[recipient] = fresh
+            else:
+                del self._index[recipient]
+
+    def _unaddressed(self, message):
+        # Not sent to any other login, so safe to hand over (and delete)
+        return message["recipients"] <= {self.imap_account.lower()}
+
+    def _match(self, waiter, waiting):
+        earliest = waiter["since"] - CLOCK_SKEW
+        candidates = self._messages
+        if waiter["recipient"] is not None:
+            candidates = self._index.get(waiter["recipient"], [])
+            if not candidates and len(waiting) == 1:
+                candidates = [m for m in self._messages if self._unaddressed(m)]
+        fresh = [m for m in candidates if not m["used"] and m["timestamp"] >= earliest]
+        return max(fresh, key=lambda m: m["timestamp"]) if fresh else None
+
+    def _dispatch(self, client):
+        self._expire()
+        with self._lock:
+            waiting = [w for w in self._waiters if not w["future"].done()]
+        deleted = False
+        for waiter in waiting:
+            message = self._match(waiter, waiting)
+            if message is None:
+                continue
+            message["used"] = True
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            if waiter["future"].set_running_or_notify_cancel():
+                waiter["future"].set_result(message["code"])
+            if self.delete:
+                client.uid("STORE", str(message["uid"]), "+FLAGS", "(\\Deleted)")
+                deleted = True
+        if deleted:
+            client.expunge()
+        with self._lock:
+            self._waiters = [w for w in self._waiters if not w["future"].done()]
+
+
+_watchers = {}
+_watchers_lock = threading.Lock()
+
+
+def shared_watcher(imap_account, imap_password, imap_server, imap_folder="INBOX"):
+    """The MfaCodeWatcher of this process for a mailbox, created on first use."""
+    key = (imap_server, imap_account.lower(), imap_folder)
+    with _watchers_lock:
+        watcher = _watchers.get(key)
+        if watcher is None:
+            watcher = _watchers[key] = MfaCodeWatcher(
+                imap_account, imap_password, imap_server, imap_folder
+            )
+        watcher.imap_password = imap_password
+        return watcher
+
+
+def wait_for_email_code(
+    imap_account,
+    imap_password,
+    imap_server,
+    imap_folder="INBOX",
+    recipient=None,
+    since=None,
+    timeout=DEFAULT_TIMEOUT,
+):
+    """
+    Waits for the MFA code sent to recipient through the shared watcher of
+    the mailbox; None if it does not arrive within timeout seconds.
+    """
+    return shared_watcher(
+        imap_account, imap_password, imap_server, imap_folder
+    ).wait_for_code(recipient, since, timeout)
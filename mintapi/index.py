@@ -0,0 +1,161 @@
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+
+
+def _date_key(value):
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def _normalize(value):
+    return value.strip().lower() if isinstance(value, str) else value
+
+
+class _SortedIndex(object):
+    """Positions of the records sorted by one key, for range queries."""
+
+    def __init__(self, keyed_positions):
+        keyed_positions = sorted(keyed_positions, key=lambda k: k[0])
+        self.keys = [key for key, _ in keyed_positions]
+        self.positions = [position for _, position in keyed_positions]
+
+    def bounds(self, low=None, high=None):
+        start = 0 if low is None else bisect_left(self.keys, low)
+        end = len(self.keys) if high is None else bisect_right(self.keys, high)
+        return start, max(start, end)
+
+    def range(self, low=None, high=None):
+        start, end = self.bounds(low, high)
+        return self.positions[start:end]
+
+
+class TransactionIndex(object):
+    """
+    Indexes a list of transactions (as returned by get_transaction_data) once
+    so that lookups do not need to scan every record: hash indexes on id,
+    account, category and merchant, and sorted indexes on date and amount
+    for range queries.
+    """
+
+    def __init__(self, transactions):
+        self.transactions = list(transactions)
+        self.by_id = {}
+        self.by_account = {}
+        self.by_category = {}
+        self.by_merchant = {}
+        dates = []
+        amounts = []
+        for position, transaction in enumerate(self.transactions):
+            self.by_id[transaction.get("id")] = position
+            for key in self.account_keys(transaction):
+                self.by_account.setdefault(key, []).append(position)
+            for key in self.category_keys(transaction):
+                self.by_category.setdefault(key, []).append(position)
+            merchant = self.merchant_key(transaction)
+            if merchant:
+                self.by_merchant.setdefault(merchant, []).append(position)
+            if transaction.get("date") is not None:
+                dates.append((transaction["date"], position))
+            if transaction.get("amount") is not None:
+                amounts.append((transaction["amount"], position))
+        self.by_date = _SortedIndex(dates)
+        self.by_amount = _SortedIndex(amounts)
+
+    def __len__(self):
+        return len(self.transactions)
+
+    @staticmethod
+    def account_keys(transaction):
+        account = transaction.get("accountRef") or {}
+        keys = {transaction.get("accountId"), account.get("id"), account.get("name")}
+        return {_normalize(key) for key in keys if key}
+
+    @staticmethod
+    def category_keys(transaction):
+        category = transaction.get("category") or {}
+        keys = {category.get("id"), category.get("name")}
+        return {_normalize(key) for key in keys if key}
+
+    @staticmethod
+    def merchant_key(transaction):
+        return _normalize(transaction.get("description"))
+
+    def get(self, id):
+        position = self.by_id.get(id)
+        return None if position is None else self.transactions[position]
+
+    def query(
+        self,
+        account=None,
+        category=None,
+        merchant=None,
+        start_date=None,
+        end_date=None,
+        min_amount=None,
+        max_amount=None,
+        limit=None,
+    ):
+        """
+        Returns the transactions matching every given criterion, in date
+        order.  account and category match an id or a name, merchant
+        matches the description (all case-insensitively); date and amount
+        bounds are inclusive.
+        """
+        start_date, end_date = _date_key(start_date), _date_key(end_date)
+        account, category, merchant = map(_normalize, [account, category, merchant])
+        # Each candidate is (size, positions) where positions is a list or
+        # the bounds of a slice of a sorted index, sliced only if chosen.
+        candidates = []
+        if account is not None:
+            candidates.append(self.by_account.get(account, []))
+        if category is not None:
+            candidates.append(self.by_category.get(category, []))
+        if merchant is not None:
+            candidates.append(self.by_merchant.get(merchant, []))
+        candidates = [(len(positions), positions) for positions in candidates]
+        if start_date is not None or end_date is not None:
+            start, end = self.by_date.bounds(start_date, end_date)
+            candidates.append((end - start, (self.by_date, start, end)))
+        if min_amount is not None or max_amount is not None:
+            start, end = self.by_amount.bounds(min_amount, max_amount)
+            candidates.append((end - start, (self.by_amount, start, end)))
+        if not candidates:
+            candidates.append((len(self), (self.by_date, 0, len(self.by_date.keys))))
+
+        positions = min(candidates, key=lambda candidate: candidate[0])[1]
+        if isinstance(positions, tuple):
+            index, start, end = positions
+            positions = index.positions[start:end]
+
+        def matches(transaction):
+            # Records without a date or amount are not in the sorted indexes,
+            # and likewise never match a bound on them
+            day, amount = transaction.get("date"), transaction.get("amount")
+            return (
+                (account is None or account in self.account_keys(transaction))
+                and (category is None or category in self.category_keys(transaction))
+                and (merchant is None or merchant == self.merchant_key(transaction))
+                and (start_date is None or (day is not None and day >= start_date))
+                and (end_date is None or (day is not None and day <= end_date))
+                and (
+                    min_amount is None or (amount is not None and amount >= min_amount)
+                )
+                and (
+                    max_amount is None or (amount is not None and amount <= max_amount)
+                )
+            )
+
+        # Scan only the smallest candidate list, checking the other criteria
+        # on each record directly.
+        results = [
+            self.transactions[position]
+            for position in positions
+            if matches(self.transactions[position])
+        ]
+        results.sort(key=lambda transaction: transaction.get("date") or "")
+        if limit is not None:
+            results = results[:limit]
+        return results
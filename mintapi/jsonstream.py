@@ -0,0 +1,117 @@
+"""
+Incremental parsing of Mint endpoint responses.
+
+The endpoints return a JSON object with one large array of records, e.g.
+{"Transaction": [...], "metaData": {...}}.  iter_array() reads the body a
+chunk at a time and yields each element of that array as soon as it has
+been parsed, so the full document never has to be held in memory.
+"""
+
+import codecs
+import json
+import re
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+# Consumed text is dropped from the front of the buffer once it grows past
+# this many characters.
+COMPACT_THRESHOLD = 1 << 16
+
+_decoder = json.JSONDecoder()
+
+
+class JSONStreamError(ValueError):
+    pass
+
+
+class KeyNotFoundError(JSONStreamError):
+    pass
+
+
+class _Reader(object):
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Appends the next chunk to the buffer.  Returns False at the end."""
+        if self.eof:
+            return False
+        if self.pos > COMPACT_THRESHOLD:
+            self.text = self.text[self.pos :]
+            self.pos = 0
+        for chunk in self.chunks:
+            if isinstance(chunk, bytes):
+                chunk = self.decoder.decode(chunk)
+            if chunk:
+                self.text += chunk
+                return True
+        self.text += self.decoder.decode(b"", final=True)
+        self.eof = True
+        return False
+
+    def peek(self):
+        """Skips whitespace and returns the next character ("" at the end)."""
+        while True:
+            self.pos = WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, characters):
+        character = self.peek()
+        if not character or character not in characters:
+            raise JSONStreamError(
+                "Expected one of {!r} at offset {} but found {!r}".format(
+                    characters, self.pos, character
+                )
+            )
+        self.pos += 1
+        return character
+
+    def value(self):
+        """Parses the next complete JSON value, reading more as needed."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError as e:
+                if not self.fill():
+                    raise JSONStreamError(str(e)) from e
+                continue
+            # A number at the very end of the buffer may continue in the
+            # next chunk.
+            if end == len(self.text) and not self.eof and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_array(chunks, key):
+    """
+    Yields the elements of the array stored under `key` in the top-level
+    object of the JSON document made of `chunks` (bytes or str).  Raises
+    KeyNotFoundError if the document has no such key.
+    """
+    reader = _Reader(chunks)
+    reader.expect("{")
+    if reader.peek() == "}":
+        raise KeyNotFoundError(key)
+    while True:
+        name = reader.value()
+        reader.expect(":")
+        if name != key:
+            reader.value()
+        else:
+            reader.expect("[")
+            if reader.peek() == "]":
+                return
+            while True:
+                yield reader.value()
+                if reader.expect(",]") == "]":
+                    return
+        if reader.expect(",}") == "}":
+            raise KeyNotFoundError(key)
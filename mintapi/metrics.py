@@ -0,0 +1,257 @@
+from contextlib import contextmanager
+import logging
+import socket
+import threading
+import time
+
+logger = logging.getLogger("mintapi")
+
+
+PHASE_LOGIN = "login"
+PHASE_DRIVER = "driver"
+PHASE_API_KEY = "api_key"
+PHASE_REQUEST = "request"
+PHASE_DECODE = "decode"
+PHASE_FETCH = "fetch"
+PHASE_OUTPUT = "output"
+PHASE_STARTUP = "startup"
+
+
+class Instrumentation(object):
+    """
+    Collects timing events from a Mint session and hands them to every
+    registered hook.  A hook is any callable taking one event: a dict with
+    "phase", "duration" (seconds) and, when known, "endpoint", "status",
+    "bytes" and "records".  Without hooks, events are dropped.
+    """
+
+    def __init__(self, hooks=None):
+        self.hooks = list(hooks or [])
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+        return hook
+
+    def emit(self, event):
+        for hook in self.hooks:
+            try:
+                hook(event)
+            except Exception:
+                logger.exception("Instrumentation hook {} failed".format(hook))
+
+    @contextmanager
+    def timed(self, phase, **labels):
+        """
+        Times the enclosed block.  The yielded dict is the event itself, so
+        the block can fill in labels such as status or records as it learns
+        them.
+        """
+        event = dict(labels, phase=phase)
+        start = time.perf_counter()
+        try:
+            yield event
+        except Exception as e:
+            event.setdefault("error", type(e).__name__)
+            raise
+        finally:
+            event["duration"] = time.perf_counter() - start
+            self.emit(event)
+
+
+def _series_key(event):
+    return event["phase"], event.get("endpoint", "")
+
+
+class TimingsCollector(object):
+    """Hook that aggregates events per phase and endpoint."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def __call__(self, event):
+        with self.lock:
+            stats = self.series.setdefault(
+                _series_key(event),
+                {"count": 0, "errors": 0, "total": 0.0, "max": 0.0},
+            )
+            stats["count"] += 1
+            stats["total"] += event["duration"]
+            stats["max"] = max(stats["max"], event["duration"])
+            if "error" in event or event.get("status", 200) >= 400:
+                stats["errors"] += 1
+            for counter in ["bytes", "records"]:
+                if event.get(counter) is not None:
+                    stats[counter] = stats.get(counter, 0) + event[counter]
+
+    def summary(self):
+        lines = [
+            "{:<10} {:<40} {:>6} {:>10} {:>10} {:>12} {:>9}".format(
+                "phase", "endpoint", "count", "total(s)", "max(s)", "bytes", "records"
+            )
+        ]
+        with self.lock:
+            for (phase, endpoint), stats in sorted(self.series.items()):
+                lines.append(
+                    "{:<10} {:<40} {:>6} {:>10.3f} {:>10.3f} {:>12} {:>9}".format(
+                        phase,
+                        endpoint,
+                        stats["count"],
+                        stats["total"],
+                        stats["max"],
+                        stats.get("bytes", ""),
+                        stats.get("records", ""),
+                    )
+                )
+        return "\n".join(lines)
+
+
+class StartupTimeline(object):
+    """
+    Hook that records when each startup stage ran, and on which thread, from
+    the startup, driver and login events.  render() draws them on a common
+    time axis, so stages that overlapped show up side by side.
+    """
+
+    phases = [PHASE_STARTUP, PHASE_DRIVER, PHASE_LOGIN]
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.origin = clock()
+        self.lock = threading.Lock()
+        self.stages = []
+
+    def __call__(self, event):
+        if event["phase"] not in self.phases:
+            return
+        end = self.clock() - self.origin
+        with self.lock:
+            self.stages.append(
+                {
+                    "stage": event.get("endpoint") or event["phase"],
+                    "thread": threading.current_thread().name,
+                    "start": max(0.0, end - event["duration"]),
+                    "end": end,
+                    "wait": bool(event.get("wait")),
+                }
+            )
+
+    def elapsed(self):
+        """Wall time from the first stage starting to the last one ending."""
+        with self.lock:
+            if not self.stages:
+                return 0.0
+            return max(s["end"] for s in self.stages) - min(
+                s["start"] for s in self.stages
+            )
+
+    def serial(self):
+        """
+        Time the stages would have taken one after the other, leaving out
+        time spent waiting on another stage.
+        """
+        with self.lock:
+            return sum(s["end"] - s["start"] for s in self.stages if not s["wait"])
+
+    def render(self, width=40):
+        elapsed = self.elapsed()
+        with self.lock:
+            stages = sorted(self.stages, key=lambda s: s["start"])
+        if not stages:
+            return "No startup stages recorded"
+        origin = stages[0]["start"]
+        scale = width / elapsed if elapsed else 0
+        lines = [
+            "{:<16} {:<18} {:>8} {:>8}  timeline".format(
+                "stage", "thread", "start(s)", "took(s)"
+            )
+        ]
+        for s in stages:
+            offset = int((s["start"] - origin) * scale)
+            length = max(1, int((s["end"] - s["start"]) * scale))
+            lines.append(
+                "{:<16} {:<18} {:>8.3f} {:>8.3f}  {}{}".format(
+                    s["stage"],
+                    s["thread"][:18],
+                    s["start"] - origin,
+                    s["end"] - s["start"],
+                    " " * offset,
+                    "#" * length,
+                )
+            )
+        serial = self.serial()
+        lines.append(
+            "startup took {:.3f}s, {:.3f}s if run one after the other".format(
+                elapsed, serial
+            )
+        )
+        return "\n".join(lines)
+
+
+def _prometheus_labels(labels):
+    return ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in sorted(labels.items())
+    )
+
+
+class PrometheusExporter(TimingsCollector):
+    """Hook that renders the aggregated events in the Prometheus text format."""
+
+    def render(self):
+        metrics = {
+            "mintapi_phase_duration_seconds_sum": ("counter", "total"),
+            "mintapi_phase_duration_seconds_count": ("counter", "count"),
+            "mintapi_phase_duration_seconds_max": ("gauge", "max"),
+            "mintapi_phase_errors_total": ("counter", "errors"),
+            "mintapi_phase_bytes_total": ("counter", "bytes"),
+            "mintapi_phase_records_total": ("counter", "records"),
+        }
+        lines = []
+        with self.lock:
+            for name, (kind, field) in metrics.items():
+                lines.append("# TYPE {} {}".format(name, kind))
+                for (phase, endpoint), stats in sorted(self.series.items()):
+                    if field not in stats:
+                        continue
+                    lines.append(
+                        "{}{{{}}} {}".format(
+                            name,
+                            _prometheus_labels({"phase": phase, "endpoint": endpoint}),
+                            stats[field],
+                        )
+                    )
+        return "\n".join(lines) + "\n"
+
+    def write(self, filename):
+        with open(filename, "w+") as f:
+            f.write(self.render())
+
+
+class StatsdExporter(object):
+    """Hook that sends every event to a StatsD server over UDP as it happens."""
+
+    def __init__(self, host="localhost", port=8125, prefix="mintapi"):
+        self.address = (host, int(port))
+        self.prefix = prefix
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def format(self, event):
+        name = "{}.{}".format(self.prefix, event["phase"])
+        endpoint = event.get("endpoint")
+        if endpoint:
+            name += "." + endpoint.strip("/").replace("/", "_").replace(".", "_")
+        lines = ["{}.duration:{:.3f}|ms".format(name, event["duration"] * 1000)]
+        if event.get("status") is not None:
+            lines.append("{}.status.{}:1|c".format(name, event["status"]))
+        for counter in ["bytes", "records"]:
+            if event.get(counter) is not None:
+                lines.append("{}.{}:{}|c".format(name, counter, event[counter]))
+        return lines
+
+    def __call__(self, event):
+        for line in self.format(event):
+            try:
+                self.socket.sendto(line.encode(), self.address)
+            except OSError:
+                pass
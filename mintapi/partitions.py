@@ -0,0 +1,271 @@
+"""
+Partitioned exports: transactions written to one file per month in
+Hive-style year=YYYY/month=MM directories, with a manifest of every
+partition.  Each run only rewrites the months whose transactions changed.
+"""
+
+import calendar
+import datetime
+import hashlib
+import json
+import logging
+import os
+
+import pandas
+from pandas import json_normalize
+
+from mintapi import codec, constants
+
+logger = logging.getLogger("mintapi")
+
+MANIFEST_FILENAME = "_manifest.json"
+MANIFEST_VERSION = 1
+PARTITION_BASENAME = "part"
+
+WRITTEN = "written"
+UNCHANGED = "unchanged"
+REMOVED = "removed"
+
+
+def partition_key(date):
+    """year=YYYY/month=MM for an ISO date (YYYY-MM-DD...)."""
+    return "year={}/month={}".format(date[:4], date[5:7])
+
+
+def record_hash(record):
+    # The standard library, sorted keys: independent of the codec and of
+    # the order of the keys in the response
+    encoded = json.dumps(record, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(encoded.encode(), digest_size=16).hexdigest()
+
+
+class PartitionedExport(object):
+    """
+    A directory of transactions partitioned by month.  The manifest
+    (_manifest.json) lists every partition with its file, record count, date
+    range and a fingerprint of its contents, so a partition is only written
+    when its fingerprint changes and readers can find the months they need
+    without listing directories.
+    """
+
+    def __init__(self, root, format=constants.JSON_FORMAT, date_field="date"):
+        if format not in (constants.JSON_FORMAT, constants.CSV_FORMAT):
+            raise ValueError("Unsupported partition format: {}".format(format))
+        self.root = root
+        self.format = format
+        self.date_field = date_field
+        self.manifest = self._load_manifest()
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.root, MANIFEST_FILENAME)
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {"version": MANIFEST_VERSION, "partitions": {}}
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format", self.format) != self.format:
+            # Written in the other format, so every partition is rewritten
+            manifest["partitions"] = {}
+        return manifest
+
+    def _save_manifest(self):
+        self.manifest["version"] = MANIFEST_VERSION
+        self.manifest["format"] = self.format
+        self._atomic_write(
+            self.manifest_path,
+            lambda f: json.dump(self.manifest, f, indent=2, sort_keys=True),
+        )
+
+    def _atomic_write(self, path, write):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            write(f)
+        os.replace(path + ".tmp", path)
+
+    def partition_path(self, key):
+        return os.path.join(
+            self.root, *key.split("/"), "{}.{}".format(PARTITION_BASENAME, self.format)
+        )
+
+    def group(self, records):
+        """Records by partition key, each sorted by date."""
+        partitions = {}
+        for record in records:
+            date = record.get(self.date_field)
+            if not date:
+                raise ValueError(
+                    "Partitioned exports need the {} of every record".format(
+                        self.date_field
+                    )
+                )
+            partitions.setdefault(partition_key(str(date)), []).append(
+                (str(date), record_hash(record), record)
+            )
+        for entries in partitions.values():
+            entries.sort(key=lambda entry: entry[:2])
+        return partitions
+
+    def write(self, records, start_date=None, end_date=None, limit=None, received=None):
+        """
+        Writes the partitions whose records changed since the last run and
+        returns how many partitions were written, unchanged and removed.
+        records are taken to be every record from start_date to end_date
+        (ISO dates, inclusive) or, when limit records were received
+        (received, when records had some filtered out, e.g. pending
+        transactions), every record after the oldest one's date.  Months
+        that range covers entirely are replaced by the records; months it
+        covers in part keep their records from outside it.  Partitions
+        left without records are removed.
+        """
+        counts = {WRITTEN: 0, UNCHANGED: 0, REMOVED: 0}
+        partitions = self.group(records)
+        known = self.manifest["partitions"]
+        now = datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+
+        if received is None:
+            received = sum(len(entries) for entries in partitions.values())
+        after = None
+        if limit is not None and received >= limit and partitions:
+            # The fetch may have been cut short, part way through the day
+            # of the oldest record
+            oldest = min(entries[0][0] for entries in partitions.values())
+            logger.warning(
+                "Received {} transactions, the limit; keeping those up to "
+                "{}".format(received, oldest[:10])
+            )
+            if start_date is None or start_date <= oldest[:10]:
+                start_date, after = None, oldest[:10]
+
+        def fetched(date):
+            date = date[:10]
+            return (
+                (start_date is None or date >= start_date)
+                and (after is None or date > after)
+                and (end_date is None or date <= end_date)
+            )
+
+        def covered(key):
+            year, month = int(key[5:9]), int(key[-2:])
+            first = datetime.date(year, month, 1).isoformat()
+            last = datetime.date(
+                year, month, calendar.monthrange(year, month)[1]
+            ).isoformat()
+            return (
+                (start_date is None or start_date <= first)
+                and (after is None or after < first)
+                and (end_date is None or end_date >= last)
+            )
+
+        low = start_date or after
+        first_key = partition_key(low) if low else None
+        last_key = partition_key(end_date) if end_date else None
+        keys = set(partitions) | {
+            key
+            for key in known
+            if (first_key is None or key >= first_key)
+            and (last_key is None or key <= last_key)
+        }
+        for key in sorted(keys):
+            entries = partitions.get(key, [])
+            if key in known and not covered(key):
+                entries = self._merge(key, entries, fetched)
+            path = self.partition_path(key)
+            if not entries:
+                if key in known:
+                    self._remove_partition(key)
+                    counts[REMOVED] += 1
+                continue
+            fingerprint = hashlib.blake2b(
+                "".join(entry[1] for entry in entries).encode(), digest_size=16
+            ).hexdigest()
+            previous = known.get(key)
+            if (
+                previous is not None
+                and previous["fingerprint"] == fingerprint
+                and os.path.exists(path)
+            ):
+                counts[UNCHANGED] += 1
+                continue
+            self._write_partition(path, [entry[2] for entry in entries])
+            known[key] = {
+                "path": os.path.relpath(path, self.root).replace(os.sep, "/"),
+                "records": len(entries),
+                "min_date": entries[0][0],
+                "max_date": entries[-1][0],
+                "fingerprint": fingerprint,
+                "updated": now,
+            }
+            counts[WRITTEN] += 1
+
+        self._save_manifest()
+        logger.info(
+            "{} partitions written, {} unchanged, {} removed".format(
+                counts[WRITTEN], counts[UNCHANGED], counts[REMOVED]
+            )
+        )
+        return counts
+
+    def _merge(self, key, entries, fetched):
+        # The stored records the fetch did not cover, unless fetched again
+        # (by id) on a different date
+        ids = {entry[2].get("id") for entry in entries} - {None}
+        kept = [
+            record
+            for record in self._read_partition(self.manifest["partitions"][key])
+            if not fetched(str(record.get(self.date_field)))
+            and record.get("id") not in ids
+        ]
+        if not kept:
+            return entries
+        return sorted(
+            entries + self.group(kept).get(key, []), key=lambda entry: entry[:2]
+        )
+
+    def _remove_partition(self, key):
+        path = os.path.join(
+            self.root, *self.manifest["partitions"][key]["path"].split("/")
+        )
+        if os.path.exists(path):
+            os.remove(path)
+            try:
+                # The month directory, then the year's if now empty
+                os.removedirs(os.path.dirname(path))
+            except OSError:
+                pass
+        del self.manifest["partitions"][key]
+
+    def _write_partition(self, path, records):
+        if self.format == constants.CSV_FORMAT:
+            self._atomic_write(
+                path, lambda f: json_normalize(records).to_csv(f, index=False)
+            )
+        else:
+            self._atomic_write(path, lambda f: codec.dump(records, f))
+
+    def partitions(self, start_date=None, end_date=None):
+        """Manifest entries of the partitions overlapping start_date to end_date."""
+        return [
+            dict(entry, key=key)
+            for key, entry in sorted(self.manifest["partitions"].items())
+            if (start_date is None or entry["max_date"] >= start_date)
+            and (end_date is None or entry["min_date"] <= end_date)
+        ]
+
+    def _read_partition(self, entry):
+        path = os.path.join(self.root, *entry["path"].split("/"))
+        if self.format == constants.CSV_FORMAT:
+            return pandas.read_csv(path).to_dict("records")
+        with open(path, "r", encoding="utf-8") as f:
+            return codec.loads(f.read())
+
+    def read(self, start_date=None, end_date=None):
+        """Yields the records of the partitions overlapping the date range."""
+        for entry in self.partitions(start_date, end_date):
+            for record in self._read_partition(entry):
+                date = str(record.get(self.date_field))
+                if (start_date is None or date >= start_date) and (
+                    end_date is None or date <= end_date
+                ):
+                    yield record
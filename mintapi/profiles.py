@@ -0,0 +1,280 @@
+"""
+Chrome session profiles (the --session-path user-data-dir): pruning caches,
+snapshotting a profile into a template and cloning templates cheaply, under
+a file lock so two processes never use or rewrite the same profile at once.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger("mintapi")
+
+DEFAULT_PROFILE = "Default"
+LOCK_SUFFIX = ".lock"
+# How long to wait for another process to finish with a profile
+DEFAULT_LOCK_TIMEOUT = 60
+
+# What a signed in session needs to skip MFA: the cookies (and, in "Local
+# State", the key they are encrypted with), local storage and preferences.
+# Paths inside the profile directory start with {profile}.
+KEEP_PATHS = [
+    "Local State",
+    "{profile}/Cookies",
+    "{profile}/Cookies-journal",
+    "{profile}/Network/Cookies",
+    "{profile}/Network/Cookies-journal",
+    "{profile}/Local Storage",
+    "{profile}/Preferences",
+    "{profile}/Secure Preferences",
+]
+
+# Caches Chrome rebuilds as needed, and which make it slower to start as
+# they grow
+CACHE_PATHS = [
+    "{profile}/Cache",
+    "{profile}/Code Cache",
+    "{profile}/GPUCache",
+    "{profile}/DawnCache",
+    "{profile}/Media Cache",
+    "{profile}/Application Cache",
+    "{profile}/Service Worker",
+    "{profile}/blob_storage",
+    "{profile}/optimization_guide_prediction_model_downloads",
+    "component_crx_cache",
+    "Crashpad",
+    "GrShaderCache",
+    "GraphiteDawnCache",
+    "ShaderCache",
+]
+
+# Left behind by a running Chrome; a copy would look like it is in use
+SINGLETON_FILES = ["SingletonLock", "SingletonCookie", "SingletonSocket"]
+
+# LevelDB tables are never modified once written, so clones can share them.
+# Everything else (e.g. the SQLite cookie database) is rewritten in place
+# and has to be copied.
+IMMUTABLE_SUFFIXES = (".ldb",)
+
+
+# Locks held by this process, by lock file: [count, open lock file].  They
+# can be taken again, e.g. for a snapshot while the CLI holds the lock on
+# the session.
+_held = {}
+_held_lock = threading.Lock()
+
+
+class ProfileLocked(RuntimeError):
+    pass
+
+
+class ProfileLock(object):
+    """
+    Exclusive lock on a profile, held through a lock file next to it (Chrome
+    owns the inside of the directory).  Waits up to timeout seconds, or
+    forever when timeout is None, then raises ProfileLocked.  Re-entrant
+    within a process.
+    """
+
+    def __init__(self, path, timeout=None, poll_interval=0.1):
+        self.path = os.path.abspath(path).rstrip(os.sep) + LOCK_SUFFIX
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._file = None
+
+    def _try_lock(self):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def acquire(self):
+        with _held_lock:
+            if self.path in _held:
+                _held[self.path][0] += 1
+                self._file = _held[self.path][1]
+                return self
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.path, "a+")
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while not self._try_lock():
+            if deadline is not None and time.monotonic() >= deadline:
+                self._file.close()
+                self._file = None
+                raise ProfileLocked(
+                    "{} is in use by another process".format(
+                        self.path[: -len(LOCK_SUFFIX)]
+                    )
+                )
+            time.sleep(self.poll_interval)
+        with _held_lock:
+            _held[self.path] = [1, self._file]
+        return self
+
+    def release(self):
+        if self._file is None:
+            return
+        self._file = None
+        with _held_lock:
+            held = _held[self.path]
+            held[0] -= 1
+            if held[0]:
+                return
+            del _held[self.path]
+        if fcntl is not None:
+            fcntl.flock(held[1].fileno(), fcntl.LOCK_UN)
+        else:
+            msvcrt.locking(held[1].fileno(), msvcrt.LK_UNLCK, 1)
+        held[1].close()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+def _paths(patterns, profile):
+    return [os.path.normpath(pattern.format(profile=profile)) for pattern in patterns]
+
+
+def tree_size(path):
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return size
+
+
+def prune_profile(path, profile=DEFAULT_PROFILE, lock=True):
+    """Deletes the caches in the profile at path; returns the bytes freed."""
+    if not os.path.isdir(path):
+        return 0
+    if lock:
+        with ProfileLock(path):
+            return prune_profile(path, profile, lock=False)
+    freed = 0
+    for relative in _paths(CACHE_PATHS, profile):
+        target = os.path.join(path, relative)
+        if os.path.isdir(target):
+            freed += tree_size(target)
+            shutil.rmtree(target, ignore_errors=True)
+        elif os.path.exists(target):
+            freed += os.path.getsize(target)
+            os.remove(target)
+    logger.info("Pruned {} bytes of caches from {}".format(freed, path))
+    return freed
+
+
+def _copy_file(source, destination, link):
+    if link and source.endswith(IMMUTABLE_SUFFIXES):
+        try:
+            os.link(source, destination)
+            return
+        except OSError:
+            # e.g. another file system; fall back to a copy
+            pass
+    shutil.copy2(source, destination)
+
+
+def _copy_tree(source, destination, relatives, link):
+    for relative in relatives:
+        source_path = os.path.join(source, relative)
+        destination_path = os.path.join(destination, relative)
+        if os.path.isdir(source_path):
+            for root, _, files in os.walk(source_path):
+                target = os.path.join(destination, os.path.relpath(root, source))
+                os.makedirs(target, exist_ok=True)
+                for name in files:
+                    if name not in SINGLETON_FILES:
+                        _copy_file(
+                            os.path.join(root, name), os.path.join(target, name), link
+                        )
+        elif os.path.isfile(source_path):
+            os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+            _copy_file(source_path, destination_path, link)
+
+
+def _replace_tree(source, destination, relatives, link):
+    # Built next to the destination and swapped in, so a reader never sees
+    # a partial copy
+    parent = os.path.dirname(os.path.abspath(destination))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".mintapi-profile-", dir=parent)
+    try:
+        _copy_tree(source, staging, relatives, link)
+        if os.path.exists(destination):
+            retired = staging + ".old"
+            os.rename(destination, retired)
+            os.rename(staging, destination)
+            shutil.rmtree(retired, ignore_errors=True)
+        else:
+            os.rename(staging, destination)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def snapshot_profile(path, template, profile=DEFAULT_PROFILE):
+    """
+    Copies what a signed in session needs (KEEP_PATHS) from the profile at
+    path into template, replacing it.  Chrome should not be running on the
+    profile, which the lock on it makes sure of when it was started through
+    mintapi.
+    """
+    with ProfileLock(path), ProfileLock(template):
+        _replace_tree(path, template, _paths(KEEP_PATHS, profile), link=False)
+    logger.info("Saved {} as template {}".format(path, template))
+
+
+def clone_profile(template, path):
+    """
+    Replaces the profile at path with a copy of template.  LevelDB tables
+    are hard linked rather than copied when the file system allows it.
+    """
+    with ProfileLock(template), ProfileLock(path):
+        _replace_tree(template, path, sorted(os.listdir(template)), link=True)
+    logger.info("Cloned template {} into {}".format(template, path))
+
+
+def prepare_profile(
+    path,
+    template=None,
+    prune=False,
+    profile=DEFAULT_PROFILE,
+    timeout=DEFAULT_LOCK_TIMEOUT,
+):
+    """
+    Locks the profile at path for the caller, clones it from template if it
+    does not exist yet and prunes its caches if asked to.  Returns the
+    acquired ProfileLock, to be released once Chrome has quit.
+    """
+    lock = ProfileLock(path, timeout=timeout).acquire()
+    try:
+        if template is not None and not os.path.exists(path):
+            if os.path.isdir(template):
+                clone_profile(template, path)
+            else:
+                logger.warning("Session template {} not found".format(template))
+        if prune:
+            prune_profile(path, profile)
+    except BaseException:
+        lock.release()
+        raise
+    return lock
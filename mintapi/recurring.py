@@ -0,0 +1,290 @@
+"""
+Recurring charges and subscriptions, detected from transaction history.
+Transactions are grouped by normalized merchant and by amount, and each
+group is sorted by date once, so detection is O(n log n) overall instead of
+comparing transactions pairwise.
+"""
+
+from bisect import insort
+from datetime import date, datetime
+import re
+import statistics
+
+from dateutil.relativedelta import relativedelta
+
+# (name, nominal interval in days, allowed deviation in days, calendar
+# months between charges, if billed on a day of the month)
+PERIODS = [
+    ("weekly", 7, 1, None),
+    ("biweekly", 14, 2, None),
+    ("monthly", 30.44, 4, 1),
+    ("quarterly", 91.31, 10, 3),
+    ("semiannual", 182.62, 15, 6),
+    ("yearly", 365.25, 20, 12),
+]
+
+DEFAULT_MIN_OCCURRENCES = 3
+# Share of the intervals that have to match the period
+DEFAULT_MIN_REGULARITY = 0.75
+# Relative difference between amounts still considered the same charge,
+# e.g. a price increase
+DEFAULT_AMOUNT_TOLERANCE = 0.25
+
+SOURCE_TRANSACTIONS = "transactions"
+SOURCE_BILL = "bill"
+SOURCE_BOTH = "both"
+
+# get_bills does not document its records, so the first of these present
+# is used
+BILL_NAME_FIELDS = ["name", "billName", "providerName", "nickname"]
+BILL_AMOUNT_FIELDS = ["amountDue", "amount", "minimumDue"]
+BILL_DUE_DATE_FIELDS = ["dueDate", "nextDueDate"]
+
+# Payment processors prefixed to the merchant, e.g. "SQ *COFFEE SHOP"
+PROCESSOR_PATTERN = re.compile(r"^(?:sq|tst|pp|paypal|sp|ic|dd|pos)\s?\*\s*")
+NOISE_WORDS = {"com", "www", "inc", "llc", "ltd", "co"}
+
+
+def normalize_merchant(description):
+    """
+    The merchant of a transaction description, without processor prefixes,
+    reference numbers, punctuation or case: "SQ *Blue Bottle #0042" and
+    "Blue Bottle" are both "blue bottle".
+    """
+    if not description:
+        return None
+    value = PROCESSOR_PATTERN.sub("", description.strip().lower())
+    # "AMZN Mktp US*2K3H81" is "AMZN Mktp US", with a reference after the *
+    value = value.split("*", 1)[0] or value
+    words = re.sub(r"[^a-z0-9]+", " ", value).split()
+    words = [
+        word
+        for word in words
+        if word not in NOISE_WORDS and not any(c.isdigit() for c in word)
+    ]
+    return " ".join(words) or None
+
+
+def _ordinal(value):
+    try:
+        return datetime.strptime(str(value)[:10], "%Y-%m-%d").toordinal()
+    except ValueError:
+        return None
+
+
+def _iso(ordinal):
+    return date.fromordinal(int(round(ordinal))).isoformat()
+
+
+def _period(interval):
+    for period in PERIODS:
+        if abs(interval - period[1]) <= period[2]:
+            return period
+    return None
+
+
+def _next_ordinal(ordinal, interval, months):
+    if months is None:
+        return int(round(ordinal + interval))
+    # The same day of the month, or the last day of a shorter month
+    return (date.fromordinal(ordinal) + relativedelta(months=months)).toordinal()
+
+
+def _first(record, fields):
+    for field in fields:
+        if record.get(field) not in (None, ""):
+            return record[field]
+    return None
+
+
+class RecurringChargeDetector(object):
+    """
+    Detects recurring charges in transactions added with add().  Each
+    merchant's transactions are kept sorted by date, and only the merchants
+    that received new or changed transactions are evaluated again, so
+    adding a day's transactions does not re-examine the whole history.
+
+    Within a merchant, transactions are split by amount (within
+    amount_tolerance of each other) so that e.g. two subscriptions billed
+    by the same store are told apart.  A group is recurring when it has at
+    least min_occurrences transactions and min_regularity of the intervals
+    between them match one of the PERIODS.
+    """
+
+    def __init__(
+        self,
+        min_occurrences=DEFAULT_MIN_OCCURRENCES,
+        min_regularity=DEFAULT_MIN_REGULARITY,
+        amount_tolerance=DEFAULT_AMOUNT_TOLERANCE,
+    ):
+        self.min_occurrences = min_occurrences
+        self.min_regularity = min_regularity
+        self.amount_tolerance = amount_tolerance
+        self._groups = {}
+        self._entries = {}
+        self._charges = {}
+        self._dirty = set()
+        self._latest = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, transactions):
+        """
+        Adds (or, by id, replaces) transactions; returns the merchants whose
+        charges will be evaluated again.
+        """
+        changed = set()
+        for transaction in transactions:
+            merchant = normalize_merchant(transaction.get("description"))
+            ordinal = _ordinal(transaction.get("date"))
+            amount = transaction.get("amount")
+            if merchant is None or ordinal is None or amount is None:
+                continue
+            id = transaction.get("id") or (ordinal, merchant, amount)
+            entry = (ordinal, str(id), amount, transaction.get("description"))
+            previous = self._entries.get(id)
+            if previous is not None:
+                if previous == (merchant, entry):
+                    continue
+                self._groups[previous[0]].remove(previous[1])
+                changed.add(previous[0])
+            self._entries[id] = (merchant, entry)
+            insort(self._groups.setdefault(merchant, []), entry)
+            changed.add(merchant)
+            if self._latest is None or ordinal > self._latest:
+                self._latest = ordinal
+        self._dirty |= changed
+        return changed
+
+    def _evaluate(self):
+        for merchant in self._dirty:
+            entries = self._groups.get(merchant)
+            charges = [
+                self._detect(merchant, cluster)
+                for cluster in self._clusters(entries or [])
+            ]
+            charges = [charge for charge in charges if charge is not None]
+            if charges:
+                self._charges[merchant] = charges
+            else:
+                self._charges.pop(merchant, None)
+        self._dirty = set()
+
+    def _clusters(self, entries):
+        # Sorted by amount, a new cluster starts whenever the amount is too
+        # far from the first of the current one; each cluster is then put
+        # back in date order.
+        clusters = []
+        for entry in sorted(entries, key=lambda entry: entry[2]):
+            if clusters:
+                first = clusters[-1][0][2]
+                if abs(entry[2] - first) <= self.amount_tolerance * abs(first) + 0.01:
+                    clusters[-1].append(entry)
+                    continue
+            clusters.append([entry])
+        return [
+            sorted(cluster)
+            for cluster in clusters
+            if len(cluster) >= self.min_occurrences
+        ]
+
+    def _detect(self, merchant, entries):
+        intervals = [b[0] - a[0] for a, b in zip(entries, entries[1:])]
+        if not intervals:
+            return None
+        period = _period(statistics.median(intervals))
+        if period is None:
+            return None
+        name, days, tolerance, months = period
+        matching = [i for i in intervals if abs(i - days) <= tolerance]
+        regularity = len(matching) / len(intervals)
+        if regularity < self.min_regularity:
+            return None
+        amounts = [entry[2] for entry in entries]
+        typical = statistics.median(amounts)
+        spread = (max(amounts) - min(amounts)) / abs(typical) if typical else 0
+        interval = statistics.median(matching)
+        due = _next_ordinal(entries[-1][0], interval, months)
+        return {
+            "merchant": merchant,
+            "description": entries[-1][3],
+            "period": name,
+            "interval_days": interval,
+            "occurrences": len(entries),
+            "amount": typical,
+            "min_amount": min(amounts),
+            "max_amount": max(amounts),
+            "first_date": _iso(entries[0][0]),
+            "last_date": _iso(entries[-1][0]),
+            "next_date": _iso(due),
+            "confidence": round(regularity * max(0.0, 1 - spread), 3),
+            "transaction_ids": [entry[1] for entry in entries],
+            "_expires": due + tolerance,
+        }
+
+    def charges(self):
+        """
+        The recurring charges detected, by merchant.  A charge is active
+        unless it was due before the latest transaction added.
+        """
+        self._evaluate()
+        return [
+            self._row(charge)
+            for merchant in sorted(self._charges)
+            for charge in self._charges[merchant]
+        ]
+
+    def _row(self, charge):
+        row = {key: value for key, value in charge.items() if key != "_expires"}
+        row["active"] = charge["_expires"] >= self._latest
+        return row
+
+    def table(self, bills=()):
+        """
+        The recurring-charge table: every detected charge, with the bill
+        from get_bills it matches (by merchant name, then closest amount),
+        and a row for each bill no charge matches.  "source" tells whether
+        a row comes from the transactions, a bill or both.
+        """
+        rows = self.charges()
+        by_merchant = {}
+        by_word = {}
+        for row in rows:
+            row["source"] = SOURCE_TRANSACTIONS
+            row["bill"] = None
+            by_merchant.setdefault(row["merchant"], []).append(row)
+            by_word.setdefault(row["merchant"].split()[0], []).append(row)
+
+        unmatched = []
+        for bill in bills:
+            name = normalize_merchant(_first(bill, BILL_NAME_FIELDS))
+            amount = _first(bill, BILL_AMOUNT_FIELDS)
+            candidates = []
+            if name is not None:
+                candidates = by_merchant.get(name) or [
+                    row
+                    for row in by_word.get(name.split()[0], [])
+                    if row["merchant"].startswith(name)
+                    or name.startswith(row["merchant"])
+                ]
+            candidates = [row for row in candidates if row["bill"] is None]
+            if candidates:
+                if isinstance(amount, (int, float)):
+                    # Bills are amounts due, charges are usually negative
+                    candidates.sort(key=lambda row: abs(abs(row["amount"]) - amount))
+                row = candidates[0]
+                row["bill"] = bill
+                row["source"] = SOURCE_BOTH
+            else:
+                unmatched.append(
+                    {
+                        "merchant": name,
+                        "description": _first(bill, BILL_NAME_FIELDS),
+                        "amount": amount,
+                        "next_date": _first(bill, BILL_DUE_DATE_FIELDS),
+                        "source": SOURCE_BILL,
+                        "bill": bill,
+                    }
+                )
+        return rows + unmatched
@@ -0,0 +1,201 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import random
+import threading
+import time
+
+from mintapi import batch, constants
+from mintapi.sync import STATUS_OK, utc_timestamp
+
+logger = logging.getLogger("mintapi")
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+DEFAULT_CADENCES = {
+    constants.TRANSACTION_KEY: 15 * MINUTE,
+    constants.ACCOUNT_KEY: HOUR,
+    constants.BUDGET_KEY: HOUR,
+    constants.INVESTMENT_KEY: HOUR,
+    constants.NET_WORTH_KEY: HOUR,
+    constants.CATEGORY_KEY: DAY,
+    constants.CREDIT_SCORE_KEY: 7 * DAY,
+    constants.CREDIT_REPORT_KEY: 7 * DAY,
+}
+DEFAULT_JITTER = 0.1
+DEFAULT_REFRESH_MAX_AGE = HOUR
+# Longest the scheduler sleeps between checks, so stop() is noticed
+MAX_IDLE = 60
+
+FETCHERS = dict(
+    batch.FETCHERS,
+    **{constants.CREDIT_REPORT_KEY: lambda mint, limit: mint.get_credit_report()}
+)
+
+
+class Job(object):
+    def __init__(self, name, interval, func):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.next_run = None
+        self.future = None
+        self.runs = 0
+        self.skipped = 0
+        self.failures = 0
+        self.last_error = None
+
+    def running(self):
+        return self.future is not None and not self.future.done()
+
+
+class Scheduler(object):
+    """
+    Runs each job on its own cadence in a small thread pool.  Every delay is
+    spread by +/- jitter (a fraction of the interval) so jobs drift apart
+    instead of firing together, and a job that is due while its previous
+    run has not finished is skipped rather than queued behind it.
+    """
+
+    def __init__(
+        self,
+        jitter=DEFAULT_JITTER,
+        max_workers=2,
+        clock=time.monotonic,
+        rng=None,
+    ):
+        self.jitter = jitter
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self.jobs = []
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="mintapi-scheduler"
+        )
+        self._stopped = threading.Event()
+
+    def delay(self, interval):
+        return interval * (1 + self.rng.uniform(-self.jitter, self.jitter))
+
+    def add_job(self, name, interval, func, run_now=True):
+        job = Job(name, interval, func)
+        job.next_run = self.clock() if run_now else self.clock() + self.delay(interval)
+        self.jobs.append(job)
+        return job
+
+    def run_pending(self):
+        """Starts every job that is due; returns the jobs started."""
+        now = self.clock()
+        started = []
+        for job in self.jobs:
+            if job.next_run > now:
+                continue
+            job.next_run = now + self.delay(job.interval)
+            if job.running():
+                job.skipped += 1
+                logger.info(
+                    "Skipping {}, the previous run is not done".format(job.name)
+                )
+                continue
+            job.future = self.executor.submit(self._run_job, job)
+            started.append(job)
+        return started
+
+    def _run_job(self, job):
+        start = self.clock()
+        try:
+            job.func()
+            job.runs += 1
+            job.last_error = None
+        except Exception as e:
+            job.failures += 1
+            job.last_error = e
+            logger.exception("Scheduled {} failed".format(job.name))
+        else:
+            logger.info(
+                "Scheduled {} took {:.1f}s".format(job.name, self.clock() - start)
+            )
+
+    def seconds_until_next(self):
+        if not self.jobs:
+            return MAX_IDLE
+        return max(0, min(job.next_run for job in self.jobs) - self.clock())
+
+    def run_forever(self):
+        """Runs jobs until stop() is called (e.g. from a signal handler)."""
+        try:
+            while not self._stopped.is_set():
+                self.run_pending()
+                self._stopped.wait(min(self.seconds_until_next(), MAX_IDLE))
+        finally:
+            self.executor.shutdown(wait=True)
+
+    def stop(self):
+        self._stopped.set()
+
+
+class RefreshPolicy(object):
+    """
+    Job that asks Mint to refresh accounts only when it is needed: when an
+    active, logged in account was last updated more than max_age seconds
+    ago and no refresh started by this policy is still running.
+    """
+
+    def __init__(self, mint, max_age=DEFAULT_REFRESH_MAX_AGE, clock=time.time):
+        self.mint = mint
+        self.max_age = max_age
+        self.clock = clock
+        self.sync = None
+        self.refreshes = 0
+
+    def stale(self, accounts):
+        threshold = utc_timestamp(self.clock() - self.max_age)
+        return any(
+            (account.get("lastUpdatedDate") or "") < threshold
+            for account in accounts
+            # A refresh does not help accounts that fail to log in
+            if account.get("isActive", True)
+            and account.get("fiLoginStatus", STATUS_OK) == STATUS_OK
+        )
+
+    def __call__(self):
+        if self.sync is not None and not self.sync.future.done():
+            return False
+        if not self.stale(self.mint.get_account_data()):
+            return False
+        logger.info("Accounts are out of date, refreshing")
+        self.sync = self.mint.start_account_sync()
+        self.refreshes += 1
+        return True
+
+
+def schedule_mint(
+    scheduler,
+    mint,
+    types,
+    output,
+    cadences=None,
+    limit=5000,
+    refresh_max_age=DEFAULT_REFRESH_MAX_AGE,
+    fetchers=None,
+):
+    """
+    Adds a job to scheduler for each data type in types, calling
+    output(type, data) with the data fetched from mint, plus a RefreshPolicy
+    job (unless refresh_max_age is None) checked as often as the most
+    frequent type.  fetchers replaces the FETCHERS of some types.
+    """
+    cadences = dict(DEFAULT_CADENCES, **(cadences or {}))
+    fetchers = dict(FETCHERS, **(fetchers or {}))
+
+    def fetch(type):
+        return lambda: output(type, fetchers[type](mint, limit))
+
+    for type in types:
+        scheduler.add_job(type, cadences[type], fetch(type))
+    if refresh_max_age is not None and types:
+        interval = min(cadences[type] for type in types)
+        scheduler.add_job(
+            "refresh", interval, RefreshPolicy(mint, refresh_max_age), run_now=False
+        )
+    return scheduler
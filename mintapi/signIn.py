@@ -11,6 +11,7 @@ import subprocess
 import sys
 import time
 import zipfile
+from urllib.parse import urlparse
 
 from selenium.common.exceptions import (
     ElementNotInteractableException,
@@ -27,6 +28,8 @@ from seleniumrequests import Chrome
 
 import oathtool
 
+from mintapi.imapwatch import wait_for_email_code
+
 logger = logging.getLogger("mintapi")
 
 MFA_VIA_SOFT_TOKEN = "soft-token"
@@ -65,6 +68,9 @@ MFA_METHODS = [
     },
 ]
 
+MINT_HOME_URL = "https://www.mint.com"
+MINT_HOSTS = ["www.mint.com", "mint.com"]
+
 DEFAULT_MFA_INPUT_PROMPT = "Please enter your 6-digit MFA code: "
 
 STANDARD_MISSING_EXCEPTIONS = (
@@ -273,6 +279,42 @@ def get_stable_chrome_driver(download_directory=os.getcwd()):
     return local_executable_path
 
 
+def chrome_options(headless=False, session_path=None):
+    options = ChromeOptions()
+    if headless:
+        options.add_argument("headless")
+        options.add_argument("no-sandbox")
+        options.add_argument("disable-dev-shm-usage")
+        options.add_argument("disable-gpu")
+        # options.add_argument("--window-size=1920x1080")
+    if session_path is not None:
+        options.add_argument("user-data-dir=%s" % session_path)
+    return options
+
+
+def resolve_chrome_driver(
+    use_chromedriver_on_path=False, chromedriver_download_path=os.getcwd()
+):
+    """
+    Returns the path of the chromedriver to use, downloading it if needed,
+    or None to use the one on the PATH.
+    """
+    if use_chromedriver_on_path:
+        return None
+    return get_stable_chrome_driver(chromedriver_download_path)
+
+
+def launch_chrome(headless=False, session_path=None, executable_path=None):
+    options = chrome_options(headless, session_path)
+    if executable_path is None:
+        return Chrome(options=options)
+    return Chrome(options=options, executable_path=executable_path)
+
+
+def at_mint_com(driver):
+    return urlparse(driver.current_url).netloc in MINT_HOSTS
+
+
 def _create_web_driver_at_mint_com(
     headless=False,
     session_path=None,
@@ -282,24 +324,11 @@ def _create_web_driver_at_mint_com(
     """
     Handles starting a web driver at mint.com
     """
-    chrome_options = ChromeOptions()
-    if headless:
-        chrome_options.add_argument("headless")
-        chrome_options.add_argument("no-sandbox")
-        chrome_options.add_argument("disable-dev-shm-usage")
-        chrome_options.add_argument("disable-gpu")
-        # chrome_options.add_argument("--window-size=1920x1080")
-    if session_path is not None:
-        chrome_options.add_argument("user-data-dir=%s" % session_path)
-
-    if use_chromedriver_on_path:
-        driver = Chrome(options=chrome_options)
-    else:
-        driver = Chrome(
-            options=chrome_options,
-            executable_path=get_stable_chrome_driver(chromedriver_download_path),
-        )
-    return driver
+    return launch_chrome(
+        headless,
+        session_path,
+        resolve_chrome_driver(use_chromedriver_on_path, chromedriver_download_path),
+    )
 
 
 def sign_in(
@@ -321,7 +350,9 @@ def sign_in(
     Takes in a web driver and gets it through the Mint sign in process
     """
     driver.implicitly_wait(20)  # seconds
-    driver.get("https://www.mint.com")
+    if not at_mint_com(driver):
+        # Not already loaded, e.g. by mintapi.startup
+        driver.get(MINT_HOME_URL)
     element = driver.find_element_by_link_text("Sign in")
     element.click()
 
@@ -365,6 +396,7 @@ def sign_in(
             imap_password,
             imap_server,
             imap_folder,
+            email,
         )
         account_selection_page(driver, intuit_account)
         password_page(driver, password)
@@ -478,6 +510,7 @@ def mfa_page(
     imap_password,
     imap_server,
     imap_folder,
+    recipient=None,
 ):
     if mfa_method is None:
         mfa_result = search_mfa_method(driver)
@@ -505,6 +538,7 @@ def mfa_page(
             imap_password,
             imap_server,
             imap_folder,
+            recipient,
         )
     else:
         handle_other_mfa(mfa_token_input, mfa_token_button, mfa_input_callback)
@@ -573,13 +607,16 @@ def handle_email_by_imap(
     imap_password,
     imap_server,
     imap_folder,
+    recipient=None,
 ):
     try:
-        mfa_code = get_email_code(
+        # Shared with any other login waiting on the same mailbox
+        mfa_code = wait_for_email_code(
             imap_account,
             imap_password,
             imap_server,
             imap_folder,
+            recipient=recipient,
         )
         if mfa_code is None:
             mfa_code = (mfa_input_callback or input)(DEFAULT_MFA_INPUT_PROMPT)
@@ -0,0 +1,81 @@
+"""
+Overlapped startup: the chromedriver check, the Chrome launch and the
+mint.com preload run on a background thread while the caller fetches
+credentials (keyring, password and IMAP prompts) on its own.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+import os
+
+from mintapi import metrics
+from mintapi.signIn import MINT_HOME_URL, launch_chrome, resolve_chrome_driver
+
+STAGE_RESOLVE_DRIVER = "resolve_driver"
+STAGE_LAUNCH_CHROME = "launch_chrome"
+STAGE_PRELOAD = "preload_mint"
+STAGE_DRIVER_WAIT = "driver_wait"
+STAGE_MINT_PASSWORD = "mint_password"
+STAGE_IMAP_PASSWORD = "imap_password"
+
+
+def create_web_driver(
+    headless=False,
+    session_path=None,
+    use_chromedriver_on_path=False,
+    chromedriver_download_path=os.getcwd(),
+    instrumentation=None,
+):
+    """Starts Chrome and loads mint.com, timing each stage."""
+    instrumentation = instrumentation or metrics.Instrumentation()
+    with instrumentation.timed(metrics.PHASE_STARTUP, endpoint=STAGE_RESOLVE_DRIVER):
+        executable_path = resolve_chrome_driver(
+            use_chromedriver_on_path, chromedriver_download_path
+        )
+    with instrumentation.timed(metrics.PHASE_STARTUP, endpoint=STAGE_LAUNCH_CHROME):
+        driver = launch_chrome(headless, session_path, executable_path)
+    try:
+        with instrumentation.timed(metrics.PHASE_STARTUP, endpoint=STAGE_PRELOAD):
+            driver.get(MINT_HOME_URL)
+    except Exception:
+        driver.quit()
+        raise
+    return driver
+
+
+def start_web_driver(**kwargs):
+    """
+    Runs create_web_driver(**kwargs) on a background thread and returns its
+    Future right away.  Pass the Future to Mint as driver; it is only
+    waited on when signing in.
+    """
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mintapi-startup")
+    future = executor.submit(create_web_driver, **kwargs)
+    executor.shutdown(wait=False)
+    return future
+
+
+def discard_web_driver(future):
+    """
+    Quits the driver of future once it has started, e.g. on an error.  A
+    driver passed in directly belongs to the caller and is left alone.
+    """
+    if not isinstance(future, Future):
+        return
+
+    def quit(future):
+        if not future.cancelled() and future.exception() is None:
+            future.result().quit()
+
+    if not future.cancel():
+        future.add_done_callback(quit)
+
+
+def resolve_web_driver(driver, instrumentation=None):
+    """The driver itself, waiting for it first if it is a Future."""
+    if not isinstance(driver, Future):
+        return driver
+    instrumentation = instrumentation or metrics.Instrumentation()
+    with instrumentation.timed(
+        metrics.PHASE_STARTUP, endpoint=STAGE_DRIVER_WAIT, wait=True
+    ):
+        return driver.result()
@@ -0,0 +1,241 @@
+from concurrent.futures import Future
+from datetime import datetime, timezone
+import logging
+import threading
+import time
+
+logger = logging.getLogger("mintapi")
+
+DEFAULT_POLL_INTERVAL = 10
+DEFAULT_TIMEOUT = 5 * 60
+
+# fiLoginStatus values seen while an institution is still being refreshed;
+# any other status except OK means the refresh failed.
+STATUS_OK = "OK"
+REFRESHING_STATUSES = frozenset(
+    ["REFRESH_REQUESTED", "REFRESHING", "IN_PROGRESS", "PENDING"]
+)
+STATUS_TIMED_OUT = "TIMED_OUT"
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def utc_timestamp(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+
+def login_status(accounts):
+    """
+    The fiLoginStatus of an institution from those of its accounts: the
+    first error any of them reports, else the first still refreshing, else
+    OK.
+    """
+    statuses = [account.get("fiLoginStatus") for account in accounts]
+    for status in statuses:
+        if status != STATUS_OK and status not in REFRESHING_STATUSES:
+            return status
+    for status in statuses:
+        if status in REFRESHING_STATUSES:
+            return status
+    return STATUS_OK
+
+
+def status_message(statuses):
+    """
+    The statuses returned by SyncController.wait() summed up like the status
+    bar of the overview page, e.g. "Account refresh complete. 1 institution
+    needs attention", as kept in Mint.status_message.
+    """
+    stale = sum(1 for status in statuses.values() if not status["fresh"])
+    if not stale:
+        return "Account refresh complete."
+    return "Account refresh complete. {} {} attention".format(
+        stale, "institution needs" if stale == 1 else "institutions need"
+    )
+
+
+class SyncController(object):
+    """
+    Starts an account refresh and tracks it per institution (fiLoginId) by
+    polling the accounts endpoint in a background thread, instead of
+    blocking on the status bar of the overview page.  An institution is
+    done once all of its accounts report an OK fiLoginStatus with a
+    lastUpdatedDate after the refresh started, or once it reports an error
+    status.  Each institution has a future (and callbacks) that resolves to
+    its status as soon as it is done, so data from fresh institutions can be
+    fetched while slow ones are still refreshing.
+    """
+
+    def __init__(
+        self,
+        mint,
+        poll_interval=DEFAULT_POLL_INTERVAL,
+        timeout=DEFAULT_TIMEOUT,
+        clock=time.time,
+    ):
+        self.mint = mint
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.clock = clock
+        self.started_at = None
+        self.institutions = {}
+        self.future = Future()
+        self._futures = {}
+        self._callbacks = []
+        self._lock = threading.RLock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self, refresh=True):
+        """
+        Initiates the refresh (unless refresh is False, e.g. when Mint is
+        already refreshing after sign in) and returns right away.
+        """
+        self.started_at = self.clock()
+        if refresh:
+            self.mint.initiate_account_refresh()
+        self._thread = threading.Thread(
+            target=self._run, name="mintapi-sync", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def wait(self, timeout=None):
+        """Blocks until every institution is done; returns status()."""
+        return self.future.result(timeout)
+
+    def institution(self, fi_login_id):
+        """Future resolving to the status of one institution once it is done."""
+        with self._lock:
+            future = self._futures.get(fi_login_id)
+            if future is None:
+                future = self._futures[fi_login_id] = Future()
+                if self.institutions.get(fi_login_id, {}).get("done"):
+                    future.set_result(self.institutions[fi_login_id])
+            return future
+
+    def add_done_callback(self, callback):
+        """
+        Calls callback(status) for each institution as it finishes, including
+        those that already have.
+        """
+        with self._lock:
+            self._callbacks.append(callback)
+            done = [status for status in self.institutions.values() if status["done"]]
+        for status in done:
+            self._call(callback, status)
+
+    def status(self):
+        with self._lock:
+            return {id: dict(status) for id, status in self.institutions.items()}
+
+    def fresh_account_ids(self):
+        """Ids of the accounts whose institution has finished refreshing."""
+        with self._lock:
+            return [
+                account_id
+                for status in self.institutions.values()
+                if status["fresh"]
+                for account_id in status["accountIds"]
+            ]
+
+    def update(self, accounts):
+        """Updates the status of each institution from get_account_data."""
+        started = utc_timestamp(self.started_at)
+        grouped = {}
+        for account in accounts:
+            grouped.setdefault(account.get("fiLoginId"), []).append(account)
+
+        finished = []
+        with self._lock:
+            for fi_login_id, fi_accounts in grouped.items():
+                status = self.institutions.get(fi_login_id)
+                if status is not None and status["done"]:
+                    continue
+                fi_login_status = login_status(fi_accounts)
+                updated = min(
+                    account.get("lastUpdatedDate") or "" for account in fi_accounts
+                )
+                fresh = fi_login_status == STATUS_OK and updated >= started
+                failed = (
+                    fi_login_status != STATUS_OK
+                    and fi_login_status not in REFRESHING_STATUSES
+                )
+                status = {
+                    "fiLoginId": fi_login_id,
+                    "fiName": fi_accounts[0].get("fiName"),
+                    "fiLoginStatus": fi_login_status,
+                    "lastUpdatedDate": updated or None,
+                    "accountIds": [account.get("id") for account in fi_accounts],
+                    "fresh": fresh,
+                    "done": fresh or failed,
+                }
+                self.institutions[fi_login_id] = status
+                if status["done"]:
+                    finished.append(status)
+        for status in finished:
+            self._finish(status)
+        return self.status()
+
+    def _finish(self, status):
+        logger.info(
+            "Refresh of {} finished: {}".format(
+                status["fiName"] or status["fiLoginId"], status["fiLoginStatus"]
+            )
+        )
+        with self._lock:
+            future = self._futures.get(status["fiLoginId"])
+            if future is not None and not future.done():
+                future.set_result(status)
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            self._call(callback, status)
+
+    def _call(self, callback, status):
+        try:
+            callback(status)
+        except Exception:
+            logger.exception("Sync callback failed")
+
+    def _all_done(self):
+        with self._lock:
+            return bool(self.institutions) and all(
+                status["done"] for status in self.institutions.values()
+            )
+
+    def _time_out(self):
+        logger.warning(
+            "Mint sync apparently incomplete after timeout. "
+            "Data retrieved may not be current."
+        )
+        with self._lock:
+            pending = [
+                status for status in self.institutions.values() if not status["done"]
+            ]
+            for status in pending:
+                status.update(fiLoginStatus=STATUS_TIMED_OUT, done=True)
+        for status in pending:
+            self._finish(status)
+
+    def _run(self):
+        try:
+            while not self._stopped.is_set():
+                self.update(self.mint.get_account_data())
+                if self._all_done():
+                    break
+                if self.clock() - self.started_at >= self.timeout:
+                    self._time_out()
+                    break
+                self._stopped.wait(self.poll_interval)
+        except Exception as e:
+            logger.exception("Unable to track the account refresh")
+            with self._lock:
+                futures = [self.future] + list(self._futures.values())
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.future.set_result(self.status())
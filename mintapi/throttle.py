@@ -0,0 +1,244 @@
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import logging
+import random
+import threading
+import time
+
+import requests
+
+logger = logging.getLogger("mintapi")
+
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+THROTTLE_STATUSES = (429, 503)
+RETRY_EXCEPTIONS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+# Methods that may be sent again without repeating their effect
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE", "TRACE"])
+
+DEFAULT_RATE = 10.0
+DEFAULT_BURST = 10
+DEFAULT_MIN_RATE = 0.5
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 30.0
+DEFAULT_TIMEOUT = 60
+DEFAULT_FAILURE_THRESHOLD = 10
+DEFAULT_RESET_TIMEOUT = 60.0
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class RetriesExhaustedError(RuntimeError):
+    pass
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket.  The refill rate adapts to the server: it is
+    halved every time we are throttled and creeps back up towards max_rate
+    with every success (additive increase, multiplicative decrease).
+    """
+
+    def __init__(
+        self,
+        rate=DEFAULT_RATE,
+        capacity=DEFAULT_BURST,
+        min_rate=DEFAULT_MIN_RATE,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+    def on_success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def on_throttle(self):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            logger.info("Throttled by Mint, slowing to {:.2f} req/s".format(self.rate))
+
+
+class CircuitBreaker(object):
+    """
+    Stops sending requests after failure_threshold consecutive failures.
+    After reset_timeout seconds requests are let through again, and the
+    first one to fail re-opens the circuit.
+    """
+
+    def __init__(
+        self,
+        failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+        reset_timeout=DEFAULT_RESET_TIMEOUT,
+        clock=time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            if self.clock() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError(
+                    "Too many consecutive failed requests to Mint; "
+                    "not sending more for {} seconds.".format(self.reset_timeout)
+                )
+            # Half open: let this request through as a trial
+            self.opened_at = None
+            self.failures = self.failure_threshold - 1
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+
+
+def parse_retry_after(value):
+    """Returns the Retry-After header as a number of seconds, or None."""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class RequestScheduler(object):
+    """
+    Shared scheduling layer for every request made to Mint.  Requests wait
+    for a token from the rate limiter, are retried with jittered exponential
+    backoff on connection errors and retryable statuses (honoring
+    Retry-After), get a default timeout, and are refused outright while the
+    circuit breaker is open.  Only idempotent methods are retried unless a
+    request asks for it with retry=True.  One scheduler may be shared by several Mint
+    instances and threads.
+    """
+
+    def __init__(
+        self,
+        rate=DEFAULT_RATE,
+        burst=DEFAULT_BURST,
+        max_retries=DEFAULT_MAX_RETRIES,
+        backoff_base=DEFAULT_BACKOFF_BASE,
+        backoff_max=DEFAULT_BACKOFF_MAX,
+        timeout=DEFAULT_TIMEOUT,
+        retry_statuses=RETRY_STATUSES,
+        circuit_breaker=None,
+        sleep=time.sleep,
+    ):
+        self.bucket = TokenBucket(rate, burst, sleep=sleep)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.retry_statuses = retry_statuses
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.sleep = sleep
+
+    def backoff(self, attempt, response=None):
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after is not None:
+                return min(retry_after, self.backoff_max)
+        # "Full jitter": uniformly random up to the exponential ceiling
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def request(self, send, method, url, retry=None, **kwargs):
+        """
+        Sends `method url` through `send`, which takes the same arguments as
+        requests.request.  retry defaults to whether method is idempotent;
+        without it a connection error is raised and a retryable status
+        returned as is, since the request may already have taken effect.
+        """
+        if retry is None:
+            retry = method.upper() in IDEMPOTENT_METHODS
+        if self.timeout is not None:
+            kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            self.circuit_breaker.allow()
+            self.bucket.acquire()
+            response = None
+            try:
+                response = send(method, url, **kwargs)
+            except RETRY_EXCEPTIONS as e:
+                if not retry:
+                    self.circuit_breaker.record_failure()
+                    raise
+                error = e
+            else:
+                if response.status_code not in self.retry_statuses:
+                    self.circuit_breaker.record_success()
+                    self.bucket.on_success()
+                    return response
+                error = "status {}".format(response.status_code)
+                if response.status_code in THROTTLE_STATUSES:
+                    self.bucket.on_throttle()
+                if not retry:
+                    self.circuit_breaker.record_failure()
+                    return response
+
+            self.circuit_breaker.record_failure()
+            if attempt >= self.max_retries:
+                if response is not None:
+                    response.close()
+                raise RetriesExhaustedError(
+                    "{} {} failed after {} attempts: {}".format(
+                        method, url, attempt + 1, error
+                    )
+                )
+            delay = self.backoff(attempt, response)
+            if response is not None:
+                # Hands the connection back to the pool while we wait
+                response.close()
+            logger.info(
+                "{} {} failed ({}), retrying in {:.1f}s".format(
+                    method, url, error, delay
+                )
+            )
+            self.sleep(delay)
+            attempt += 1
@@ -0,0 +1,62 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_SIZE = 10
+USER_AGENT_SCRIPT = "return navigator.userAgent;"
+
+
+class PooledTransport(object):
+    """
+    Thread-safe HTTP for the Mint REST endpoints: a requests.Session with a
+    connection pool of pool_size per host, carrying the cookies of the
+    signed-in browser.  Unlike the selenium driver it can be used by many
+    threads at once.
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, user_agent=None):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if user_agent:
+            self.session.headers["User-Agent"] = user_agent
+
+    def update_cookies(self, cookies):
+        """Adds cookies as returned by a selenium driver's get_cookies()."""
+        for cookie in cookies:
+            self.session.cookies.set(
+                cookie["name"],
+                cookie["value"],
+                domain=cookie.get("domain", ""),
+                path=cookie.get("path", "/"),
+            )
+
+    def get_cookies(self):
+        """The session's cookies, in the form of a selenium driver's get_cookies()."""
+        return [
+            {
+                "name": cookie.name,
+                "value": cookie.value,
+                "domain": cookie.domain,
+                "path": cookie.path,
+                "secure": cookie.secure,
+            }
+            for cookie in self.session.cookies
+        ]
+
+    def request(self, method, url, **kwargs):
+        return self.session.request(method, url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def transport_from_driver(driver, pool_size=DEFAULT_POOL_SIZE):
+    """A PooledTransport seeded with the user agent and cookies of driver."""
+    try:
+        user_agent = driver.execute_script(USER_AGENT_SCRIPT)
+    except Exception:
+        user_agent = None
+    transport = PooledTransport(pool_size, user_agent=user_agent)
+    transport.update_cookies(driver.get_cookies())
+    return transport
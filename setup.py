@@ -20,6 +20,7 @@ setuptools.setup(
     url="https://github.com/mintapi/mintapi",
     install_requires=[
         "configargparse",
+        "numpy",
         "oathtool",
         "pandas>=1.0",
         "requests",
@@ -28,6 +29,10 @@ setuptools.setup(
         "xmltodict",
         "keyring",
     ],
+    extras_require={
+        "async": ["aiohttp"],
+        "fast": ["orjson"],
+    },
     python_requires=">=3.6",
     entry_points=dict(
         console_scripts=[
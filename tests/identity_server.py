@@ -0,0 +1,175 @@
+"""
+A local stand-in for the Intuit identity service and the Mint overview page,
+for testing mintapi.httplogin offline.
+
+IdentityServer walks a client through the same steps as the browser sign in:
+identifier, password, multifactor authentication (a soft token checked with
+oathtool, or a code "sent" by e-mail or text message, kept in sent_codes),
+account selection when the user has several Intuit accounts, and finally the
+overview page, which sets a Mint session cookie and embeds the API key.
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+import uuid
+
+import oathtool
+
+from tests.mint_server import API_KEY
+
+EMAIL = "user@example.com"
+PASSWORD = "correct horse"
+MFA_SECRET = "JBSWY3DPEHPK3PXP"
+SENT_CODE = "424242"
+SESSION_COOKIE = "ius_session"
+MINT_COOKIE = "mint_session"
+
+
+def current_codes(secret, clock=time.time):
+    """The soft-token codes accepted now: this period's and the last."""
+    period = int(clock()) // 30
+    return {oathtool.generate_otp(secret, period - i) for i in range(2)}
+
+
+class IdentityServer(object):
+    def __init__(
+        self,
+        accounts=("Personal", "Business"),
+        mfa_methods=("soft-token", "email"),
+        host="127.0.0.1",
+        port=0,
+    ):
+        self.accounts = [
+            {"id": "acct_{}".format(i), "name": name} for i, name in enumerate(accounts)
+        ]
+        self.mfa_methods = list(mfa_methods)
+        self.requests = []
+        self.sent_codes = []
+        self.selected_account = None
+        self._contexts = {}
+        self._sessions = set()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        return "http://{}:{}".format(*self.httpd.server_address[:2])
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def step(self, path, body):
+        """Returns (status, response body, cookies to set) for a sign in step."""
+        if path == "/v2/signin/identifier":
+            if body.get("identifier") != EMAIL:
+                return 404, {"message": "Unknown user"}, {}
+            context = uuid.uuid4().hex
+            self._contexts[context] = "PASSWORD"
+            return 200, {"authContext": context, "next": "PASSWORD"}, {}
+
+        context = body.get("authContext")
+        state = self._contexts.get(context)
+        if state is None:
+            return 403, {"message": "Invalid authContext"}, {}
+        if path == "/v2/signin/password" and state == "PASSWORD":
+            if body.get("password") != PASSWORD:
+                return 401, {"message": "Wrong password"}, {}
+            return self.advance(context, "MFA")
+        if path == "/v2/signin/mfa/challenge" and state == "MFA":
+            self.sent_codes.append((body.get("method"), SENT_CODE))
+            return 200, {"authContext": context, "next": "MFA"}, {}
+        if path == "/v2/signin/mfa/verify" and state == "MFA":
+            if body.get("method") == "soft-token":
+                valid = current_codes(MFA_SECRET)
+            else:
+                valid = {code for _, code in self.sent_codes}
+            if body.get("code") not in valid:
+                return 401, {"message": "Wrong code"}, {}
+            if len(self.accounts) > 1:
+                return self.advance(context, "ACCOUNT_SELECTION")
+            return self.advance(context, "DONE")
+        if path == "/v2/signin/account" and state == "ACCOUNT_SELECTION":
+            ids = [account["id"] for account in self.accounts]
+            if body.get("accountId") not in ids:
+                return 404, {"message": "Unknown account"}, {}
+            self.selected_account = body["accountId"]
+            return self.advance(context, "DONE")
+        return 409, {"message": "Unexpected step {} in {}".format(path, state)}, {}
+
+    def advance(self, context, state):
+        self._contexts[context] = state
+        body = {"authContext": context, "next": state}
+        cookies = {}
+        if state == "MFA":
+            body["methods"] = self.mfa_methods
+        elif state == "ACCOUNT_SELECTION":
+            body["accounts"] = self.accounts
+        elif state == "DONE":
+            del self._contexts[context]
+            session = uuid.uuid4().hex
+            self._sessions.add(session)
+            body["redirectUrl"] = "/overview"
+            cookies[SESSION_COOKIE] = session
+        return 200, body, cookies
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def send_body(self, status, body, content_type, cookies=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (cookies or {}).items():
+                    self.send_header("Set-Cookie", "{}={}; Path=/".format(name, value))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def cookies(self):
+                cookies = {}
+                for part in self.headers.get("Cookie", "").split(";"):
+                    name, _, value = part.strip().partition("=")
+                    cookies[name] = value
+                return cookies
+
+            def do_POST(self):
+                server.requests.append(("POST", self.path))
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    body = {}
+                status, data, cookies = server.step(self.path, body)
+                self.send_body(
+                    status, json.dumps(data).encode(), "application/json", cookies
+                )
+
+            def do_GET(self):
+                server.requests.append(("GET", self.path))
+                if self.path.split("?")[0] != "/overview":
+                    return self.send_body(404, b"", "text/html")
+                if self.cookies().get(SESSION_COOKIE) not in server._sessions:
+                    return self.send_body(401, b"", "text/html")
+                page = (
+                    "<html><script>window.__shellInternal = {{appExperience: "
+                    '{{"appApiKey": "{}"}}}};</script></html>'.format(API_KEY)
+                )
+                self.send_body(
+                    200, page.encode(), "text/html", {MINT_COOKIE: uuid.uuid4().hex}
+                )
+
+        return Handler
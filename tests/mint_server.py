@@ -0,0 +1,410 @@
+"""
+A local stand-in for the Mint REST API, for offline tests and benchmarks.
+
+MintServer serves synthetic payloads for the /pfm/v1 endpoints, bills and
+the credit endpoints at a configurable scale and latency.  StubDriver takes
+the place of the selenium driver in a Mint instance and sends every request
+to the local server instead of mint.intuit.com / credit.finance.intuit.com;
+StubTransport does the same for a thread-safe Mint.
+"""
+
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import calendar
+import gzip
+import hashlib
+import json
+import random
+import threading
+import time
+
+import requests
+
+import mintapi
+from mintapi.transport import PooledTransport
+
+API_KEY = "stub-api-key"
+MONTHS = list(calendar.month_name)[1:]
+
+
+def _meta(kind, id, created=True):
+    meta = {
+        "lastUpdatedDate": "2022-03-25T00:11:08Z",
+        "link": [{"otherAttributes": {}, "href": "/v1/{}/{}".format(kind, id)}],
+    }
+    if created:
+        meta["createdDate"] = "2017-01-05T17:12:15Z"
+    return meta
+
+
+def generate_accounts(count, rng):
+    types = ["BankAccount", "CreditAccount", "InvestmentAccount", "LoanAccount"]
+    return [
+        {
+            "type": rng.choice(types),
+            "metaData": _meta("accounts", "acct_{}".format(i)),
+            "id": "acct_{}".format(i),
+            "name": "Account {}".format(i),
+            "currency": "USD",
+            "fiLoginId": "fi_{}".format(i % 5),
+            "fiLoginStatus": "OK",
+            "fiName": "Bank {}".format(i % 5),
+            "currentBalance": round(rng.uniform(-5000, 50000), 2),
+            "isActive": True,
+        }
+        for i in range(count)
+    ]
+
+
+def generate_categories(count, rng):
+    categories = []
+    for i in range(count):
+        category = {
+            "type": "Category",
+            "name": "Category {}".format(i),
+            "depth": 1 if i % 10 == 0 else 2,
+            "categoryType": "EXPENSE",
+            "metaData": _meta("categories", i, created=False),
+            "id": "cat_{}".format(i),
+        }
+        if i % 10:
+            category["parentId"] = "cat_{}".format(i - i % 10)
+        categories.append(category)
+    return categories
+
+
+def generate_transactions(count, rng, accounts=20, categories=100, pending=0.02):
+    start = date(2022, 3, 31)
+    transactions = []
+    for i in range(count):
+        day = (start - timedelta(days=i * 3650 // max(count, 1))).isoformat()
+        amount = round(rng.uniform(-500, 500), 2)
+        category = rng.randrange(categories)
+        transactions.append(
+            {
+                "type": "CashAndCreditTransaction",
+                "metaData": _meta("transactions", "txn_{}".format(i), created=False),
+                "id": "txn_{}".format(i),
+                "accountId": "acct_{}".format(i % accounts),
+                "accountRef": {
+                    "id": "acct_{}".format(i % accounts),
+                    "name": "Account {}".format(i % accounts),
+                    "type": "BankAccount",
+                    "hiddenFromPlanningAndTrends": False,
+                },
+                "date": day,
+                "description": "Merchant {}".format(rng.randrange(500)),
+                "category": {
+                    "id": "cat_{}".format(category),
+                    "name": "Category {}".format(category),
+                    "categoryType": "EXPENSE",
+                    "parentId": "cat_{}".format(category - category % 10),
+                    "parentName": "Category {}".format(category - category % 10),
+                },
+                "amount": amount,
+                "status": "POSTED",
+                "matchState": "NOT_MATCHED",
+                "fiData": {
+                    "id": "fi_{}".format(i),
+                    "date": day,
+                    "amount": amount,
+                    "description": "MERCHANT {}".format(i % 500),
+                },
+                "etag": "etag_{}".format(i),
+                "isExpense": amount < 0,
+                "isPending": rng.random() < pending,
+                "discretionaryType": "NONE",
+                "isLinkedToRule": False,
+                "transactionReviewState": "NOT_APPLICABLE",
+            }
+        )
+    return transactions
+
+
+def generate_budgets(count, rng):
+    return [
+        {
+            "type": "MonthlyBudget",
+            "metaData": _meta("budgets", "budget_{}".format(i)),
+            "id": "budget_{}".format(i),
+            "budgetDate": "2022-{:02d}-01".format(i % 12 + 1),
+            "amount": round(rng.uniform(0, 500), 2),
+            "budgetAmount": round(rng.uniform(0, 500), 2),
+            "category": {
+                "id": "cat_{}".format(i % 100),
+                "name": "Category {}".format(i % 100),
+                "categoryType": "EXPENSE",
+            },
+        }
+        for i in range(count)
+    ]
+
+
+def generate_investments(count, rng):
+    return [
+        {
+            "accountId": "acct_{}".format(i % 3),
+            "description": "SECURITY {}".format(i),
+            "holdingType": "STOCK",
+            "currentQuantity": round(rng.uniform(0, 100), 3),
+            "currentPrice": round(rng.uniform(1, 500), 2),
+            "currentValue": round(rng.uniform(0, 50000), 2),
+            "id": "holding_{}".format(i),
+            "metaData": _meta("investments", i, created=False),
+        }
+        for i in range(count)
+    ]
+
+
+def generate_utilization(tradelines, years, rng):
+    def history(name=None):
+        data = {
+            "creditUtilization": [
+                {
+                    "year": str(2022 - y),
+                    "months": [
+                        {"name": month, "creditUtilization": rng.randrange(100)}
+                        for month in MONTHS
+                    ],
+                }
+                for y in range(years)
+            ]
+        }
+        if name is not None:
+            data["creditorName"] = name
+        return data
+
+    return {
+        "cumulative": history(),
+        "tradelines": [history("Creditor {}".format(i)) for i in range(tradelines)],
+    }
+
+
+class MintServer(object):
+    """
+    Serves synthetic Mint payloads from a background thread.  `scale` is the
+    number of transactions; the other endpoints are sized in proportion.
+    `latency` seconds are added to every response.  Responses carry an ETag
+    and are gzipped when the client accepts it and `compress` is set.  Like
+    Mint, transactions are narrowed to one account by a non-zero `id`.
+    """
+
+    def __init__(
+        self,
+        scale=1000,
+        latency=0.0,
+        seed=0,
+        compress=True,
+        host="127.0.0.1",
+        port=0,
+    ):
+        self.scale = scale
+        self.latency = latency
+        self.seed = seed
+        self.compress = compress
+        self.requests = []
+        self._payloads = {}
+        self._lock = threading.RLock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        return "http://{}:{}".format(*self.httpd.server_address[:2])
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def payload(self, path, limit=None, compressed=False, account=None):
+        """
+        Returns the encoded body for `path` with at most `limit` records (of
+        `account`, when given), generating it on first use.
+        """
+        with self._lock:
+            key = (path, limit, compressed, account)
+            if key not in self._payloads:
+                if compressed:
+                    data = self.payload(path, limit, account=account)
+                    if data is not None:
+                        data = gzip.compress(data)
+                else:
+                    data = self.generate(path, limit, account)
+                    if data is not None:
+                        data = json.dumps(data).encode()
+                self._payloads[key] = data
+            return self._payloads[key]
+
+    def etag(self, path, limit=None, account=None):
+        body = self.payload(path, limit, account=account)
+        return '"{}"'.format(hashlib.sha1(body).hexdigest()) if body else None
+
+    def change(self, path):
+        """Regenerates `path` with a new seed, as if its data had changed."""
+        with self._lock:
+            self.seed += 1
+            for key in [key for key in self._payloads if key[0] == path]:
+                del self._payloads[key]
+
+    def generate(self, path, limit=None, account=None):
+        rng = random.Random("{}:{}".format(self.seed, path))
+
+        def size(count):
+            return count if limit is None else min(count, limit)
+
+        def transactions():
+            if account is None:
+                return generate_transactions(size(self.scale), rng)
+            # The limit applies to the account's transactions
+            matching = [
+                transaction
+                for transaction in generate_transactions(self.scale, rng)
+                if transaction["accountId"] == account
+            ]
+            return matching[:limit]
+
+        records = {
+            "/pfm/v1/accounts": lambda: {
+                "Account": generate_accounts(size(max(5, self.scale // 500)), rng)
+            },
+            "/pfm/v1/categories": lambda: {
+                "Category": generate_categories(size(100), rng)
+            },
+            "/pfm/v1/budgets": lambda: {
+                "Budget": generate_budgets(size(max(12, self.scale // 50)), rng)
+            },
+            "/pfm/v1/investments": lambda: {
+                "Investment": generate_investments(size(max(5, self.scale // 200)), rng)
+            },
+            "/pfm/v1/transactions": lambda: {"Transaction": transactions()},
+            "/bps/v2/payer/bills": lambda: {"bills": []},
+            "/v1/creditreports": lambda: {
+                "vendorReports": [{"creditReportList": [{"creditScore": 800}]}]
+            },
+            "/v1/creditreports/0/inquiries": lambda: {"inquiries": []},
+            "/v1/creditreports/0/tradelines": lambda: {"tradelines": []},
+            "/v1/creditreports/creditutilizationhistory": lambda: (
+                generate_utilization(max(1, self.scale // 1000), 10, rng)
+            ),
+        }
+        generator = records.get(path)
+        return generator() if generator else None
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def send_body(self, status, body, headers=None):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def handle_request(self):
+                url = urlparse(self.path)
+                server.requests.append((self.command, url.path, dict(self.headers)))
+                if server.latency:
+                    time.sleep(server.latency)
+                if API_KEY not in self.headers.get("authorization", ""):
+                    return self.send_body(401, b'{"error": "unauthorized"}')
+                query = parse_qs(url.query)
+                limit = int(query["limit"][0]) if "limit" in query else None
+                # Mint sends id=0 for all accounts
+                account = query.get("id", ["0"])[0]
+                account = None if account == "0" else account
+                etag = server.etag(url.path, limit, account)
+                if etag is None:
+                    return self.send_body(404, b'{"error": "not found"}')
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                headers = {"ETag": etag}
+                compressed = server.compress and "gzip" in self.headers.get(
+                    "Accept-Encoding", ""
+                )
+                if compressed:
+                    headers["Content-Encoding"] = "gzip"
+                body = server.payload(url.path, limit, compressed, account)
+                self.send_body(200, body, headers)
+
+            do_GET = handle_request
+            do_POST = handle_request
+
+        return Handler
+
+
+def local_url(base_url, url):
+    parsed = urlparse(url)
+    return base_url + parsed.path + ("?" + parsed.query if parsed.query else "")
+
+
+class StubTransport(PooledTransport):
+    """A PooledTransport whose requests all go to the local server."""
+
+    def __init__(self, base_url, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url
+
+    def request(self, method, url, **kwargs):
+        return super().request(method, local_url(self.base_url, url), **kwargs)
+
+
+class StubDriver(object):
+    """
+    Just enough of a seleniumrequests driver for Mint to run against a
+    MintServer.  Requests to the Mint and credit hosts are redirected to the
+    local server.
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.session = requests.Session()
+        self.current_url = base_url
+
+    def request(self, method, url, **kwargs):
+        return self.session.request(method, local_url(self.base_url, url), **kwargs)
+
+    def execute_script(self, script):
+        return API_KEY
+
+    def get(self, url):
+        self.current_url = url
+
+    def get_cookies(self):
+        return []
+
+    def quit(self):
+        self.session.close()
+
+
+def stub_mint(server, **kwargs):
+    """Returns a Mint whose requests all go to `server`."""
+    if kwargs.pop("thread_safe", False):
+        kwargs["transport"] = StubTransport(server.url)
+    mint = mintapi.Mint(**kwargs)
+    mint.driver = StubDriver(server.url)
+    return mint
@@ -1,12 +1,39 @@
+import mintapi.aio
 import mintapi.api
+import mintapi.batch
+import mintapi.budgets
+import mintapi.cdc
 import mintapi.cli
+import mintapi.codec
+import mintapi.fx
+import mintapi.holdings
+import mintapi.imapwatch
+import mintapi.index
+import mintapi.jsonstream
+import mintapi.metrics
+import mintapi.partitions
+import mintapi.profiles
+import mintapi.recurring
+import mintapi.scheduler
 import mintapi.signIn
+import mintapi.startup
+import mintapi.sync
+import mintapi.throttle
+import mintapi.transport
+import asyncio
+import copy
+import datetime
+import email.utils
+import io
 import json
+import os
 import unittest
 import requests
 import tempfile
+import threading
 from mintapi import constants
-from unittest.mock import patch, DEFAULT
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock, patch, DEFAULT
 
 
 accounts_example = {
@@ -322,7 +349,7 @@ class MintApiTests(unittest.TestCase):
 
     @patch.object(mintapi.Mint, "_Mint__call_mint_endpoint")
     def test_get_account_data(self, mock_call_accounts_endpoint):
-        mock_call_accounts_endpoint.return_value = accounts_example
+        mock_call_accounts_endpoint.return_value = copy.deepcopy(accounts_example)
         account_data = mintapi.Mint().get_account_data()[0]
         self.assertFalse("metaData" in account_data)
         self.assertTrue("createdDate" in account_data)
@@ -330,7 +357,9 @@ class MintApiTests(unittest.TestCase):
 
     @patch.object(mintapi.Mint, "_Mint__call_mint_endpoint")
     def test_get_transaction_data(self, mock_call_transactions_endpoint):
-        mock_call_transactions_endpoint.return_value = transactions_example
+        mock_call_transactions_endpoint.return_value = copy.deepcopy(
+            transactions_example
+        )
         transaction_data = mintapi.Mint().get_transaction_data()[0]
         self.assertFalse("metaData" in transaction_data)
         self.assertFalse("createdDate" in transaction_data)
@@ -340,7 +369,7 @@ class MintApiTests(unittest.TestCase):
 
     @patch.object(mintapi.Mint, "_Mint__call_mint_endpoint")
     def test_get_investment_data(self, mock_call_investments_endpoint):
-        mock_call_investments_endpoint.return_value = investments_example
+        mock_call_investments_endpoint.return_value = copy.deepcopy(investments_example)
         investment_data = mintapi.Mint().get_investment_data()[0]
         self.assertFalse("metaData" in investment_data)
         self.assertFalse("createdDate" in investment_data)
@@ -348,12 +377,27 @@ class MintApiTests(unittest.TestCase):
 
     @patch.object(mintapi.Mint, "_Mint__call_mint_endpoint")
     def test_get_budgets(self, mock_call_budgets_endpoint):
-        mock_call_budgets_endpoint.return_value = budgets_example
+        mock_call_budgets_endpoint.return_value = copy.deepcopy(budgets_example)
         budgets = mintapi.Mint().get_budgets()[0]
         self.assertFalse("metaData" in budgets)
         self.assertTrue("createdDate" in budgets)
         self.assertTrue("lastUpdatedDate" in budgets)
 
+    @patch.object(mintapi.Mint, "_Mint__call_mint_endpoint")
+    def test_get_budget_history(self, mock_call_budgets_endpoint):
+        mock_call_budgets_endpoint.side_effect = lambda *args: copy.deepcopy(
+            budgets_example
+        )
+        mint = mintapi.Mint()
+        self.assertEqual(len(mint.get_budgets(hist=3)), 3)
+        self.assertEqual(mock_call_budgets_endpoint.call_count, 3)
+        start_dates = sorted(c[0][3] for c in mock_call_budgets_endpoint.call_args_list)
+        self.assertEqual(start_dates[-1], mintapi.api.first_of_this_month())
+
+        # Closed months are not fetched again
+        self.assertEqual(len(mint.get_budgets(hist=3)), 3)
+        self.assertEqual(mock_call_budgets_endpoint.call_count, 4)
+
     def test_format_filename(self):
         config_file = write_transactions_file()
         arguments = parse_arguments_file(config_file)
@@ -372,6 +416,991 @@ class MintApiTests(unittest.TestCase):
         filename = mintapi.cli.format_filename(arguments, None)
         self.assertEqual(filename, None)
 
+    @patch.object(mintapi.batch, "fetch_account")
+    def test_batch_isolates_failures(self, mock_fetch_account):
+        def fetch(entry, types, options):
+            if entry["email"] == "bad@example.com":
+                raise RuntimeError("login failed")
+            return {constants.ACCOUNT_KEY: [{"id": entry["email"]}]}
+
+        mock_fetch_account.side_effect = fetch
+        manifest = [
+            {"email": "good@example.com", "password": "a"},
+            {"email": "bad@example.com", "password": "b"},
+        ]
+        with patch.object(mintapi.batch, "RETRY_BACKOFF_SECONDS", 0):
+            results = mintapi.batch.run_batch(
+                manifest,
+                [constants.ACCOUNT_KEY],
+                pool_size=2,
+                retries=2,
+                executor_class=ThreadPoolExecutor,
+                use_chromedriver_on_path=True,
+            )
+        self.assertEqual(results[0]["status"], mintapi.batch.STATUS_OK)
+        self.assertEqual(results[1]["status"], mintapi.batch.STATUS_ERROR)
+        self.assertEqual(results[1]["attempts"], 3)
+
+        aggregated = mintapi.batch.aggregate_results(results, [constants.ACCOUNT_KEY])
+        self.assertEqual(
+            aggregated[constants.ACCOUNT_KEY],
+            [{"id": "good@example.com", "email": "good@example.com"}],
+        )
+
+    @patch.object(mintapi.batch, "fetch_account")
+    @patch.object(mintapi.batch.getpass, "getpass", return_value="prompted")
+    @patch.object(mintapi.batch.keyring, "get_password")
+    def test_batch_looks_up_missing_passwords(
+        self, mock_get_password, mock_getpass, mock_fetch_account
+    ):
+        mock_get_password.side_effect = lambda type, email: (
+            "kept" if email == "kept@example.com" else None
+        )
+        mock_fetch_account.side_effect = lambda entry, types, options: {
+            constants.ACCOUNT_KEY: [{"password": entry["password"]}]
+        }
+        manifest = [
+            {"email": "given@example.com", "password": "given"},
+            {"email": "kept@example.com"},
+            {"email": "prompted@example.com"},
+        ]
+        results = mintapi.batch.run_batch(
+            manifest,
+            [constants.ACCOUNT_KEY],
+            executor_class=ThreadPoolExecutor,
+            use_chromedriver_on_path=True,
+        )
+        self.assertEqual(
+            [
+                result["data"][constants.ACCOUNT_KEY][0]["password"]
+                for result in results
+            ],
+            ["given", "kept", "prompted"],
+        )
+        mock_getpass.assert_called_once_with("Mint password for prompted@example.com: ")
+
+    @unittest.skipIf(mintapi.aio.aiohttp is None, "aiohttp is not installed")
+    def test_async_get_transaction_data(self):
+        # A coroutine stub rather than AsyncMock, which needs Python 3.8
+        urls = []
+
+        async def get_api_json(url, *args, **kwargs):
+            urls.append(url)
+            return copy.deepcopy(transactions_example)
+
+        async def fetch():
+            async with mintapi.AsyncMint("key") as mint:
+                with patch.object(mint, "_get_api_json", get_api_json):
+                    data = await mint.get_transaction_data()
+            return data, urls[0]
+
+        data, url = asyncio.run(fetch())
+        self.assertTrue(url.startswith(mintapi.api.MINT_ROOT_URL))
+        self.assertFalse("metaData" in data[0])
+        self.assertTrue("lastUpdatedDate" in data[0])
+
+    @unittest.skipIf(mintapi.aio.aiohttp is None, "aiohttp is not installed")
+    def test_async_mint_keeps_cookie_domains(self):
+        # Signed in over HTTP, so the cookies come from the transport
+        mint = mintapi.Mint(transport=mintapi.transport.PooledTransport())
+        mint.transport.update_cookies(
+            [
+                {"name": "shared", "value": "1", "domain": ".intuit.com"},
+                {"name": "mint", "value": "2", "domain": "mint.intuit.com"},
+                {"name": "other", "value": "3", "domain": "accounts.intuit.com"},
+            ]
+        )
+        mint._get_api_key = lambda: "key"
+
+        async def cookies():
+            async with mintapi.AsyncMint.from_mint(mint) as async_mint:
+                jar = async_mint.session.cookie_jar
+                return [
+                    sorted(jar.filter_cookies(mintapi.aio.URL(url)))
+                    for url in [
+                        "https://mint.intuit.com/pfm/v1/transactions",
+                        "https://credit.finance.intuit.com/",
+                    ]
+                ]
+
+        self.assertEqual(asyncio.run(cookies()), [["mint", "shared"], ["shared"]])
+
+    def test_request_scheduler_retries_throttled_requests(self):
+        throttled = Mock(status_code=429, headers={"Retry-After": "3"})
+        ok = Mock(status_code=200, headers={})
+        send = Mock(side_effect=[throttled, ok])
+        sleep = Mock()
+        scheduler = mintapi.throttle.RequestScheduler(sleep=sleep)
+        response = scheduler.request(send, "GET", "https://mint.intuit.com")
+        self.assertIs(response, ok)
+        self.assertEqual(send.call_count, 2)
+        self.assertEqual(send.call_args[1]["timeout"], scheduler.timeout)
+        sleep.assert_called_with(3.0)
+        throttled.close.assert_called_once_with()
+        self.assertLess(scheduler.bucket.rate, scheduler.bucket.max_rate)
+
+        # POSTs may have taken effect, so they are only retried on request
+        send = Mock(side_effect=[throttled, ok])
+        response = scheduler.request(send, "POST", "https://mint.intuit.com")
+        self.assertIs(response, throttled)
+        send = Mock(side_effect=[throttled, ok])
+        response = scheduler.request(
+            send, "POST", "https://mint.intuit.com", retry=True
+        )
+        self.assertIs(response, ok)
+        self.assertNotIn("retry", send.call_args[1])
+
+    def test_request_scheduler_opens_circuit(self):
+        send = Mock(return_value=Mock(status_code=503, headers={}))
+        scheduler = mintapi.throttle.RequestScheduler(
+            max_retries=1,
+            circuit_breaker=mintapi.throttle.CircuitBreaker(failure_threshold=2),
+            sleep=Mock(),
+        )
+        with self.assertRaises(mintapi.throttle.RetriesExhaustedError):
+            scheduler.request(send, "GET", "https://mint.intuit.com")
+        with self.assertRaises(mintapi.throttle.CircuitOpenError):
+            scheduler.request(send, "GET", "https://mint.intuit.com")
+        self.assertEqual(send.call_count, 2)
+
+    @patch.object(mintapi.Mint, "_Mint__call_mint_endpoint")
+    def test_instrumentation_records_fetch(self, mock_call_accounts_endpoint):
+        mock_call_accounts_endpoint.return_value = copy.deepcopy(accounts_example)
+        exporter = mintapi.metrics.PrometheusExporter()
+        mint = mintapi.Mint(instrumentation=mintapi.metrics.Instrumentation([exporter]))
+        mint.get_account_data()
+        stats = exporter.series[(mintapi.metrics.PHASE_FETCH, "accounts")]
+        self.assertEqual(stats["count"], 1)
+        self.assertEqual(stats["records"], 1)
+        self.assertIn(
+            'mintapi_phase_records_total{endpoint="accounts",phase="fetch"} 1',
+            exporter.render(),
+        )
+
+    def test_jsonstream_iter_array(self):
+        body = json.dumps(
+            {"metaData": {"n": [1, 2]}, "Transaction": [{"id": "é"}, 12345, []]}
+        ).encode()
+        for size in [1, 3, len(body)]:
+            chunks = [body[i : i + size] for i in range(0, len(body), size)]
+            self.assertEqual(
+                list(mintapi.jsonstream.iter_array(chunks, "Transaction")),
+                [{"id": "é"}, 12345, []],
+            )
+        with self.assertRaises(mintapi.jsonstream.KeyNotFoundError):
+            list(mintapi.jsonstream.iter_array([body], "Account"))
+
+    def test_write_json_stream(self):
+        records = [{"id": 1, "tags": ["a"]}, {"id": 2}]
+        with tempfile.TemporaryFile(mode="w+") as f:
+            mintapi.cli.write_json_stream(iter(records), f)
+            f.seek(0)
+            self.assertEqual(json.load(f), records)
+
+    def test_codecs_round_trip(self):
+        data = copy.deepcopy(transactions_example)
+        data["Transaction"][0]["description"] = "Café"
+        for name, codec in mintapi.codec.CODECS.items():
+            for compact in [False, True]:
+                encoded = codec.dumps(data, compact)
+                self.assertEqual(compact, "\n" not in encoded, name)
+                self.assertEqual(json.loads(encoded), data, name)
+                self.assertEqual(codec.loads(encoded.encode()), data, name)
+        with self.assertRaises(ValueError):
+            mintapi.codec.set_codec("missing")
+
+    def test_transaction_index_query(self):
+        transactions = []
+        for i, (day, amount, account) in enumerate(
+            [
+                ("2022-03-01", -5.0, "Checking"),
+                ("2022-03-15", -50.0, "Credit"),
+                ("2022-04-02", 420.0, "Checking"),
+                ("2022-04-20", -12.5, "Checking"),
+            ]
+        ):
+            transaction = copy.deepcopy(transactions_example["Transaction"][0])
+            transaction.update(id=str(i), date=day, amount=amount)
+            transaction["accountRef"]["name"] = account
+            transactions.append(transaction)
+        index = mintapi.index.TransactionIndex(reversed(transactions))
+
+        self.assertIs(index.get("2"), transactions[2])
+        self.assertIsNone(index.get("missing"))
+        self.assertEqual(
+            index.query(account="checking", end_date="2022-04-02"),
+            [transactions[0], transactions[2]],
+        )
+        self.assertEqual(
+            index.query(start_date=datetime.date(2022, 3, 2), max_amount=0),
+            [transactions[1], transactions[3]],
+        )
+        self.assertEqual(index.query(category="Income", limit=1), [transactions[0]])
+        self.assertEqual(index.query(merchant="nobody"), [])
+
+        # Found by account, but without the date or amount a bound is on
+        undated = copy.deepcopy(transactions[0])
+        undated.update(id="undated", date=None)
+        unpriced = copy.deepcopy(transactions[0])
+        unpriced["id"] = "unpriced"
+        del unpriced["amount"]
+        for transaction in (undated, unpriced):
+            transaction["accountRef"]["name"] = "Savings"
+        index = mintapi.index.TransactionIndex(transactions + [undated, unpriced])
+        self.assertEqual(
+            index.query(account="savings", end_date="2022-04-30"), [unpriced]
+        )
+        self.assertEqual(index.query(account="savings", max_amount=0), [undated])
+        self.assertEqual(
+            index.query(account="savings", start_date="2022-03-01", min_amount=-10),
+            [],
+        )
+
+    @patch.object(mintapi.Mint, "_Mint__call_mint_endpoint")
+    def test_category_tree_rollup(self, mock_call_categories_endpoint):
+        categories = copy.deepcopy(category_example)
+        movies = copy.deepcopy(category_example[1])
+        movies.update(id="movies", name="Movies", depth=3, parentId="10740790_1405")
+        categories.append(movies)
+        mock_call_categories_endpoint.return_value = {"Category": categories}
+        mint = mintapi.Mint()
+        tree = mint.get_category_tree()
+        self.assertIs(mint.get_category_tree(), tree)
+        self.assertEqual(mock_call_categories_endpoint.call_count, 1)
+        self.assertEqual(tree.ancestors("movies"), ("10740790_14", "10740790_1405"))
+        self.assertEqual(
+            tree.path_names("10740790_1405"), ["Entertainment", "Auto Insurance"]
+        )
+
+        transactions = [
+            {"date": "2022-03-02", "amount": -10.0, "category": {"id": "movies"}},
+            {"date": "2022-03-20", "amount": -5.0, "category": {"id": "10740790_1405"}},
+            {"date": "2022-04-01", "amount": -2.0, "category": {"id": "10740790_14"}},
+            {"date": "2022-04-01", "amount": 100.0, "category": {"id": "other"}},
+        ]
+        self.assertEqual(
+            tree.rollup(transactions),
+            {
+                "movies": -10.0,
+                "10740790_1405": -15.0,
+                "10740790_14": -17.0,
+                "other": 100.0,
+            },
+        )
+        self.assertEqual(
+            tree.rollup(transactions, by_month=True, depth=1),
+            {
+                "10740790_14": {"2022-03": -15.0, "2022-04": -2.0},
+                "other": {"2022-04": 100.0},
+            },
+        )
+
+    def test_sync_controller_tracks_institutions(self):
+        def account(id, fi_login_id, status, updated):
+            return {
+                "id": id,
+                "fiLoginId": fi_login_id,
+                "fiLoginStatus": status,
+                "lastUpdatedDate": updated,
+            }
+
+        before, after = "2022-03-27T15:59:00Z", "2022-03-27T16:05:00Z"
+        mint = Mock()
+        mint.get_account_data.side_effect = [
+            [
+                account("1", "fast", "OK", after),
+                account("2", "slow", "REFRESHING", before),
+                account("4", "slow", "REFRESHING", before),
+                account("3", "broken", "FAILED_LOGIN", before),
+            ],
+            # Not done until every account of the institution is
+            [
+                account("1", "fast", "OK", after),
+                account("2", "slow", "OK", after),
+                account("4", "slow", "REFRESHING", after),
+                account("3", "broken", "FAILED_LOGIN", before),
+            ],
+            [
+                account("1", "fast", "OK", after),
+                account("2", "slow", "OK", after),
+                account("4", "slow", "OK", after),
+                account("3", "broken", "FAILED_LOGIN", before),
+            ],
+        ]
+        started = datetime.datetime(2022, 3, 27, 16, tzinfo=datetime.timezone.utc)
+        controller = mintapi.sync.SyncController(
+            mint, poll_interval=0, clock=lambda: started.timestamp()
+        )
+        finished = []
+        controller.add_done_callback(
+            lambda status: finished.append(status["fiLoginId"])
+        )
+        slow = controller.institution("slow")
+
+        status = controller.start().wait(5)
+        mint.initiate_account_refresh.assert_called_once_with()
+        self.assertEqual(finished, ["fast", "broken", "slow"])
+        self.assertEqual(slow.result(0)["accountIds"], ["2", "4"])
+        self.assertEqual(mint.get_account_data.call_count, 3)
+        self.assertFalse(status["broken"]["fresh"])
+        self.assertEqual(controller.fresh_account_ids(), ["1", "2", "4"])
+        mint = mintapi.Mint()
+        mint.status_message = mintapi.sync.status_message(status)
+        self.assertEqual(mint.get_attention(), "1 institution needs attention")
+
+    def test_change_capture(self):
+        transactions = [
+            {"id": str(i), "date": "2022-03-0{}".format(i), "amount": -i}
+            for i in range(1, 5)
+        ]
+        with tempfile.TemporaryDirectory() as state:
+            path = os.path.join(state, "fingerprints.json")
+            counts = mintapi.cdc.ChangeCapture(
+                mintapi.cdc.FingerprintStore(path), lambda event: None
+            ).process(transactions)
+            self.assertEqual(counts["insert"], 4)
+
+            changed = copy.deepcopy(transactions[1:])
+            changed[0]["amount"] = -20
+            changed[1]["lastUpdatedDate"] = "2022-03-27T16:46:41Z"
+            changed.append({"id": "5", "date": "2022-03-05", "amount": -5})
+            output = io.StringIO()
+            mintapi.cdc.ChangeCapture(
+                mintapi.cdc.FingerprintStore(path), mintapi.cdc.NDJSONSink(output)
+            ).process(changed, start_date="2022-03-02")
+            self.assertEqual(
+                [
+                    (event["op"], event["id"])
+                    for event in map(json.loads, output.getvalue().splitlines())
+                ],
+                [("update", "2"), ("insert", "5")],
+            )
+
+            # 1 was outside the range fetched last time, so it is still known
+            output = io.StringIO()
+            mintapi.cdc.ChangeCapture(
+                mintapi.cdc.FingerprintStore(path), mintapi.cdc.NDJSONSink(output)
+            ).process(changed[:2])
+            self.assertEqual(
+                sorted(
+                    json.loads(line)["id"] for line in output.getvalue().splitlines()
+                ),
+                ["1", "4", "5"],
+            )
+
+    def test_change_capture_counts_filtered_records_towards_limit(self):
+        transactions = [
+            {"id": str(i), "date": "2022-03-0{}".format(i), "isPending": False}
+            for i in range(1, 6)
+        ]
+        store = mintapi.cdc.FingerprintStore()
+        mintapi.cdc.ChangeCapture(store, lambda event: None).process(transactions)
+
+        # The three newest, one of them pending: cut short at the limit, so
+        # the two older transactions are not reported as deleted
+        recent = copy.deepcopy(transactions[2:])
+        recent[-1]["isPending"] = True
+        events = []
+        counts = mintapi.cdc.ChangeCapture(store, events.append).process(
+            recent, limit=3, where=mintapi.api.is_posted
+        )
+        self.assertEqual(counts, {"insert": 0, "update": 0, "delete": 1})
+        self.assertEqual(events, [{"op": "delete", "id": "5", "record": None}])
+        self.assertEqual(sorted(store.entries), ["1", "2", "3", "4"])
+
+    def test_scheduler_skips_overlapping_runs(self):
+        now = [0]
+        daemon = mintapi.scheduler.Scheduler(jitter=0.1, clock=lambda: now[0])
+        release = threading.Event()
+        slow = daemon.add_job("slow", 100, lambda: release.wait(5))
+        fast = daemon.add_job("fast", 10, lambda: None)
+        self.assertEqual(daemon.run_pending(), [slow, fast])
+        fast.future.result(5)
+        self.assertTrue(9 <= fast.next_run <= 11)
+
+        now[0] = 200
+        self.assertEqual(daemon.run_pending(), [fast])
+        self.assertEqual(slow.skipped, 1)
+        release.set()
+        daemon.stop()
+        daemon.run_forever()
+        self.assertEqual((slow.runs, fast.runs), (1, 2))
+
+    def test_refresh_policy_refreshes_stale_accounts(self):
+        mint = Mock()
+        mint.get_account_data.return_value = [
+            {"lastUpdatedDate": "2022-03-27T15:30:00Z", "fiLoginStatus": "OK"},
+            {"lastUpdatedDate": "2022-03-01T00:00:00Z", "fiLoginStatus": "FAILED"},
+        ]
+        now = datetime.datetime(2022, 3, 27, 16, tzinfo=datetime.timezone.utc)
+        policy = mintapi.scheduler.RefreshPolicy(
+            mint, max_age=3600, clock=lambda: now.timestamp()
+        )
+        self.assertFalse(policy())
+        now += datetime.timedelta(hours=1)
+        self.assertTrue(policy())
+        mint.start_account_sync.return_value.future.done.return_value = False
+        self.assertFalse(policy())
+        mint.start_account_sync.assert_called_once_with()
+
+    @patch.object(mintapi.api, "sign_in")
+    @patch.object(mintapi.startup, "launch_chrome")
+    @patch.object(mintapi.startup, "resolve_chrome_driver")
+    def test_startup_overlaps_driver_and_credentials(
+        self, mock_resolve, mock_launch, mock_sign_in
+    ):
+        # Mint is only loaded once the password is being fetched, and the
+        # password is only returned once Mint has loaded, so the two stages
+        # can only complete by running side by side
+        fetching, loaded = threading.Event(), threading.Event()
+
+        def load_mint(url):
+            self.assertTrue(fetching.wait(5))
+            loaded.set()
+
+        driver = Mock()
+        driver.get.side_effect = load_mint
+        mock_resolve.return_value = "/bin/chromedriver"
+        mock_launch.return_value = driver
+        instrumentation = mintapi.metrics.Instrumentation()
+        timeline = instrumentation.add_hook(mintapi.metrics.StartupTimeline())
+
+        future = mintapi.startup.start_web_driver(
+            headless=True, instrumentation=instrumentation
+        )
+        with instrumentation.timed(
+            mintapi.metrics.PHASE_STARTUP,
+            endpoint=mintapi.startup.STAGE_MINT_PASSWORD,
+        ):
+            fetching.set()  # e.g. waiting on the keyring
+            self.assertTrue(loaded.wait(5))
+        mint = mintapi.Mint(
+            "test", "test", driver=future, instrumentation=instrumentation
+        )
+
+        self.assertIs(mint.driver, driver)
+        driver.get.assert_called_once_with(mintapi.signIn.MINT_HOME_URL)
+        mock_launch.assert_called_once_with(True, None, "/bin/chromedriver")
+        self.assertIs(mock_sign_in.call_args[0][2], driver)
+        stages = {stage["stage"]: stage for stage in timeline.stages}
+        self.assertIn(mintapi.startup.STAGE_DRIVER_WAIT, stages)
+        preload, password = (
+            stages[mintapi.startup.STAGE_PRELOAD],
+            stages[mintapi.startup.STAGE_MINT_PASSWORD],
+        )
+        self.assertNotEqual(preload["thread"], password["thread"])
+        self.assertLess(password["start"], preload["end"])
+        self.assertLess(preload["start"], password["end"])
+        self.assertIn("if run one after the other", timeline.render())
+
+    @patch.object(mintapi.startup, "create_web_driver")
+    def test_discard_web_driver_quits_it(self, mock_create):
+        started, quit = threading.Event(), threading.Event()
+        driver = Mock()
+        driver.quit.side_effect = quit.set
+        mock_create.side_effect = lambda **kwargs: started.wait() and driver
+        mintapi.startup.discard_web_driver(mintapi.startup.start_web_driver())
+        started.set()
+        self.assertTrue(quit.wait(5))
+
+    def test_session_profile_prune_snapshot_clone(self):
+        def write(root, relative, size=10):
+            path = os.path.join(root, *relative.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(b"x" * size)
+            return path
+
+        with tempfile.TemporaryDirectory() as root:
+            session = os.path.join(root, "session")
+            template = os.path.join(root, "template")
+            clone = os.path.join(root, "clone")
+            write(session, "Default/Cache/Cache_Data/data_0", 1000)
+            write(session, "Default/Service Worker/CacheStorage/abc", 500)
+            write(session, "Default/Network/Cookies")
+            write(session, "Default/Local Storage/leveldb/000003.ldb")
+            write(session, "Default/Local Storage/leveldb/CURRENT")
+            write(session, "Default/History")
+            write(session, "Local State")
+            write(session, "SingletonLock")
+
+            self.assertEqual(mintapi.profiles.prune_profile(session), 1500)
+            self.assertFalse(os.path.exists(os.path.join(session, "Default", "Cache")))
+            self.assertTrue(os.path.exists(os.path.join(session, "Default", "History")))
+
+            mintapi.profiles.snapshot_profile(session, template)
+            mintapi.profiles.clone_profile(template, clone)
+            kept = sorted(
+                os.path.relpath(os.path.join(dir, name), clone).replace(os.sep, "/")
+                for dir, _, names in os.walk(clone)
+                for name in names
+            )
+            self.assertEqual(
+                kept,
+                [
+                    "Default/Local Storage/leveldb/000003.ldb",
+                    "Default/Local Storage/leveldb/CURRENT",
+                    "Default/Network/Cookies",
+                    "Local State",
+                ],
+            )
+
+            def inode(root, relative):
+                return os.stat(os.path.join(root, *relative.split("/"))).st_ino
+
+            table = "Default/Local Storage/leveldb/000003.ldb"
+            self.assertEqual(inode(template, table), inode(clone, table))
+            cookies = "Default/Network/Cookies"
+            self.assertNotEqual(inode(template, cookies), inode(clone, cookies))
+
+    @unittest.skipIf(mintapi.profiles.fcntl is None, "uses fcntl")
+    def test_profile_lock(self):
+        fcntl = mintapi.profiles.fcntl
+        with tempfile.TemporaryDirectory() as root:
+            session = os.path.join(root, "session")
+            with mintapi.profiles.ProfileLock(session):
+                # Re-entrant within the process
+                with mintapi.profiles.ProfileLock(session, timeout=0):
+                    pass
+            with open(session + mintapi.profiles.LOCK_SUFFIX) as other:
+                # As if held by another process
+                fcntl.flock(other.fileno(), fcntl.LOCK_EX)
+                with self.assertRaises(mintapi.profiles.ProfileLocked):
+                    mintapi.profiles.ProfileLock(session, timeout=0.2).acquire()
+                fcntl.flock(other.fileno(), fcntl.LOCK_UN)
+            mintapi.profiles.prepare_profile(session, timeout=0).release()
+
+    def test_shared_imap_watcher_routes_codes_by_recipient(self):
+        mailbox = FakeImapMailbox()
+        watcher = mintapi.imapwatch.MfaCodeWatcher(
+            "shared@example.com",
+            "password",
+            "imap.example.com",
+            poll_interval=0.01,
+            connect=mailbox.connect,
+        )
+        first = watcher.request("first@example.com")
+        second = watcher.request("Second@example.com")
+        mailbox.deliver("someone@example.com", "111111", sender="news@example.com")
+        mailbox.deliver("second@example.com", "222222")
+        mailbox.deliver("first@example.com", "333333")
+        self.assertEqual(first.result(5), "333333")
+        self.assertEqual(second.result(5), "222222")
+        # Addressed to someone else, so not handed to the only login waiting
+        mailbox.deliver("alias@example.com", "444444")
+        self.assertIsNone(watcher.wait_for_code("third@example.com", timeout=0.2))
+        # Rewritten to the shared mailbox by the forwarding
+        mailbox.deliver("shared@example.com", "555555")
+        self.assertEqual(
+            watcher.wait_for_code("third@example.com", timeout=5), "555555"
+        )
+
+        self.assertEqual(watcher.connections, 1)
+        self.assertEqual(mailbox.deleted, {2, 3, 5})
+        # Only new messages are fetched on each poll
+        self.assertEqual(sorted(mailbox.fetched), [2, 3, 4, 5])
+
+    def test_partitioned_export_rewrites_changed_months(self):
+        transactions = [
+            {"id": "t{}".format(i), "date": date, "amount": -i}
+            for i, date in enumerate(
+                ["2022-01-05", "2022-01-20", "2022-02-03", "2022-03-10", "2022-03-11"]
+            )
+        ]
+        with tempfile.TemporaryDirectory() as root:
+            export = mintapi.partitions.PartitionedExport(root)
+            self.assertEqual(
+                export.write(transactions),
+                {"written": 3, "unchanged": 0, "removed": 0},
+            )
+            march = os.path.join(root, "year=2022", "month=03", "part.json")
+            with open(march) as f:
+                self.assertEqual(json.load(f), transactions[3:])
+
+            # Reordered, or fetched with a limit, nothing changes
+            export = mintapi.partitions.PartitionedExport(root)
+            self.assertEqual(
+                export.write(transactions[::-1], limit=5),
+                {"written": 0, "unchanged": 3, "removed": 0},
+            )
+
+            changed = copy.deepcopy(transactions[2:])
+            changed[0]["amount"] = -100
+            modified = os.path.getmtime(march)
+            self.assertEqual(
+                export.write(changed, start_date="2022-01-01"),
+                {"written": 1, "unchanged": 1, "removed": 1},
+            )
+            self.assertEqual(os.path.getmtime(march), modified)
+            self.assertFalse(
+                os.path.exists(os.path.join(root, "year=2022", "month=01"))
+            )
+            self.assertEqual(
+                [p["key"] for p in export.partitions(start_date="2022-02-15")],
+                ["year=2022/month=03"],
+            )
+            self.assertEqual(
+                list(mintapi.partitions.PartitionedExport(root).read("2022-02-01")),
+                changed,
+            )
+
+    def test_partitioned_export_merges_partly_fetched_months(self):
+        march = [
+            {
+                "id": "m{}".format(day),
+                "date": "2022-03-{:02d}".format(day),
+                "amount": -day,
+            }
+            for day in range(1, 29)
+        ]
+        with tempfile.TemporaryDirectory() as root:
+            export = mintapi.partitions.PartitionedExport(root)
+            export.write(march)
+
+            # From the 15th: the first half of March is kept
+            changed = copy.deepcopy(march[14:])
+            changed[0]["amount"] = -100
+            del changed[-1]
+            self.assertEqual(
+                export.write(changed, start_date="2022-03-15"),
+                {"written": 1, "unchanged": 0, "removed": 0},
+            )
+            self.assertEqual(list(export.read()), march[:14] + changed)
+
+            # Cut short by the limit part way through the 20th, with pending
+            # transactions filtered out: nothing up to the 20th is dropped
+            recent = [r for r in changed if r["date"] >= "2022-03-20"]
+            self.assertEqual(
+                export.write(recent[2:], limit=len(recent), received=len(recent)),
+                {"written": 0, "unchanged": 1, "removed": 0},
+            )
+            self.assertEqual(len(list(export.read())), 27)
+
+    def test_recurring_charges_detected_incrementally(self):
+        def monthly(description, amount, months, day=3, prefix="m"):
+            return [
+                {
+                    "id": "{}{}".format(prefix, month),
+                    "date": "2022-{:02d}-{:02d}".format(month, day),
+                    "description": description,
+                    "amount": amount,
+                }
+                for month in months
+            ]
+
+        transactions = (
+            monthly("NETFLIX.COM 866-579-7172", -15.49, range(1, 6))
+            + monthly("SQ *Gym #0042", -40.0, range(1, 4), day=10, prefix="g")
+            # Two subscriptions billed by the same store
+            + monthly("Apple", -0.99, range(1, 5), day=15, prefix="a")
+            + monthly("Apple", -9.99, range(1, 5), day=20, prefix="b")
+            + [
+                {"id": "c1", "date": "2022-01-02", "description": "Cafe", "amount": -4},
+                {"id": "c2", "date": "2022-01-09", "description": "Cafe", "amount": -5},
+                {"id": "c3", "date": "2022-03-01", "description": "Cafe", "amount": -4},
+            ]
+        )
+        detector = mintapi.recurring.RecurringChargeDetector()
+        detector.add(transactions)
+        charges = detector.charges()
+        self.assertEqual(
+            [(c["merchant"], c["amount"], c["period"]) for c in charges],
+            [
+                ("apple", -9.99, "monthly"),
+                ("apple", -0.99, "monthly"),
+                ("gym", -40.0, "monthly"),
+                ("netflix", -15.49, "monthly"),
+            ],
+        )
+        self.assertEqual(charges[3]["next_date"], "2022-06-03")
+        self.assertFalse(charges[2]["active"])
+
+        # Only the gym's charges are evaluated again
+        with patch.object(detector, "_detect", wraps=detector._detect) as detect:
+            changed = detector.add(
+                monthly("Gym", -45.0, [4, 5], day=10, prefix="g") + transactions[:2]
+            )
+            charges = detector.charges()
+        self.assertEqual(changed, {"gym"})
+        self.assertEqual(detect.call_count, 1)
+        self.assertEqual(charges[2]["occurrences"], 5)
+        self.assertTrue(charges[2]["active"])
+
+        table = detector.table(
+            [
+                {"name": "Netflix", "amountDue": 15.49, "dueDate": "2022-06-03"},
+                {"name": "City Water", "amountDue": 30.0, "dueDate": "2022-06-15"},
+            ]
+        )
+        self.assertEqual(
+            [(row["merchant"], row["source"]) for row in table],
+            [
+                ("apple", "transactions"),
+                ("apple", "transactions"),
+                ("gym", "transactions"),
+                ("netflix", "both"),
+                ("city water", "bill"),
+            ],
+        )
+
+    def test_holdings_store_records_only_changes(self):
+        def holding(id, quantity, price, account="acct_1"):
+            return {
+                "id": id,
+                "accountId": account,
+                "description": id.upper(),
+                "currentQuantity": quantity,
+                "currentPrice": price,
+            }
+
+        with tempfile.TemporaryDirectory() as root:
+            store = mintapi.holdings.HoldingsStore(root)
+            self.assertEqual(
+                store.record(
+                    [holding("a", 10, 100.0), holding("b", 5, 20.0, "acct_2")],
+                    "2022-01-03",
+                ),
+                2,
+            )
+            # Nothing changed
+            self.assertEqual(
+                store.record(
+                    [holding("a", 10, 100.0), holding("b", 5, 20.0, "acct_2")],
+                    "2022-01-04",
+                ),
+                0,
+            )
+            # a's price moved, b was sold and c bought
+            self.assertEqual(
+                store.record(
+                    [holding("a", 10, 110.0), holding("c", 2, 50.0)], "2022-01-06"
+                ),
+                3,
+            )
+            with self.assertRaises(ValueError):
+                store.record([], "2022-01-05")
+
+            # An interrupted append is ignored
+            with open(os.path.join(root, "price.bin"), "ab") as f:
+                f.write(b"\0" * 8)
+            store = mintapi.holdings.HoldingsStore(root)
+            self.assertEqual(store.rows, 5)
+            self.assertEqual(
+                [(v["date"], v["value"]) for v in store.values("2022-01-04")],
+                [
+                    ("2022-01-04", 1100.0),
+                    ("2022-01-05", 1100.0),
+                    ("2022-01-06", 1200.0),
+                ],
+            )
+            self.assertEqual(
+                [v["value"] for v in store.values(accounts=["acct_2"])],
+                [100.0, 100.0, 100.0, 0.0],
+            )
+            self.assertEqual(
+                [(h["id"], h["value"]) for h in store.holdings("2022-01-05")],
+                [("a", 1000.0), ("b", 100.0)],
+            )
+            self.assertEqual(
+                [(h["id"], h["quantity"]) for h in store.holdings()],
+                [("a", 10.0), ("c", 2.0)],
+            )
+            self.assertEqual(
+                store.history("a", start_date="2022-01-04"),
+                [{"date": "2022-01-06", "quantity": 10.0, "price": 110.0}],
+            )
+            self.assertEqual(store.record([holding("c", 2, 50.0)], "2022-01-07"), 1)
+            self.assertEqual(len(store.history("a")), 3)
+
+    def test_budget_tracker_follows_hierarchy_and_changes(self):
+        tree = mintapi.CategoryTree(
+            [
+                {"id": "auto", "name": "Auto & Transport"},
+                {"id": "gas", "name": "Gas & Fuel", "parentId": "auto"},
+                {"id": "pay", "name": "Paycheck"},
+            ]
+        )
+
+        def budget(category, month, amount, type="EXPENSE"):
+            return {
+                "id": "{}_{}".format(category, month),
+                "budgetDate": "2022-{:02d}-01".format(month),
+                "budgetAmount": amount,
+                "category": {"id": category, "categoryType": type},
+            }
+
+        def transaction(id, category, date, amount):
+            return {
+                "id": id,
+                "date": date,
+                "amount": amount,
+                "category": {"id": category},
+            }
+
+        tracker = mintapi.budgets.BudgetTracker(
+            tree,
+            [
+                budget("auto", 3, 100.0),
+                budget("gas", 3, 50.0),
+                budget("pay", 3, 1000.0, "INCOME"),
+                budget("gas", 4, 50.0),
+            ],
+            [
+                transaction("t1", "auto", "2022-03-02", -30.0),
+                transaction("t2", "gas", "2022-03-05", -40.0),
+                transaction("t3", "gas", "2022-04-05", -10.0),
+                transaction("t4", "pay", "2022-03-15", 1000.0),
+            ],
+        )
+        self.assertEqual(
+            [(b["categoryId"], b["actual"], b["status"]) for b in tracker.evaluate()],
+            [
+                ("auto", 70.0, "UNDERBUDGET"),
+                ("gas", 40.0, "UNDERBUDGET"),
+                ("pay", 1000.0, "ONBUDGET"),
+                ("gas", 10.0, "UNDERBUDGET"),
+            ],
+        )
+
+        # Kept up to date by the events of a ChangeCapture
+        changes = mintapi.ChangeCapture(mintapi.FingerprintStore(), tracker)
+        changes.process([transaction("t2", "gas", "2022-03-05", -40.0)])
+        changes.process(
+            [
+                transaction("t2", "gas", "2022-03-05", -65.0),
+                transaction("t5", "gas", "2022-04-06", -5.0),
+            ]
+        )
+        self.assertEqual(
+            [
+                (b["categoryId"], b["actual"], b["status"])
+                for b in tracker.evaluate("2022-03")
+            ],
+            [
+                ("auto", 95.0, "UNDERBUDGET"),
+                ("gas", 65.0, "OVERBUDGET"),
+                ("pay", 1000.0, "ONBUDGET"),
+            ],
+        )
+        self.assertEqual(tracker.evaluate("2022-04")[0]["actual"], 15.0)
+        changes.process([transaction("t2", "gas", "2022-03-05", -65.0)])
+        self.assertEqual(tracker.actual("gas", "2022-04"), -10.0)
+
+    def test_net_worth_converts_currencies_with_cached_rates(self):
+        calls = []
+
+        def provider(day, base):
+            calls.append(day)
+            return {"CAD": 1.25, "EUR": 0.8 if day < "2022-02-01" else 0.5}
+
+        def account(balance, currency, type="BankAccount", day="2022-01-31"):
+            return {
+                "type": type,
+                "currency": currency,
+                "currentBalance": balance,
+                "isActive": True,
+                "date": day,
+            }
+
+        accounts = [
+            account(100.0, "USD"),
+            account(125.0, "CAD"),
+            account(80.0, "EUR"),
+            account(50.0, "USD", "CreditAccount"),
+            dict(account(1000.0, "EUR"), isActive=False),
+        ]
+        with tempfile.TemporaryDirectory() as path:
+            mint = mintapi.Mint(fx_rates=mintapi.fx.RateTable(provider, path))
+            self.assertEqual(
+                mint.get_net_worth(accounts, currency="USD", date="2022-01-31"), 250.0
+            )
+            self.assertEqual(
+                mint.get_net_worth(accounts, currency="EUR", date="2022-01-31"), 200.0
+            )
+            # Unconverted, as before
+            self.assertEqual(mint.get_net_worth(accounts), 255.0)
+            # Balances without a currency are in US dollars
+            mixed = [account(100.0, None), account(80.0, "EUR")]
+            del mixed[0]["currency"]
+            self.assertEqual(
+                mint.get_net_worth(mixed, currency="EUR", date="2022-01-31"), 160.0
+            )
+
+            history = accounts + [
+                account(100.0, "USD", day="2022-02-01"),
+                account(80.0, "EUR", day="2022-02-01"),
+            ]
+            rates = mintapi.fx.RateTable(provider, path)
+            self.assertEqual(
+                mintapi.api.net_worth_history(history, "USD", rates),
+                [
+                    {"date": "2022-01-31", "value": 250.0},
+                    {"date": "2022-02-01", "value": 260.0},
+                ],
+            )
+            # Each date was only fetched once, the first from the disk cache
+            self.assertEqual(calls, ["2022-01-31", "2022-02-01"])
+            with self.assertRaises(ValueError):
+                rates.rate("GBP", "USD", "2022-01-31")
+
+
+class FakeImapMailbox(object):
+    """Just enough of an IMAP4 server for MfaCodeWatcher."""
+
+    def __init__(self):
+        self.messages = {}
+        self.fetched = []
+        self.deleted = set()
+        self.lock = threading.Lock()
+
+    def deliver(self, recipient, code, sender="do_not_reply@intuit.com"):
+        message = (
+            "From: Intuit <{}>\r\nTo: {}\r\nSubject: Your Mint Account\r\n"
+            "Date: {}\r\n\r\n<p>Verification code:</p>\r\n<p>{}\r\n".format(
+                sender, recipient, email.utils.formatdate(), code
+            )
+        )
+        with self.lock:
+            uid = len(self.messages) + 1
+            self.messages[uid] = (sender, message.encode())
+
+    def connect(self, server):
+        mailbox = self
+
+        class Client(object):
+            def login(self, account, password):
+                return "OK", [b"Logged in"]
+
+            def select(self, folder):
+                return "OK", [str(len(mailbox.messages)).encode()]
+
+            def uid(self, command, *args):
+                with mailbox.lock:
+                    if command == "SEARCH":
+                        uids = [
+                            uid
+                            for uid, (sender, _) in mailbox.messages.items()
+                            if sender in args[1] and uid not in mailbox.deleted
+                        ]
+                        if "UID " in args[1]:
+                            start = int(args[1].split("UID ")[1].split(":")[0])
+                            uids = [uid for uid in uids if uid >= start] or uids[-1:]
+                        return "OK", [" ".join(map(str, uids)).encode()]
+                    if command == "FETCH":
+                        mailbox.fetched.append(int(args[0]))
+                        return "OK", [(b"", mailbox.messages[int(args[0])][1])]
+                    if command == "STORE":
+                        mailbox.deleted.add(int(args[0]))
+                        return "OK", []
+
+            def expunge(self):
+                return "OK", []
+
+            def logout(self):
+                return "BYE", []
+
+        return Client()
+
 
 def write_transactions_file():
     config_file = tempfile.NamedTemporaryFile(mode="wt")
@@ -0,0 +1,204 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import unittest
+from unittest.mock import patch
+
+import mintapi
+from benchmarks import bench_mintapi
+from mintapi import metrics
+from mintapi.httplogin import HttpSignIn
+from tests import identity_server
+from tests.mint_server import MintServer, StubTransport, stub_mint
+
+
+class MintServerTests(unittest.TestCase):
+    def setUp(self):
+        self.server = MintServer(scale=200)
+        self.server.start()
+        self.mint = stub_mint(self.server)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_get_transaction_data(self):
+        transactions = self.mint.get_transaction_data(limit=100)
+        self.assertTrue(0 < len(transactions) <= 100)
+        self.assertFalse(any(t["isPending"] for t in transactions))
+        self.assertFalse("metaData" in transactions[0])
+        self.assertTrue("lastUpdatedDate" in transactions[0])
+
+    def test_iter_transaction_data(self):
+        streamed = list(self.mint.iter_transaction_data(limit=150))
+        self.assertEqual(streamed, self.mint.get_transaction_data(limit=150))
+
+    def test_get_transaction_data_where_fields(self):
+        where = mintapi.RecordFilter(accounts=["acct_3"], max_amount=0)
+        transactions = self.mint.get_transaction_data(
+            limit=200, where=where, fields=["date", "amount", "category.name"]
+        )
+        expected = [
+            t
+            for t in self.mint.get_transaction_data(limit=200)
+            if t["accountId"] == "acct_3" and t["amount"] <= 0
+        ]
+        self.assertEqual(len(transactions), len(expected))
+        self.assertEqual(
+            transactions[0],
+            {
+                "date": expected[0]["date"],
+                "amount": expected[0]["amount"],
+                "category": {"name": expected[0]["category"]["name"]},
+            },
+        )
+        # Only acct_3 is requested from Mint, with the same result as
+        # filtering every account's transactions locally
+        with patch.object(self.mint, "request", wraps=self.mint.request) as request:
+            pushed_down = self.mint.get_transaction_data(limit=200, where=where)
+        self.assertIn("id=acct_3&", request.call_args[0][1])
+        self.assertEqual(pushed_down, expected)
+        narrowed = json.loads(
+            self.server.payload("/pfm/v1/transactions", 200, account="acct_3")
+        )["Transaction"]
+        self.assertEqual({t["accountId"] for t in narrowed}, {"acct_3"})
+        self.assertLess(len(narrowed), 200)
+
+    def test_thread_safe_mint_shares_one_session(self):
+        mint = stub_mint(self.server, thread_safe=True)
+        expected = mint.get_transaction_data(limit=100)
+        with patch.object(mint.driver, "request") as driver_request:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                results = list(
+                    executor.map(
+                        lambda _: mint.get_transaction_data(limit=100), range(16)
+                    )
+                )
+            driver_request.assert_not_called()
+        self.assertTrue(all(result == expected for result in results))
+        self.assertEqual(mint.get_credit_score(), 800)
+
+    def test_thread_safe_credit_and_rest_requests_run_concurrently(self):
+        mint = stub_mint(self.server, thread_safe=True)
+        expected = mint.get_transaction_data(limit=100)
+        pages = []
+        execute_script = mint.driver.execute_script
+
+        def read_api_key(script):
+            pages.append(mint.driver.current_url)
+            return execute_script(script)
+
+        with patch.object(mint.driver, "execute_script", side_effect=read_api_key):
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                report = executor.submit(mint.get_credit_report)
+                results = [
+                    executor.submit(mint.get_transaction_data, limit=100)
+                    for _ in range(4)
+                ]
+                self.assertEqual(len(report.result()["utilization"]), 2 * 10 * 12)
+                self.assertTrue(all(r.result() == expected for r in results))
+            # e.g. after a 401, the key is read again from the page
+            mint._api_key = None
+            self.assertTrue(mint.get_account_data())
+        self.assertEqual(mint.driver.current_url, mintapi.api.MINT_OVERVIEW_URL)
+        self.assertTrue(pages)
+        self.assertFalse(
+            [page for page in pages if page.startswith(mintapi.api.MINT_CREDIT_URL)]
+        )
+
+    def test_conditional_requests(self):
+        timings = metrics.TimingsCollector()
+        mint = stub_mint(
+            self.server,
+            instrumentation=metrics.Instrumentation([timings]),
+            response_cache=mintapi.ResponseCache(),
+        )
+        first = mint.get_account_data()
+        self.assertEqual(mint.get_account_data(), first)
+        method, path, headers = self.server.requests[-1]
+        self.assertIn("If-None-Match", headers)
+        self.assertIn("gzip", headers["Accept-Encoding"])
+        stats = timings.series[(metrics.PHASE_REQUEST, "/pfm/v1/accounts")]
+        self.assertLess(
+            stats["bytes"], len(self.server.payload("/pfm/v1/accounts", 5000))
+        )
+
+        self.server.change("/pfm/v1/accounts")
+        self.assertNotEqual(mint.get_account_data(), first)
+
+    def test_get_credit_report(self):
+        report = self.mint.get_credit_report()
+        self.assertEqual(self.mint.get_credit_score(), 800)
+        self.assertEqual(len(report["utilization"]), 2 * 10 * 12)
+
+    def test_benchmark_runs(self):
+        results = bench_mintapi.run(scale=50, latency=0, repeat=1, memory=False)
+        self.assertEqual(
+            results["results"]["process_utilization"]["records"], 2 * 10 * 12
+        )
+        self.assertIn("get_transaction_data", bench_mintapi.report(results))
+        self.assertEqual(results["results"]["decode_codec"]["records"], 50)
+
+    def test_benchmark_only_fetches_selected_cases(self):
+        with patch.object(self.mint, "get_transaction_data") as get_transaction_data:
+            cases = bench_mintapi.build_cases(
+                self.server, self.mint, None, selected=["get_account_data"]
+            )
+        self.assertEqual(list(cases), ["get_account_data"])
+        get_transaction_data.assert_not_called()
+
+
+class HttpLoginTests(unittest.TestCase):
+    def setUp(self):
+        self.server = MintServer(scale=200)
+        self.server.start()
+        self.identity = identity_server.IdentityServer().__enter__()
+
+    def tearDown(self):
+        self.identity.__exit__()
+        self.server.stop()
+
+    def login(self, login_engine="http", **kwargs):
+        return mintapi.Mint(
+            identity_server.EMAIL,
+            kwargs.pop("password", identity_server.PASSWORD),
+            transport=StubTransport(self.server.url),
+            http_login=HttpSignIn(self.identity.url, self.identity.url),
+            login_engine=login_engine,
+            wait_for_sync=False,
+            **kwargs
+        )
+
+    def test_soft_token_and_account_selection(self):
+        mint = self.login(
+            mfa_token=identity_server.MFA_SECRET, intuit_account="Business"
+        )
+        self.assertIsNone(mint.driver)
+        self.assertEqual(mint._api_key, identity_server.API_KEY)
+        self.assertEqual(self.identity.selected_account, "acct_1")
+        self.assertIn(identity_server.MINT_COOKIE, mint.transport.session.cookies)
+        self.assertEqual(self.identity.sent_codes, [])
+        self.assertTrue(len(mint.get_account_data()) > 0)
+        self.assertEqual(mint.get_credit_score(), 800)
+
+    def test_emailed_code_from_callback(self):
+        prompts = []
+
+        def callback(prompt):
+            prompts.append(prompt)
+            return identity_server.SENT_CODE
+
+        mint = self.login(mfa_method="email", mfa_input_callback=callback)
+        self.assertEqual(len(prompts), 1)
+        self.assertEqual(
+            self.identity.sent_codes, [("email", identity_server.SENT_CODE)]
+        )
+        self.assertEqual(mint._api_key, identity_server.API_KEY)
+
+    def test_wrong_password_does_not_fall_back_to_selenium(self):
+        with patch("mintapi.api._create_web_driver_at_mint_com") as create:
+            with self.assertRaises(mintapi.HttpLoginError):
+                self.login(password="wrong", mfa_token=identity_server.MFA_SECRET)
+        create.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()